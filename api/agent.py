@@ -11,10 +11,23 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import concurrent.futures
+import contextlib
+import inspect
 import os
-from typing import Literal, Optional, Union, Any
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Literal,
+    Optional,
+    Union,
+)
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 import termcolor
 from google.genai.types import (
     Part,
@@ -28,9 +41,32 @@ import time
 from rich.console import Console
 from rich.table import Table
 
-from computers import EnvState, Computer
+from computers import (
+    SettleResult,
+    AsyncComputer,
+    AsyncDeferredEnvState,
+    AsyncObservation,
+    CancellationToken,
+    Computer,
+    DeferredEnvState,
+    EnvState,
+    Observation,
+)
+from compaction import CompactionConfig, ConversationCompactor
+from context_cache import ContextCache, ContextCacheConfig
+from metrics import ActionTiming, AgentMetrics, TurnMetrics
+from request_encoding import IncrementalRequestEncoder, RequestEncodingError
+from screenshots import (
+    EncodedScreenshot,
+    ScreenshotEncoder,
+    ScreenshotEncoding,
+    ScreenshotFingerprint,
+    ScreenshotHistory,
+)
 
 MAX_RECENT_TURN_WITH_SCREENSHOTS = 3
+# Turns past the most recent ones keep a thumbnail of their screenshot.
+MAX_TURNS_WITH_THUMBNAILS = 4
 PREDEFINED_COMPUTER_USE_FUNCTIONS = [
     "open_web_browser",
     "click_at",
@@ -50,9 +86,19 @@ PREDEFINED_COMPUTER_USE_FUNCTIONS = [
 
 console = Console()
 
-# Built-in Computer Use tools will return "EnvState".
+# Built-in Computer Use tools will return "EnvState" (or a "DeferredEnvState").
 # Custom provided functions will return "dict".
-FunctionResponseT = Union[EnvState, dict]
+FunctionResponseT = Union[Observation, dict]
+AsyncFunctionResponseT = Union[AsyncObservation, dict]
+_OBSERVATION_TYPES = (EnvState, DeferredEnvState, AsyncDeferredEnvState)
+
+# Actions whose effect may be too small for the fuzzy screen comparison to see.
+_INPUT_ACTIONS = frozenset({"click_at", "type_text_at", "key_combination", "drag_and_drop"})
+
+SafetyDecisionT = Literal["CONTINUE", "TERMINATE"]
+SafetyConfirmationT = Callable[
+    [dict[str, Any]], Union[SafetyDecisionT, Awaitable[SafetyDecisionT]]
+]
 
 
 def multiply_numbers(x: float, y: float) -> dict:
@@ -60,20 +106,146 @@ def multiply_numbers(x: float, y: float) -> dict:
     return {"result": x * y}
 
 
-class BrowserAgent:
+class _StreamedResponse:
+    """Assembles the chunks of a streamed response into a single response."""
+
+    def __init__(self):
+        self.parts: list[Part] = []
+        self.finish_reason: Optional[FinishReason] = None
+        self.usage_metadata: Optional[types.GenerateContentResponseUsageMetadata] = None
+        # The function calls executed while streaming, as
+        # (function_call, result, extra_fr_fields).
+        self.results: list[tuple] = []
+
+    def clear(self):
+        self.parts.clear()
+        self.finish_reason = None
+        self.usage_metadata = None
+
+    def add(self, chunk: types.GenerateContentResponse) -> list[Part]:
+        """Adds a chunk and returns its parts."""
+        if chunk.usage_metadata:
+            self.usage_metadata = chunk.usage_metadata
+        if not chunk.candidates:
+            return []
+        candidate = chunk.candidates[0]
+        if candidate.finish_reason:
+            self.finish_reason = candidate.finish_reason
+        parts = (candidate.content.parts if candidate.content else None) or []
+        for part in parts:
+            previous = self.parts[-1] if self.parts else None
+            if (
+                previous
+                and previous.text is not None
+                and part.text is not None
+                and not part.thought_signature
+                and bool(previous.thought) == bool(part.thought)
+            ):
+                # Text arrives in deltas; keep it in one part.
+                self.parts[-1] = previous.model_copy(
+                    update={"text": previous.text + part.text}
+                )
+            else:
+                self.parts.append(part)
+        return parts
+
+    def response(self) -> types.GenerateContentResponse:
+        candidates = []
+        if self.parts or self.finish_reason:
+            candidates.append(
+                Candidate(
+                    content=Content(role="model", parts=self.parts) if self.parts else None,
+                    finish_reason=self.finish_reason,
+                )
+            )
+        return types.GenerateContentResponse(
+            candidates=candidates, usage_metadata=self.usage_metadata
+        )
+
+
+class _BrowserAgentBase:
+    """The parts of the agent shared by BrowserAgent and AsyncBrowserAgent."""
+
     def __init__(
         self,
-        browser_computer: Computer,
+        browser_computer: Union[Computer, AsyncComputer],
         query: str,
         model_name: str,
         verbose: bool = True,
         log_callback: Optional[callable] = None,
+        screenshot_encoding: Optional[ScreenshotEncoding] = None,
+        screen_change_threshold: Optional[float] = 0.0,
+        full_screenshot_turns: int = MAX_RECENT_TURN_WITH_SCREENSHOTS,
+        thumbnail_screenshot_turns: int = MAX_TURNS_WITH_THUMBNAILS,
+        compaction_config: Optional[CompactionConfig] = None,
+        incremental_requests: bool = True,
+        stream_responses: bool = False,
+        context_cache_config: Optional[ContextCacheConfig] = None,
+        cancellation: Optional[CancellationToken] = None,
+        safety_confirmation: Optional[SafetyConfirmationT] = None,
     ):
+        """
+        Args:
+            screen_change_threshold: A new screenshot that differs from the last
+                one sent by at most this fraction (0 means byte-identical) is
+                replaced by a "screen unchanged" response. After clicks, typing
+                and key presses only byte-identical ones are. None disables this.
+            full_screenshot_turns: How many of the most recent turns keep their
+                screenshots at full quality.
+            thumbnail_screenshot_turns: How many turns before those keep a
+                thumbnail. Older turns are text-only.
+            compaction_config: If set, older turns are folded into a summary once
+                the prompt grows past the configured token budget.
+            incremental_requests: Encode each turn of the history once and reuse
+                the encoding on later requests, instead of having the SDK encode
+                the whole history on every request.
+            stream_responses: Stream the model response. Reasoning text is
+                forwarded to `log_callback` as it arrives, and each function call
+                is executed as soon as it has been received.
+            context_cache_config: If set, the tools and the turns that no longer
+                change are stored as Gemini cached content, and later requests
+                reference the cache instead of resending them.
+            cancellation: If set, the agent loop raises TaskCancelled at the next
+                turn, action, streamed chunk or retry once it is cancelled.
+            safety_confirmation: Asked whether to go ahead with an action that
+                requires confirmation, given the safety decision. Returns
+                "CONTINUE" or "TERMINATE", or an awaitable of that for
+                AsyncBrowserAgent. Defaults to prompting on the terminal.
+        """
         self._browser_computer = browser_computer
         self._query = query
         self._model_name = model_name
         self._verbose = verbose
         self._log_callback = log_callback
+        self._screenshot_encoder = ScreenshotEncoder(screenshot_encoding)
+        self._screen_change_threshold = screen_change_threshold
+        self._last_sent_fingerprint: Optional[ScreenshotFingerprint] = None
+        self._last_sent_url: Optional[str] = None
+        self._incremental_requests = incremental_requests
+        self._stream_responses = stream_responses
+        self._context_cache_config = context_cache_config
+        self._cancellation = cancellation
+        self._safety_confirmation = safety_confirmation
+        # Created on the first request, see _get_context_cache.
+        self._context_cache: Optional[ContextCache] = None
+        # Created on the first request, see _get_request_encoder.
+        self._request_encoder: Optional[IncrementalRequestEncoder] = None
+        self._screenshot_history = ScreenshotHistory(
+            full_turns=full_screenshot_turns,
+            thumbnail_turns=thumbnail_screenshot_turns,
+            on_degrade=self._on_content_changed,
+        )
+        self._compactor = (
+            ConversationCompactor(
+                compaction_config, summarize_with_model=self._summarize_with_model
+            )
+            if compaction_config
+            else None
+        )
+        self.metrics = AgentMetrics()
+        # The turn being run, see _begin_turn.
+        self._turn = TurnMetrics(turn=0)
+        self._turn_started = 0.0
         self.final_reasoning = None
         self._client = genai.Client(
             api_key=os.environ.get("GEMINI_API_KEY"),
@@ -117,38 +289,42 @@ class BrowserAgent:
             ],
         )
 
-    def handle_action(self, action: types.FunctionCall) -> FunctionResponseT:
-        """Handles the action and returns the environment state."""
+    def _resolve_action(
+        self, action: types.FunctionCall
+    ) -> tuple[Callable, tuple, dict[str, Any]]:
+        """Returns the function that performs the action, and its arguments."""
         if action.name == "open_web_browser":
-            return self._browser_computer.open_web_browser()
+            return self._browser_computer.open_web_browser, (), {}
         elif action.name == "click_at":
             x = self.denormalize_x(action.args["x"])
             y = self.denormalize_y(action.args["y"])
-            return self._browser_computer.click_at(
-                x=x,
-                y=y,
-            )
+            return self._browser_computer.click_at, (), dict(x=x, y=y)
         elif action.name == "hover_at":
             x = self.denormalize_x(action.args["x"])
             y = self.denormalize_y(action.args["y"])
-            return self._browser_computer.hover_at(
-                x=x,
-                y=y,
-            )
+            return self._browser_computer.hover_at, (), dict(x=x, y=y)
         elif action.name == "type_text_at":
             x = self.denormalize_x(action.args["x"])
             y = self.denormalize_y(action.args["y"])
             press_enter = action.args.get("press_enter", False)
             clear_before_typing = action.args.get("clear_before_typing", True)
-            return self._browser_computer.type_text_at(
-                x=x,
-                y=y,
-                text=action.args["text"],
-                press_enter=press_enter,
-                clear_before_typing=clear_before_typing,
+            return (
+                self._browser_computer.type_text_at,
+                (),
+                dict(
+                    x=x,
+                    y=y,
+                    text=action.args["text"],
+                    press_enter=press_enter,
+                    clear_before_typing=clear_before_typing,
+                ),
             )
         elif action.name == "scroll_document":
-            return self._browser_computer.scroll_document(action.args["direction"])
+            return (
+                self._browser_computer.scroll_document,
+                (action.args["direction"],),
+                {},
+            )
         elif action.name == "scroll_at":
             x = self.denormalize_x(action.args["x"])
             y = self.denormalize_y(action.args["y"])
@@ -161,70 +337,136 @@ class BrowserAgent:
                 magnitude = self.denormalize_x(magnitude)
             else:
                 raise ValueError("Unknown direction: ", direction)
-            return self._browser_computer.scroll_at(
-                x=x, y=y, direction=direction, magnitude=magnitude
+            return (
+                self._browser_computer.scroll_at,
+                (),
+                dict(x=x, y=y, direction=direction, magnitude=magnitude),
             )
         elif action.name == "wait_5_seconds":
-            return self._browser_computer.wait_5_seconds()
+            return self._browser_computer.wait_5_seconds, (), {}
         elif action.name == "go_back":
-            return self._browser_computer.go_back()
+            return self._browser_computer.go_back, (), {}
         elif action.name == "go_forward":
-            return self._browser_computer.go_forward()
+            return self._browser_computer.go_forward, (), {}
         elif action.name == "search":
-            return self._browser_computer.search()
+            return self._browser_computer.search, (), {}
         elif action.name == "navigate":
-            return self._browser_computer.navigate(action.args["url"])
+            return self._browser_computer.navigate, (action.args["url"],), {}
         elif action.name == "key_combination":
-            return self._browser_computer.key_combination(
-                action.args["keys"].split("+")
+            return (
+                self._browser_computer.key_combination,
+                (action.args["keys"].split("+"),),
+                {},
             )
         elif action.name == "drag_and_drop":
             x = self.denormalize_x(action.args["x"])
             y = self.denormalize_y(action.args["y"])
             destination_x = self.denormalize_x(action.args["destination_x"])
             destination_y = self.denormalize_y(action.args["destination_y"])
-            return self._browser_computer.drag_and_drop(
-                x=x,
-                y=y,
-                destination_x=destination_x,
-                destination_y=destination_y,
+            return (
+                self._browser_computer.drag_and_drop,
+                (),
+                dict(
+                    x=x,
+                    y=y,
+                    destination_x=destination_x,
+                    destination_y=destination_y,
+                ),
             )
         # Handle the custom function declarations here.
         elif action.name == multiply_numbers.__name__:
-            return multiply_numbers(x=action.args["x"], y=action.args["y"])
+            return multiply_numbers, (), dict(x=action.args["x"], y=action.args["y"])
         else:
             raise ValueError(f"Unsupported function: {action}")
 
-    def get_model_response(
-        self, max_retries=5, base_delay_s=1
-    ) -> types.GenerateContentResponse:
-        for attempt in range(max_retries):
-            try:
-                response = self._client.models.generate_content(
-                    model=self._model_name,
-                    contents=self._contents,
-                    config=self._generate_content_config,
-                )
-                return response  # Return response on success
-            except Exception as e:
-                print(e)
-                if attempt < max_retries - 1:
-                    delay = base_delay_s * (2**attempt)
-                    message = (
-                        f"Generating content failed on attempt {attempt + 1}. "
-                        f"Retrying in {delay} seconds...\n"
-                    )
-                    termcolor.cprint(
-                        message,
-                        color="yellow",
-                    )
-                    time.sleep(delay)
-                else:
-                    termcolor.cprint(
-                        f"Generating content failed after {max_retries} attempts.\n",
-                        color="red",
-                    )
-                    raise
+    def _report_model_request(self, error: Optional[Exception] = None):
+        """Reports the outcome of one model request, retries included."""
+        if self._log_callback:
+            event = {'type': 'model_request', 'outcome': 'error' if error else 'success'}
+            if error:
+                event['error_type'] = type(error).__name__
+                event['code'] = getattr(error, 'code', None)
+            self._log_callback(event)
+
+    def _retry_delay_s(
+        self, error: Exception, attempt: int, max_retries: int, base_delay_s: float
+    ) -> Optional[float]:
+        """Reports a failed request and returns the delay before the next attempt,
+        or None if there are no attempts left."""
+        print(error)
+        if isinstance(error, RequestEncodingError):
+            # A streamed response failed to decode. Retry through the SDK.
+            self._disable_request_encoder(error)
+        self._report_model_request(error)
+        if (
+            self._context_cache
+            and isinstance(error, errors.ClientError)
+            and error.code != 429
+        ):
+            # The cache may have expired on the server. Retry without it.
+            self._context_cache.invalidate()
+        if attempt < max_retries - 1:
+            delay = base_delay_s * (2**attempt)
+            message = (
+                f"Generating content failed on attempt {attempt + 1}. "
+                f"Retrying in {delay} seconds...\n"
+            )
+            self._turn.model_retries += 1
+            termcolor.cprint(
+                message,
+                color="yellow",
+            )
+            return delay
+        termcolor.cprint(
+            f"Generating content failed after {max_retries} attempts.\n",
+            color="red",
+        )
+        return None
+
+    def _get_request_encoder(self) -> Optional[IncrementalRequestEncoder]:
+        if self._incremental_requests and self._request_encoder is None:
+            self._request_encoder = IncrementalRequestEncoder.create(
+                self._client, self._model_name, self._generate_content_config
+            )
+            # Don't try again if the SDK doesn't support it.
+            self._incremental_requests = self._request_encoder is not None
+        return self._request_encoder
+
+    def _disable_request_encoder(self, error: Exception):
+        """Sends this and later requests through the SDK after the encoder failed."""
+        print(f"Incremental request encoding failed, using the SDK: {error}")
+        self._request_encoder = None
+        self._incremental_requests = False
+
+    def _get_context_cache(self) -> Optional[ContextCache]:
+        if self._context_cache_config and self._context_cache is None:
+            self._context_cache = ContextCache(
+                self._client,
+                self._model_name,
+                self._generate_content_config,
+                self._context_cache_config,
+                self.metrics,
+            )
+        return self._context_cache
+
+    def _stable_prefix_length(self) -> int:
+        """Returns how many of the leading contents won't change anymore."""
+        # The newest turn is always sent along with the request.
+        length = len(self._contents) - 1
+        pending = self._screenshot_history.oldest_pending()
+        if pending is None:
+            return length
+        index, content = pending
+        if index < len(self._contents) and self._contents[index] is content:
+            return min(index, length)
+        # The history is out of step with the contents, so assume nothing is stable.
+        return 0
+
+    def _on_content_changed(self, content: Content):
+        if self._request_encoder:
+            self._request_encoder.invalidate(content)
+        if self._context_cache:
+            self._context_cache.content_changed(content)
 
     def get_text(self, candidate: Candidate) -> Optional[str]:
         """Extracts the text from the candidate."""
@@ -246,22 +488,16 @@ class BrowserAgent:
                 ret.append(part.function_call)
         return ret
 
-    def run_one_iteration(self) -> Literal["COMPLETE", "CONTINUE"]:
-        # Generate a response from the model.
+    def _status(self, message: str):
         if self._verbose:
-            with console.status(
-                "Generating response from Gemini Computer Use...", spinner_style=None
-            ):
-                try:
-                    response = self.get_model_response()
-                except Exception as e:
-                    return "COMPLETE"
-        else:
-            try:
-                response = self.get_model_response()
-            except Exception as e:
-                return "COMPLETE"
+            return console.status(message, spinner_style=None)
+        return contextlib.nullcontext()
 
+    def _read_response(
+        self, response: types.GenerateContentResponse
+    ) -> Union[Literal["COMPLETE", "CONTINUE"], list[types.FunctionCall]]:
+        """Records the model turn and returns its function calls, or the status
+        of the loop if there is nothing to act on."""
         if not response.candidates:
             print("Response has no candidates!")
             print(response)
@@ -312,30 +548,65 @@ class BrowserAgent:
         # Send reasoning and function calls to callback if provided
         if self._log_callback:
             self._log_callback({
+                'type': 'reasoning',
                 'reasoning': reasoning,
                 'function_calls': function_call_strs
             })
+        return function_calls
+
+    def _forward_reasoning_delta(self, part: Part):
+        if self._log_callback and part.text and not part.thought:
+            self._log_callback({'type': 'reasoning_delta', 'text': part.text})
 
+    def _last_observation_index(self, results: list[tuple]) -> Optional[int]:
+        """Only the last observation of the turn carries a screenshot, so at most
+        one capture happens per turn. Earlier ones report their URL only."""
+        last_observation_index = None
+        for i, (_, fc_result, _) in enumerate(results):
+            if isinstance(fc_result, _OBSERVATION_TYPES):
+                last_observation_index = i
+        return last_observation_index
+
+    def _submit_screenshot(
+        self, screenshot: bytes, url: str, results: list[tuple]
+    ) -> Optional["concurrent.futures.Future[EncodedScreenshot]"]:
+        """Starts encoding the screenshot while the other responses are built.
+
+        Returns None if the screen hasn't changed since the last one sent.
+        """
+        # Input often changes only a few pixels, like a typed character or a
+        # ticked checkbox. Telling the model nothing changed would make it retry.
+        took_input = any(function_call.name in _INPUT_ACTIONS for function_call, _, _ in results)
+        screen_unchanged = self._is_screen_unchanged(screenshot, url, exact=took_input)
+        self.metrics.observations += 1
+        if screen_unchanged:
+            self.metrics.observations_elided += 1
+            return None
+        return self._screenshot_encoder.submit(screenshot)
+
+    def _append_function_responses(
+        self,
+        results: list[tuple],
+        last_observation_index: Optional[int],
+        encoded_screenshot: Optional[EncodedScreenshot],
+    ):
         function_responses = []
-        for function_call in function_calls:
-            extra_fr_fields = {}
-            if function_call.args and (
-                safety := function_call.args.get("safety_decision")
-            ):
-                decision = self._get_safety_confirmation(safety)
-                if decision == "TERMINATE":
-                    print("Terminating agent loop")
-                    return "COMPLETE"
-                # Explicitly mark the safety check as acknowledged.
-                extra_fr_fields["safety_acknowledgement"] = "true"
-            if self._verbose:
-                with console.status(
-                    "Sending command to Computer...", spinner_style=None
-                ):
-                    fc_result = self.handle_action(function_call)
-            else:
-                fc_result = self.handle_action(function_call)
-            if isinstance(fc_result, EnvState):
+        for i, (function_call, fc_result, extra_fr_fields) in enumerate(results):
+            if isinstance(fc_result, _OBSERVATION_TYPES):
+                parts = None
+                if i == last_observation_index and encoded_screenshot is None:
+                    extra_fr_fields["screen_unchanged"] = True
+                elif i == last_observation_index:
+                    self._turn.screenshot_encode_s = encoded_screenshot.encode_s
+                    self._turn.screenshot_bytes = len(encoded_screenshot.data)
+                    parts = [
+                        types.FunctionResponsePart(
+                            inline_data=types.FunctionResponseBlob(
+                                mime_type=encoded_screenshot.mime_type,
+                                data=encoded_screenshot.data,
+                            )
+                        )
+                    ]
                 function_responses.append(
                     FunctionResponse(
                         name=function_call.name,
@@ -343,13 +614,7 @@ class BrowserAgent:
                             "url": fc_result.url,
                             **extra_fr_fields,
                         },
-                        parts=[
-                            types.FunctionResponsePart(
-                                inline_data=types.FunctionResponseBlob(
-                                    mime_type="image/png", data=fc_result.screenshot
-                                )
-                            )
-                        ],
+                        parts=parts,
                     )
                 )
             elif isinstance(fc_result, dict):
@@ -357,49 +622,132 @@ class BrowserAgent:
                     FunctionResponse(name=function_call.name, response=fc_result)
                 )
 
-        self._contents.append(
-            Content(
-                role="user",
-                parts=[Part(function_response=fr) for fr in function_responses],
+        function_response_content = Content(
+            role="user",
+            parts=[Part(function_response=fr) for fr in function_responses],
+        )
+        self._contents.append(function_response_content)
+
+        # Degrade the screenshots of older turns: full quality for the most recent
+        # few, then thumbnails, then text only.
+        turn_screenshots = [
+            fr
+            for fr in function_responses
+            if fr.parts and fr.name in PREDEFINED_COMPUTER_USE_FUNCTIONS
+        ]
+        if turn_screenshots:
+            self._screenshot_history.add(
+                function_response_content, turn_screenshots, len(self._contents) - 1
+            )
+
+    def _check_cancelled(self):
+        if self._cancellation:
+            self._cancellation.raise_if_cancelled()
+
+    def _begin_turn(self):
+        self._check_cancelled()
+        self._turn = TurnMetrics(turn=len(self.metrics.turns) + 1)
+        self._turn_started = time.perf_counter()
+
+    def _end_turn(self):
+        turn = self._turn
+        turn.duration_s = time.perf_counter() - self._turn_started
+        self.metrics.turns.append(turn)
+        if self._log_callback:
+            self._log_callback({"type": "turn", **turn.model_dump()})
+
+    def _record_action(self, function_call: types.FunctionCall, started: float):
+        self._turn.actions.append(
+            ActionTiming(
+                name=function_call.name, duration_s=time.perf_counter() - started
             )
         )
 
-        # only keep screenshots in the few most recent turns, remove the screenshot images from the old turns.
-        turn_with_screenshots_found = 0
-        for content in reversed(self._contents):
-            if content.role == "user" and content.parts:
-                # check if content has screenshot of the predefined computer use functions.
-                has_screenshot = False
-                for part in content.parts:
-                    if (
-                        part.function_response
-                        and part.function_response.parts
-                        and part.function_response.name
-                        in PREDEFINED_COMPUTER_USE_FUNCTIONS
-                    ):
-                        has_screenshot = True
-                        break
-
-                if has_screenshot:
-                    turn_with_screenshots_found += 1
-                    # remove the screenshot image if the number of screenshots exceed the limit.
-                    if turn_with_screenshots_found > MAX_RECENT_TURN_WITH_SCREENSHOTS:
-                        for part in content.parts:
-                            if (
-                                part.function_response
-                                and part.function_response.parts
-                                and part.function_response.name
-                                in PREDEFINED_COMPUTER_USE_FUNCTIONS
-                            ):
-                                part.function_response.parts = None
+    def _record_capture(self, started: float):
+        self._turn.screenshot_capture_s = time.perf_counter() - started
+        # The capture waits for the page to settle first.
+        settle = getattr(self._browser_computer, "last_settle", None)
+        if isinstance(settle, SettleResult):
+            self._turn.settle_s = settle.waited_s
 
-        return "CONTINUE"
+    def _should_compact(self, prompt_tokens: Optional[int]) -> bool:
+        return bool(self._compactor and self._compactor.should_compact(prompt_tokens))
+
+    def _record_usage(self, response: types.GenerateContentResponse) -> Optional[int]:
+        """Records the token usage of a response and returns its prompt size."""
+        if self._request_encoder:
+            self._turn.request_bytes = self._request_encoder.last_request_bytes
+        usage = response.usage_metadata
+        if not usage:
+            return None
+        prompt_tokens = usage.prompt_token_count or 0
+        output_tokens = usage.candidates_token_count or 0
+        cached_tokens = usage.cached_content_token_count or 0
+        self.metrics.prompt_tokens += prompt_tokens
+        self.metrics.output_tokens += output_tokens
+        self.metrics.prompt_tokens_per_turn.append(prompt_tokens)
+        self.metrics.cached_prompt_tokens += cached_tokens
+        self._turn.prompt_tokens = prompt_tokens
+        self._turn.output_tokens = output_tokens
+        self._turn.cached_prompt_tokens = cached_tokens
+        return prompt_tokens
+
+    def _compact(self, prompt_tokens: int):
+        result = self._compactor.compact(self._contents, prompt_tokens)
+        if not result:
+            return
+        self._contents, event = result
+        self._screenshot_history.rebase(self._contents)
+        if self._context_cache:
+            # The query turn now carries the summary, so the cached prefix is gone.
+            self._context_cache.invalidate()
+        # The last screenshot sent may have been folded away, so send the next one.
+        self._last_sent_fingerprint = None
+        self.metrics.compactions += 1
+        self.metrics.compaction_tokens_saved += event.estimated_tokens_saved
+        if self._verbose:
+            termcolor.cprint(
+                f"Compacted {event.turns_folded} turns, saving about "
+                f"{event.estimated_tokens_saved} of {event.tokens_before} tokens.",
+                color="yellow",
+            )
+        if self._log_callback:
+            self._log_callback({"type": "compaction", **event.model_dump()})
+
+    def _summarize_with_model(self, prompt: str) -> str:
+        response = self._client.models.generate_content(
+            model=self._compactor.config.summary_model,
+            contents=prompt,
+        )
+        return response.text
+
+    def _is_screen_unchanged(self, screenshot: bytes, url: str, exact: bool = False) -> bool:
+        """Compares against the last screenshot sent, and remembers the new one if sent.
+
+        With `exact`, only a byte-identical screenshot counts as unchanged.
+        """
+        fingerprint = ScreenshotFingerprint(screenshot)
+        last = self._last_sent_fingerprint
+        threshold = self._screen_change_threshold
+        if threshold is None or last is None or url != self._last_sent_url:
+            unchanged = False
+        elif threshold == 0 or exact:
+            # Skip decoding the screenshots when only exact matches count.
+            unchanged = fingerprint.digest == last.digest
+        else:
+            unchanged = fingerprint.difference(last) <= threshold
+        if not unchanged:
+            self._last_sent_fingerprint = fingerprint
+            self._last_sent_url = url
+        return unchanged
 
     def _get_safety_confirmation(
         self, safety: dict[str, Any]
     ) -> Literal["CONTINUE", "TERMINATE"]:
         if safety["decision"] != "require_confirmation":
-            raise ValueError(f"Unknown safety decision: safety['decision']")
+            raise ValueError(f"Unknown safety decision: {safety['decision']}")
+        if self._safety_confirmation:
+            return self._safety_confirmation(safety)
         termcolor.cprint(
             "Safety service requires explicit confirmation!",
             color="yellow",
@@ -414,13 +762,419 @@ class BrowserAgent:
             return "TERMINATE"
         return "CONTINUE"
 
+    def denormalize_x(self, x: int) -> int:
+        return int(x / 1000 * self._browser_computer.screen_size()[0])
+
+    def denormalize_y(self, y: int) -> int:
+        return int(y / 1000 * self._browser_computer.screen_size()[1])
+
+
+class BrowserAgent(_BrowserAgentBase):
+    def handle_action(self, action: types.FunctionCall) -> FunctionResponseT:
+        """Handles the action and returns the environment state."""
+        function, args, kwargs = self._resolve_action(action)
+        return function(*args, **kwargs)
+
+    def get_model_response(
+        self, max_retries=5, base_delay_s=1
+    ) -> types.GenerateContentResponse:
+        for attempt in range(max_retries):
+            try:
+                config, contents = self._prepare_request()
+                response = None
+                request_encoder = self._get_request_encoder()
+                if request_encoder:
+                    try:
+                        response = request_encoder.generate_content(contents, config)
+                    except RequestEncodingError as e:
+                        self._disable_request_encoder(e)
+                if response is None:
+                    response = self._client.models.generate_content(
+                        model=self._model_name,
+                        contents=contents,
+                        config=config,
+                    )
+                self._report_model_request()
+                return response  # Return response on success
+            except Exception as e:
+                delay = self._retry_delay_s(e, attempt, max_retries, base_delay_s)
+                if delay is None:
+                    raise
+                self._sleep(delay)
+
+    def _sleep(self, seconds: float):
+        if self._cancellation:
+            self._cancellation.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _prepare_request(self) -> tuple[GenerateContentConfig, list[Content]]:
+        """Returns the config and contents of the next request."""
+        context_cache = self._get_context_cache()
+        if not context_cache:
+            return self._generate_content_config, self._contents
+        return context_cache.prepare(self._contents, self._stable_prefix_length())
+
+    def _generate_content_stream(self) -> Iterator[types.GenerateContentResponse]:
+        config, contents = self._prepare_request()
+        request_encoder = self._get_request_encoder()
+        if request_encoder:
+            try:
+                return request_encoder.generate_content_stream(contents, config)
+            except RequestEncodingError as e:
+                self._disable_request_encoder(e)
+        return self._client.models.generate_content_stream(
+            model=self._model_name,
+            contents=contents,
+            config=config,
+        )
+
+    def _stream_function_calls(
+        self, streamed: _StreamedResponse, max_retries=5, base_delay_s=1
+    ) -> Iterator[types.FunctionCall]:
+        """Streams the model response into `streamed`, yielding each function call
+        as soon as it has arrived.
+
+        The request is only retried while no function call has been executed.
+        After that, a failed stream ends the turn with what has arrived.
+        """
+        started = time.perf_counter()
+        for attempt in range(max_retries):
+            try:
+                for chunk in self._generate_content_stream():
+                    self._check_cancelled()
+                    if self._turn.first_chunk_s is None:
+                        self._turn.first_chunk_s = time.perf_counter() - started
+                    for part in streamed.add(chunk):
+                        self._forward_reasoning_delta(part)
+                        if part.function_call:
+                            yield part.function_call
+                self._report_model_request()
+                return
+            except Exception as e:
+                if streamed.results:
+                    self._report_model_request(e)
+                    termcolor.cprint(
+                        f"Response stream failed after executing actions: {e}",
+                        color="yellow",
+                    )
+                    return
+                delay = self._retry_delay_s(e, attempt, max_retries, base_delay_s)
+                if delay is None:
+                    raise
+                streamed.clear()
+                self._sleep(delay)
+
+    def _get_streamed_response(self) -> Optional[_StreamedResponse]:
+        """Streams the model response, executing the function calls as they arrive.
+
+        Returns None if no response could be generated or the user terminated.
+        """
+        streamed = _StreamedResponse()
+        function_calls = self._stream_function_calls(streamed)
+        started = time.perf_counter()
+        while True:
+            try:
+                function_call = next(function_calls, None)
+            except Exception as e:
+                return None
+            if function_call is None:
+                # The actions ran while the response was streaming.
+                action_s = sum(a.duration_s for a in self._turn.actions)
+                self._turn.model_s = time.perf_counter() - started - action_s
+                return streamed
+            result = self._execute_function_call(function_call)
+            if result is None:
+                return None
+            streamed.results.append(result)
+
+    def _execute_function_call(self, function_call: types.FunctionCall) -> Optional[tuple]:
+        """Returns (function_call, result, extra_fr_fields), or None if the user
+        declined the safety confirmation."""
+        self._check_cancelled()
+        extra_fr_fields = {}
+        if function_call.args and (
+            safety := function_call.args.get("safety_decision")
+        ):
+            decision = self._get_safety_confirmation(safety)
+            if decision == "TERMINATE":
+                print("Terminating agent loop")
+                return None
+            # Explicitly mark the safety check as acknowledged.
+            extra_fr_fields["safety_acknowledgement"] = "true"
+        started = time.perf_counter()
+        with self._status("Sending command to Computer..."):
+            fc_result = self.handle_action(function_call)
+        self._record_action(function_call, started)
+        return function_call, fc_result, extra_fr_fields
+
+    def run_one_iteration(self) -> Literal["COMPLETE", "CONTINUE"]:
+        self._begin_turn()
+        try:
+            return self._run_one_iteration()
+        finally:
+            self._end_turn()
+
+    def _run_one_iteration(self) -> Literal["COMPLETE", "CONTINUE"]:
+        # Generate a response from the model.
+        results = []
+        if self._stream_responses:
+            streamed = self._get_streamed_response()
+            if streamed is None:
+                return "COMPLETE"
+            response, results = streamed.response(), streamed.results
+        else:
+            started = time.perf_counter()
+            try:
+                with self._status("Generating response from Gemini Computer Use..."):
+                    response = self.get_model_response()
+            except Exception as e:
+                return "COMPLETE"
+            finally:
+                self._turn.model_s = time.perf_counter() - started
+
+        prompt_tokens = self._record_usage(response)
+        function_calls = self._read_response(response)
+        if isinstance(function_calls, str):
+            return function_calls
+
+        # When streaming, the calls that arrived have been executed already.
+        for function_call in function_calls[len(results):]:
+            result = self._execute_function_call(function_call)
+            if result is None:
+                return "COMPLETE"
+            results.append(result)
+
+        last_observation_index = self._last_observation_index(results)
+        encoded_screenshot = None
+        if last_observation_index is not None:
+            observation = results[last_observation_index][1]
+            started = time.perf_counter()
+            screenshot = observation.screenshot
+            self._record_capture(started)
+            future = self._submit_screenshot(screenshot, observation.url, results)
+            encoded_screenshot = future.result() if future else None
+        self._append_function_responses(
+            results, last_observation_index, encoded_screenshot
+        )
+
+        if self._should_compact(prompt_tokens):
+            self._compact(prompt_tokens)
+
+        return "CONTINUE"
+
     def agent_loop(self):
         status = "CONTINUE"
         while status == "CONTINUE":
             status = self.run_one_iteration()
 
-    def denormalize_x(self, x: int) -> int:
-        return int(x / 1000 * self._browser_computer.screen_size()[0])
 
-    def denormalize_y(self, y: int) -> int:
-        return int(y / 1000 * self._browser_computer.screen_size()[1])
+class AsyncBrowserAgent(_BrowserAgentBase):
+    """A BrowserAgent that runs on an asyncio event loop.
+
+    It drives an AsyncComputer and calls the model through `client.aio`, so one
+    event loop can run many agents concurrently. Blocking work (the safety
+    prompt, model summaries) is moved to a thread.
+    """
+
+    async def handle_action(
+        self, action: types.FunctionCall
+    ) -> AsyncFunctionResponseT:
+        """Handles the action and returns the environment state."""
+        function, args, kwargs = self._resolve_action(action)
+        result = function(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def get_model_response(
+        self, max_retries=5, base_delay_s=1
+    ) -> types.GenerateContentResponse:
+        for attempt in range(max_retries):
+            try:
+                config, contents = await self._prepare_request()
+                response = None
+                request_encoder = self._get_request_encoder()
+                if request_encoder:
+                    try:
+                        response = await request_encoder.agenerate_content(contents, config)
+                    except RequestEncodingError as e:
+                        self._disable_request_encoder(e)
+                if response is None:
+                    response = await self._client.aio.models.generate_content(
+                        model=self._model_name,
+                        contents=contents,
+                        config=config,
+                    )
+                self._report_model_request()
+                return response  # Return response on success
+            except Exception as e:
+                delay = self._retry_delay_s(e, attempt, max_retries, base_delay_s)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                self._check_cancelled()
+
+    async def _prepare_request(self) -> tuple[GenerateContentConfig, list[Content]]:
+        context_cache = self._get_context_cache()
+        if not context_cache:
+            return self._generate_content_config, self._contents
+        return await context_cache.aprepare(
+            self._contents, self._stable_prefix_length()
+        )
+
+    async def _generate_content_stream(
+        self,
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        config, contents = await self._prepare_request()
+        request_encoder = self._get_request_encoder()
+        if request_encoder:
+            try:
+                return request_encoder.agenerate_content_stream(contents, config)
+            except RequestEncodingError as e:
+                self._disable_request_encoder(e)
+        return await self._client.aio.models.generate_content_stream(
+            model=self._model_name,
+            contents=contents,
+            config=config,
+        )
+
+    async def _stream_function_calls(
+        self, streamed: _StreamedResponse, max_retries=5, base_delay_s=1
+    ) -> AsyncIterator[types.FunctionCall]:
+        """The async counterpart of `BrowserAgent._stream_function_calls`."""
+        started = time.perf_counter()
+        for attempt in range(max_retries):
+            try:
+                async for chunk in await self._generate_content_stream():
+                    self._check_cancelled()
+                    if self._turn.first_chunk_s is None:
+                        self._turn.first_chunk_s = time.perf_counter() - started
+                    for part in streamed.add(chunk):
+                        self._forward_reasoning_delta(part)
+                        if part.function_call:
+                            yield part.function_call
+                self._report_model_request()
+                return
+            except Exception as e:
+                if streamed.results:
+                    self._report_model_request(e)
+                    termcolor.cprint(
+                        f"Response stream failed after executing actions: {e}",
+                        color="yellow",
+                    )
+                    return
+                delay = self._retry_delay_s(e, attempt, max_retries, base_delay_s)
+                if delay is None:
+                    raise
+                streamed.clear()
+                await asyncio.sleep(delay)
+                self._check_cancelled()
+
+    async def _get_streamed_response(self) -> Optional[_StreamedResponse]:
+        streamed = _StreamedResponse()
+        function_calls = self._stream_function_calls(streamed)
+        started = time.perf_counter()
+        while True:
+            try:
+                function_call = await anext(function_calls, None)
+            except Exception as e:
+                return None
+            if function_call is None:
+                # The actions ran while the response was streaming.
+                action_s = sum(a.duration_s for a in self._turn.actions)
+                self._turn.model_s = time.perf_counter() - started - action_s
+                return streamed
+            result = await self._execute_function_call(function_call)
+            if result is None:
+                return None
+            streamed.results.append(result)
+
+    async def _execute_function_call(
+        self, function_call: types.FunctionCall
+    ) -> Optional[tuple]:
+        self._check_cancelled()
+        extra_fr_fields = {}
+        if function_call.args and (
+            safety := function_call.args.get("safety_decision")
+        ):
+            if self._safety_confirmation:
+                decision = self._get_safety_confirmation(safety)
+                if inspect.isawaitable(decision):
+                    decision = await decision
+            else:
+                # The terminal prompt blocks.
+                decision = await asyncio.to_thread(self._get_safety_confirmation, safety)
+            if decision == "TERMINATE":
+                print("Terminating agent loop")
+                return None
+            # Explicitly mark the safety check as acknowledged.
+            extra_fr_fields["safety_acknowledgement"] = "true"
+        started = time.perf_counter()
+        with self._status("Sending command to Computer..."):
+            fc_result = await self.handle_action(function_call)
+        self._record_action(function_call, started)
+        return function_call, fc_result, extra_fr_fields
+
+    async def run_one_iteration(self) -> Literal["COMPLETE", "CONTINUE"]:
+        self._begin_turn()
+        try:
+            return await self._run_one_iteration()
+        finally:
+            self._end_turn()
+
+    async def _run_one_iteration(self) -> Literal["COMPLETE", "CONTINUE"]:
+        # Generate a response from the model.
+        results = []
+        if self._stream_responses:
+            streamed = await self._get_streamed_response()
+            if streamed is None:
+                return "COMPLETE"
+            response, results = streamed.response(), streamed.results
+        else:
+            started = time.perf_counter()
+            try:
+                with self._status("Generating response from Gemini Computer Use..."):
+                    response = await self.get_model_response()
+            except Exception as e:
+                return "COMPLETE"
+            finally:
+                self._turn.model_s = time.perf_counter() - started
+
+        prompt_tokens = self._record_usage(response)
+        function_calls = self._read_response(response)
+        if isinstance(function_calls, str):
+            return function_calls
+
+        # When streaming, the calls that arrived have been executed already.
+        for function_call in function_calls[len(results):]:
+            result = await self._execute_function_call(function_call)
+            if result is None:
+                return "COMPLETE"
+            results.append(result)
+
+        last_observation_index = self._last_observation_index(results)
+        encoded_screenshot = None
+        if last_observation_index is not None:
+            observation = results[last_observation_index][1]
+            started = time.perf_counter()
+            if isinstance(observation, AsyncDeferredEnvState):
+                observation = await observation.materialize()
+            self._record_capture(started)
+            future = self._submit_screenshot(observation.screenshot, observation.url, results)
+            if future:
+                encoded_screenshot = await asyncio.wrap_future(future)
+        self._append_function_responses(
+            results, last_observation_index, encoded_screenshot
+        )
+
+        if self._should_compact(prompt_tokens):
+            # A model summary is a blocking request.
+            await asyncio.to_thread(self._compact, prompt_tokens)
+
+        return "CONTINUE"
+
+    async def agent_loop(self):
+        status = "CONTINUE"
+        while status == "CONTINUE":
+            status = await self.run_one_iteration()
@@ -6,18 +6,46 @@ import logging
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, AsyncGenerator
+from typing import Optional
 import traceback
 import asyncio
-import json
+import contextlib
+import time
 from datetime import datetime
 
 from agent import BrowserAgent
-from computers import BrowserbaseComputer, PlaywrightComputer
+from compaction import CompactionConfig
+from context_cache import ContextCacheConfig
+from event_stream import EventStream
+from jobs import Job, JobInfo, JobManager, JobResult, JobStore
+from server_metrics import ServerMetrics
+from task_executor import ExecutorSaturated, TaskExecutor
+from screenshots import ScreenshotEncoding
+from computers import (
+    AsyncBrowserbaseComputer,
+    AsyncPlaywrightComputer,
+    BrowserbaseComputer,
+    BrowserbasePool,
+    BrowserbasePoolConfig,
+    CancellationToken,
+    HostMemoryLow,
+    MemoryGovernor,
+    MemoryGovernorConfig,
+    PlaywrightComputer,
+    PlaywrightPool,
+    PlaywrightPoolConfig,
+    ProfileSnapshotConfig,
+    ProfileSnapshots,
+    RoutingConfig,
+    SettleConfig,
+    SharedChromium,
+    TaskCancelled,
+    get_browser_loop,
+)
 
 # Load environment variables from .env.local in parent directory
 env_path = Path(__file__).parent.parent / '.env.local'
@@ -44,11 +72,281 @@ logger = logging.getLogger(__name__)
 # Constants
 PLAYWRIGHT_SCREEN_SIZE = (1920, 1080)
 
+# How long to wait for pages to settle before taking a screenshot anyway.
+# Tune per deployment using the settle times reported by the computers.
+SETTLE_CONFIG = SettleConfig(
+    timeout_s=float(os.environ.get("SETTLE_TIMEOUT_S", 3.0)),
+    dom_quiet_s=float(os.environ.get("SETTLE_DOM_QUIET_S", 0.2)),
+)
+
+# Screenshots are sent to the model as compact JPEGs by default. Override with
+# SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_MAX_WIDTH and SCREENSHOT_MAX_HEIGHT.
+SCREENSHOT_ENCODING = ScreenshotEncoding.from_env(
+    format="jpeg", quality=80, max_width=1280
+)
+
+# Screenshots differing from the previous one by at most this fraction are not
+# sent again; the model is told the screen is unchanged instead. 0 elides only
+# byte-identical screenshots. Small changes like a typed character fall under
+# nonzero thresholds, so raise it with care.
+SCREEN_CHANGE_THRESHOLD = float(os.environ.get("SCREEN_CHANGE_THRESHOLD", 0))
+
+# Long conversations are compacted once a request exceeds this many prompt tokens.
+COMPACTION_CONFIG = CompactionConfig(
+    token_budget=int(os.environ.get("COMPACTION_TOKEN_BUDGET", 32_000)),
+    summarizer=os.environ.get("COMPACTION_SUMMARIZER", "rules"),
+)
+
+# Stream model responses so reasoning shows up as it is generated and actions
+# start before the whole response has arrived.
+STREAM_MODEL_RESPONSES = os.environ.get("STREAM_MODEL_RESPONSES", "1").lower() in ["true", "1"]
+
+# Cache the tools and the turns that no longer change with the model, so each
+# request only sends the recent turns.
+CONTEXT_CACHE_CONFIG = (
+    ContextCacheConfig(ttl_s=int(os.environ.get("CONTEXT_CACHE_TTL_S", 600)))
+    if os.environ.get("CONTEXT_CACHING", "1").lower() in ["true", "1"]
+    else None
+)
+
+# SSE comment lines sent on idle streams so proxies keep the connection open.
+SSE_HEARTBEAT_S = float(os.environ.get("SSE_HEARTBEAT_S", 15))
+# Past this many unsent events, log lines and reasoning deltas are merged.
+SSE_MAX_BUFFERED_EVENTS = 256
+
+# Exported on /metrics.
+SERVER_METRICS = ServerMetrics()
+
+# Jobs started through /api/jobs and /api/execute-stream. Finished ones are
+# kept in SQLite.
+JOB_MANAGER = JobManager(
+    JobStore(os.environ.get("JOBS_DB_PATH", str(Path(__file__).parent / "jobs.db")))
+)
+
+# Tasks still running after this long are cancelled and their browser closed.
+TASK_TIMEOUT_S = float(os.environ.get("TASK_TIMEOUT_S", 1800))
+# A streamed task whose client disconnected is cancelled unless the client
+# reconnects to the job's events within this time.
+DISCONNECT_GRACE_S = float(os.environ.get("DISCONNECT_GRACE_S", 30))
+# Actions the model flags as risky are denied unless a client of the job
+# confirms them within this time.
+SAFETY_CONFIRMATION_TIMEOUT_S = float(os.environ.get("SAFETY_CONFIRMATION_TIMEOUT_S", 300))
+
+# Browser tasks block for minutes, so they run on a bounded pool of worker
+# threads instead of the event loop. Tasks beyond the workers wait in a bounded
+# queue, and the server answers 429 once that is full too. Tasks waiting for a
+# safety confirmation give up their worker to queued ones, but keep their
+# thread and browser for up to SAFETY_CONFIRMATION_TIMEOUT_S, so at most
+# MAX_PARKED_TASKS of them do, as many as there are workers by default.
+MAX_CONCURRENT_TASKS = int(os.environ.get("MAX_CONCURRENT_TASKS", 4))
+TASK_EXECUTOR = TaskExecutor(
+    max_workers=MAX_CONCURRENT_TASKS,
+    max_queued=int(os.environ.get("MAX_QUEUED_TASKS", 8)),
+    max_parked=int(os.environ.get("MAX_PARKED_TASKS", MAX_CONCURRENT_TASKS)),
+    metrics=SERVER_METRICS,
+)
+
+
+# With REQUEST_BLOCKING set, requests for ads and trackers are blocked in every
+# browser. Extend the blocked hosts with BLOCKED_DOMAINS, block resource types
+# such as video with BLOCKED_RESOURCE_TYPES, and exempt sites that break with
+# ALLOWED_DOMAINS, all comma-separated. Routing costs a round trip per routed
+# request and disables the HTTP cache, so it is off by default. Blocking
+# resource types routes every request, not only those to blocked hosts.
+def _env_list(name: str) -> list[str]:
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
+ROUTING_CONFIG = (
+    RoutingConfig(
+        blocked_domains=RoutingConfig().blocked_domains + _env_list("BLOCKED_DOMAINS"),
+        blocked_resource_types=_env_list("BLOCKED_RESOURCE_TYPES"),
+        allowed_domains=_env_list("ALLOWED_DOMAINS"),
+    )
+    if os.environ.get("REQUEST_BLOCKING", "0").lower() in ["true", "1"]
+    else None
+)
+
+
+PLAYWRIGHT_USER_DATA_DIR = "./browser_data"
+
+# With PLAYWRIGHT_BROWSER_MODE=shared, Playwright tasks get a context in one
+# long-lived Chromium instead of a Chromium of their own, starting from the
+# cookies saved in PLAYWRIGHT_STORAGE_STATE.
+SHARED_CHROMIUM = (
+    SharedChromium(
+        storage_state_path=os.environ.get("PLAYWRIGHT_STORAGE_STATE", "./browser_state.json"),
+        seed_user_data_dir=PLAYWRIGHT_USER_DATA_DIR,
+    )
+    if os.environ.get("PLAYWRIGHT_BROWSER_MODE", "persistent") == "shared"
+    else None
+)
+
+PLAYWRIGHT_POOL_SIZE = int(os.environ.get("PLAYWRIGHT_POOL_SIZE", 0))
+
+# With PLAYWRIGHT_PROFILE_SNAPSHOTS set, every persistent Playwright browser runs
+# on a clone of ./browser_data, so any number of them can share its logins.
+# "discard" throws each clone away afterwards, "merge" first copies its cookies
+# back into ./browser_data. Pools of more than one persistent browser always
+# use clones, since only one browser at a time can run on ./browser_data.
+PROFILE_SNAPSHOTS = (
+    ProfileSnapshots(
+        ProfileSnapshotConfig(
+            golden_dir=PLAYWRIGHT_USER_DATA_DIR,
+            clones_dir=os.environ.get("PLAYWRIGHT_PROFILE_CLONES_DIR", "./browser_profiles"),
+            on_release=os.environ.get("PLAYWRIGHT_PROFILE_SNAPSHOTS") or "discard",
+        )
+    )
+    if (os.environ.get("PLAYWRIGHT_PROFILE_SNAPSHOTS") or PLAYWRIGHT_POOL_SIZE > 1)
+    and not SHARED_CHROMIUM
+    else None
+)
+
+# Local browsers are recycled once they have run BROWSER_MAX_AGE_S or use more
+# than BROWSER_MAX_RSS_MB or BROWSER_MAX_JS_HEAP_MB, and new Playwright tasks are
+# refused while the host has less than MIN_HOST_MEMORY_MB available. 0 disables
+# a limit. Recycling only applies to pooled browsers, which outlive their task.
+MEMORY_GOVERNOR = MemoryGovernor(
+    MemoryGovernorConfig(
+        max_age_s=float(os.environ.get("BROWSER_MAX_AGE_S", 3600)),
+        max_rss_bytes=int(os.environ.get("BROWSER_MAX_RSS_MB", 2048)) * 2**20,
+        max_js_heap_bytes=int(os.environ.get("BROWSER_MAX_JS_HEAP_MB", 1024)) * 2**20,
+        min_host_available_bytes=int(os.environ.get("MIN_HOST_MEMORY_MB", 512)) * 2**20,
+    )
+)
+
+# Playwright browsers launched ahead of time and leased per task, so tasks
+# don't wait for a browser to start. Disabled unless PLAYWRIGHT_POOL_SIZE is set.
+PLAYWRIGHT_POOL_CONFIG = PlaywrightPoolConfig(
+    size=PLAYWRIGHT_POOL_SIZE,
+    warm_up=os.environ.get("PLAYWRIGHT_POOL_WARM_UP", "1").lower() in ["true", "1"],
+    health_check_interval_s=float(os.environ.get("PLAYWRIGHT_POOL_HEALTH_CHECK_S", 30)),
+    max_tasks_per_browser=int(os.environ.get("PLAYWRIGHT_POOL_MAX_TASKS", 50)),
+)
+
+
+def create_pooled_browser(index: int) -> AsyncPlaywrightComputer:
+    # A persistent context locks its profile, so browsers of bigger pools run on
+    # clones of it (see PROFILE_SNAPSHOTS). Shared browser contexts need none.
+    return AsyncPlaywrightComputer(
+        screen_size=PLAYWRIGHT_SCREEN_SIZE,
+        initial_url=PLAYWRIGHT_POOL_CONFIG.idle_url,
+        user_data_dir=PLAYWRIGHT_USER_DATA_DIR,
+        settle_config=SETTLE_CONFIG,
+        routing_config=ROUTING_CONFIG,
+        shared_browser=SHARED_CHROMIUM,
+        profile_snapshots=PROFILE_SNAPSHOTS,
+    )
+
+
+PLAYWRIGHT_POOL = (
+    PlaywrightPool(PLAYWRIGHT_POOL_CONFIG, create_pooled_browser, MEMORY_GOVERNOR)
+    if PLAYWRIGHT_POOL_CONFIG.size > 0
+    else None
+)
+
+
+def create_playwright_computer(
+    request: "BrowserTaskRequest", cancellation: CancellationToken
+) -> PlaywrightComputer:
+    """A computer for the request, leasing its browser from the pool if there is one."""
+    if PLAYWRIGHT_POOL:
+        return PLAYWRIGHT_POOL.computer(
+            initial_url=request.initial_url,
+            highlight_mouse=request.highlight_mouse,
+            cancellation=cancellation,
+        )
+    return PlaywrightComputer(
+        screen_size=PLAYWRIGHT_SCREEN_SIZE,
+        initial_url=request.initial_url,
+        highlight_mouse=request.highlight_mouse,
+        user_data_dir=PLAYWRIGHT_USER_DATA_DIR,
+        settle_config=SETTLE_CONFIG,
+        routing_config=ROUTING_CONFIG,
+        cancellation=cancellation,
+        shared_browser=SHARED_CHROMIUM,
+        profile_snapshots=PROFILE_SNAPSHOTS,
+    )
+
+
+# Browserbase sessions created ahead of time for each context and proxy
+# setting in use. Disabled unless BROWSERBASE_POOL_SIZE is set.
+BROWSERBASE_POOL_CONFIG = BrowserbasePoolConfig(
+    sessions_per_key=int(os.environ.get("BROWSERBASE_POOL_SIZE", 0)),
+    max_idle_s=float(os.environ.get("BROWSERBASE_POOL_MAX_IDLE_S", 600)),
+)
+
+
+def create_pooled_session(context_id: Optional[str], use_proxy: bool) -> AsyncBrowserbaseComputer:
+    return AsyncBrowserbaseComputer(
+        screen_size=PLAYWRIGHT_SCREEN_SIZE,
+        context_id=context_id,
+        use_proxy=use_proxy,
+        settle_config=SETTLE_CONFIG,
+        routing_config=ROUTING_CONFIG,
+        # Long enough for the task that leases the session at the last moment,
+        # so the session never times out under it.
+        session_timeout_s=int(BROWSERBASE_POOL_CONFIG.max_idle_s + TASK_TIMEOUT_S + 60),
+    )
+
+
+BROWSERBASE_POOL = (
+    BrowserbasePool(BROWSERBASE_POOL_CONFIG, create_pooled_session)
+    if BROWSERBASE_POOL_CONFIG.sessions_per_key > 0
+    else None
+)
+
+
+def create_browserbase_computer(
+    request: "BrowserTaskRequest", cancellation: CancellationToken
+) -> BrowserbaseComputer:
+    """A computer for the request, leasing its session from the pool if there is one."""
+    # Sessions that don't persist their context are rare enough not to pool.
+    if BROWSERBASE_POOL and request.persist_context:
+        return BROWSERBASE_POOL.computer(
+            initial_url=request.initial_url,
+            context_id=request.context_id,
+            use_proxy=request.use_proxy,
+            highlight_mouse=request.highlight_mouse,
+            cancellation=cancellation,
+        )
+    return BrowserbaseComputer(
+        screen_size=PLAYWRIGHT_SCREEN_SIZE,
+        initial_url=request.initial_url,
+        context_id=request.context_id,
+        persist_context=request.persist_context,
+        use_proxy=request.use_proxy,
+        settle_config=SETTLE_CONFIG,
+        routing_config=ROUTING_CONFIG,
+        cancellation=cancellation,
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PROFILE_SNAPSHOTS:
+        await asyncio.to_thread(PROFILE_SNAPSHOTS.remove_stale)
+    if PLAYWRIGHT_POOL:
+        logger.info(f"Warming up {PLAYWRIGHT_POOL_CONFIG.size} Playwright browsers")
+        await asyncio.to_thread(PLAYWRIGHT_POOL.start)
+    if BROWSERBASE_POOL:
+        logger.info("Creating pooled Browserbase sessions")
+        await asyncio.to_thread(BROWSERBASE_POOL.start)
+    yield
+    if PLAYWRIGHT_POOL:
+        await asyncio.to_thread(PLAYWRIGHT_POOL.close)
+    if BROWSERBASE_POOL:
+        await asyncio.to_thread(BROWSERBASE_POOL.close)
+    if SHARED_CHROMIUM:
+        await asyncio.wrap_future(get_browser_loop().submit(SHARED_CHROMIUM.close()))
+
+
 # FastAPI app
 app = FastAPI(
     title="Browser Automation API",
     description="API for Gemini computer use with Playwright and Browserbase",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Enable CORS for local development
@@ -66,6 +364,21 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to bound the label values.
+    route = request.scope.get("route")
+    SERVER_METRICS.request_duration_s.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        path=route.path if route else "unmatched",
+        status=str(response.status_code),
+    )
+    return response
+
+
 # Request/Response models
 class BrowserTaskRequest(BaseModel):
     query: str
@@ -76,6 +389,9 @@ class BrowserTaskRequest(BaseModel):
     initial_url: str = "https://www.google.com"
     highlight_mouse: bool = False
     model: str = "gemini-2.5-computer-use-preview-10-2025"
+    # The user the task runs for. Its safety confirmations can then only be
+    # answered with the same user_id.
+    user_id: Optional[str] = None
 
 
 class BrowserTaskResponse(BaseModel):
@@ -84,6 +400,15 @@ class BrowserTaskResponse(BaseModel):
     session_url: Optional[str] = None
     live_view_url: Optional[str] = None
     error: Optional[str] = None
+    # Time spent waiting for a worker, and running on it.
+    queue_wait_s: Optional[float] = None
+    execution_s: Optional[float] = None
+
+
+class SafetyConfirmationAnswer(BaseModel):
+    confirm: bool
+    # Must match the user_id the job was started with.
+    user_id: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
@@ -103,12 +428,91 @@ async def health_check():
     )
 
 
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Server metrics in the Prometheus text exposition format."""
+    if PLAYWRIGHT_POOL:
+        SERVER_METRICS.observe_browser_pool("playwright", PLAYWRIGHT_POOL.stats)
+    if BROWSERBASE_POOL:
+        SERVER_METRICS.observe_browser_pool("browserbase", BROWSERBASE_POOL.stats)
+    SERVER_METRICS.observe_memory_governor(MEMORY_GOVERNOR.stats)
+    if PROFILE_SNAPSHOTS:
+        # Sizes the clones on disk, so off the event loop.
+        SERVER_METRICS.observe_profile_snapshots(
+            await asyncio.to_thread(lambda: PROFILE_SNAPSHOTS.stats)
+        )
+    return PlainTextResponse(
+        SERVER_METRICS.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 # Main execution endpoint (non-streaming)
+def submit_task(task, env: str):
+    """Hands `task` to a worker, or answers 429 if none will be free soon.
+
+    Playwright tasks are answered 503 while the host is short of memory for
+    another local browser.
+    """
+    if env == "playwright":
+        try:
+            MEMORY_GOVERNOR.admit()
+        except HostMemoryLow as e:
+            logger.warning(str(e))
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after_s)},
+            )
+    try:
+        return TASK_EXECUTOR.submit(task)
+    except ExecutorSaturated as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after_s)},
+        )
+
+
+async def cancel_on_disconnect(http_request: Request, cancellation: CancellationToken):
+    """Cancels the task once the client of `http_request` disconnects."""
+    # The body has been read, so the next message is the disconnect.
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
+    cancellation.cancel("client disconnected")
+
+
+@contextlib.contextmanager
+def record_blocked_requests(env_name: str, env: PlaywrightComputer, job: Optional[Job] = None):
+    """Exports what request routing blocked in `env`, and reports it to `job`,
+    once the task in the block is done."""
+    try:
+        yield
+    finally:
+        stats = env.routing_stats
+        if stats:
+            SERVER_METRICS.observe_routing(env_name, stats)
+            if job and stats.blocked:
+                job.publish({'type': 'log', 'message': (
+                    f"Blocked {stats.blocked} of {stats.requests} requests, saving about "
+                    f"{stats.estimated_bytes_saved / 1e6:.1f} MB"
+                )})
+
+
+def deny_unconfirmable_action(safety: dict) -> str:
+    """Safety confirmation of /api/execute, whose clients can't be asked."""
+    logger.warning(f"Denied an action that requires confirmation: {safety.get('explanation')}")
+    return "TERMINATE"
+
+
 @app.post("/api/execute", response_model=BrowserTaskResponse)
-async def execute_browser_task(request: BrowserTaskRequest):
+async def execute_browser_task(request: BrowserTaskRequest, http_request: Request):
     """
     Execute a browser automation task using Gemini computer use.
 
+    The task is cancelled, and its browser closed, if the client disconnects.
+
     Args:
         request: Browser task configuration
 
@@ -119,6 +523,8 @@ async def execute_browser_task(request: BrowserTaskRequest):
         logger.info(f"Starting execution with query: {request.query[:100]}...")
         logger.info(f"Environment: {request.env}, Use proxy: {request.use_proxy}")
 
+        cancellation = CancellationToken()
+
         # Validate environment
         if request.env not in ["browserbase", "playwright"]:
             logger.error(f"Invalid environment: {request.env}")
@@ -130,11 +536,7 @@ async def execute_browser_task(request: BrowserTaskRequest):
         # Create appropriate environment
         if request.env == "playwright":
             logger.info("Creating Playwright environment")
-            env = PlaywrightComputer(
-                screen_size=PLAYWRIGHT_SCREEN_SIZE,
-                initial_url=request.initial_url,
-                highlight_mouse=request.highlight_mouse,
-            )
+            env = create_playwright_computer(request, cancellation)
         else:  # browserbase
             logger.info("Creating Browserbase environment")
             # Check for required env vars
@@ -151,44 +553,99 @@ async def execute_browser_task(request: BrowserTaskRequest):
                     detail="BROWSERBASE_PROJECT_ID environment variable not set"
                 )
 
-            env = BrowserbaseComputer(
-                screen_size=PLAYWRIGHT_SCREEN_SIZE,
-                initial_url=request.initial_url,
-                context_id=request.context_id,
-                persist_context=request.persist_context,
-                use_proxy=request.use_proxy,
-            )
+            env = create_browserbase_computer(request, cancellation)
 
-        # Execute the task
-        session_url = None
-        live_view_url = None
-        logger.info("Starting browser session")
-        with env as browser_computer:
-            # Capture session URL and live view URL if browserbase
-            if request.env == "browserbase":
-                session_url = f"https://browserbase.com/sessions/{env._session.id}"
-                live_view_url = env._live_view_url
-                logger.info(f"Browserbase session URL: {session_url}")
-                logger.info(f"Browserbase live view URL: {live_view_url}")
+        def run_task() -> BrowserTaskResponse:
+            """Runs the blocking browser session on a worker thread."""
+            cancellation.raise_if_cancelled()
+            cancellation.cancel_after(TASK_TIMEOUT_S)
+            session_url = None
+            live_view_url = None
+            logger.info("Starting browser session")
+            session_started = time.perf_counter()
+            with (
+                SERVER_METRICS.track_task(request.env),
+                env as browser_computer,
+                record_blocked_requests(request.env, env),
+            ):
+                SERVER_METRICS.observe_session_setup(
+                    request.env, time.perf_counter() - session_started, env.startup_timings
+                )
+                # Capture session URL and live view URL if browserbase
+                if request.env == "browserbase":
+                    session_url = env.session_url
+                    live_view_url = env.live_view_url
+                    logger.info(f"Browserbase session URL: {session_url}")
+                    logger.info(f"Browserbase live view URL: {live_view_url}")
 
-            # Run the agent
-            logger.info("Initializing agent")
-            agent = BrowserAgent(
-                browser_computer=browser_computer,
-                query=request.query,
-                model_name=request.model,
+                # Run the agent
+                logger.info("Initializing agent")
+                agent = BrowserAgent(
+                    browser_computer=browser_computer,
+                    query=request.query,
+                    model_name=request.model,
+                    log_callback=SERVER_METRICS.observe_agent_event,
+                    screenshot_encoding=SCREENSHOT_ENCODING,
+                    screen_change_threshold=SCREEN_CHANGE_THRESHOLD,
+                    compaction_config=COMPACTION_CONFIG,
+                    stream_responses=STREAM_MODEL_RESPONSES,
+                    context_cache_config=CONTEXT_CACHE_CONFIG,
+                    cancellation=cancellation,
+                    safety_confirmation=deny_unconfirmable_action,
+                )
+                logger.info("Starting agent loop")
+                agent.agent_loop()
+                SERVER_METRICS.agent_steps.observe(len(agent.metrics.turns))
+                logger.info("Agent loop completed")
+
+            logger.info("Execution completed successfully")
+            return BrowserTaskResponse(
+                status="success",
+                message="Task completed successfully",
+                session_url=session_url,
+                live_view_url=live_view_url
             )
-            logger.info("Starting agent loop")
-            agent.agent_loop()
-            logger.info("Agent loop completed")
 
-        logger.info("Execution completed successfully")
-        return BrowserTaskResponse(
-            status="success",
-            message="Task completed successfully",
-            session_url=session_url,
-            live_view_url=live_view_url
+        # Execute the task
+        ticket = submit_task(run_task, request.env)
+        # A task cancelled while queued gives up its place right away.
+        cancellation.on_cancel(ticket.future.cancel)
+        watcher = asyncio.create_task(
+            cancel_on_disconnect(http_request, cancellation)
         )
+        try:
+            response = await asyncio.wrap_future(ticket.future)
+        except TaskCancelled as e:
+            logger.info(f"Task cancelled: {e}")
+            response = BrowserTaskResponse(
+                status="cancelled",
+                message="Task cancelled",
+                error=str(e)
+            )
+        except asyncio.CancelledError:
+            if not cancellation.cancelled:
+                cancellation.cancel("request cancelled")
+                raise
+            # The client went away while the task was queued.
+            response = BrowserTaskResponse(
+                status="cancelled",
+                message="Task cancelled",
+                error=cancellation.reason
+            )
+        except Exception as e:
+            error_trace = traceback.format_exc()
+            logger.error(f"Error executing task: {error_trace}")
+            response = BrowserTaskResponse(
+                status="error",
+                message="Task execution failed",
+                error=str(e)
+            )
+        finally:
+            watcher.cancel()
+            cancellation.dispose()
+        response.queue_wait_s = ticket.queue_wait_s
+        response.execution_s = ticket.execution_s
+        return response
 
     except HTTPException as e:
         logger.error(f"HTTP Exception: {e.detail}")
@@ -207,142 +664,195 @@ async def execute_browser_task(request: BrowserTaskRequest):
         )
 
 
-# Streaming execution endpoint
-@app.post("/api/execute-stream")
-async def execute_browser_task_stream(request: BrowserTaskRequest):
-    """
-    Execute a browser automation task with streaming logs.
+def run_job(job: Job, request: BrowserTaskRequest):
+    """Run a browser task on a worker thread, publishing its progress to the job."""
+    job.start()
+    info = job.info
+    result = JobResult(
+        job_id=job.id,
+        status="failed",
+        message="Task execution failed",
+        queue_wait_s=info.started_at - info.created_at,
+    )
+    cancellation = job.cancellation
+    try:
+        # The job may have been cancelled just as it left the queue.
+        cancellation.raise_if_cancelled()
+        cancellation.cancel_after(TASK_TIMEOUT_S)
+        job.publish({'type': 'log', 'message': f'Waited {result.queue_wait_s:.1f}s for a free worker'})
+        job.publish({'type': 'log', 'message': f'Starting execution with query: {request.query[:100]}...'})
+        job.publish({'type': 'log', 'message': f'Environment: {request.env}, Use proxy: {request.use_proxy}'})
 
-    Returns Server-Sent Events (SSE) with real-time execution logs.
+        # Validate environment
+        if request.env not in ["browserbase", "playwright"]:
+            result.error = f'Invalid environment: {request.env}'
+            job.publish({'type': 'error', 'message': result.error, 'traceback': None})
+            return
 
-    Note: This endpoint runs the synchronous browser automation in a thread
-    to avoid async/sync conflicts with Playwright.
-    """
-    import queue
-    import threading
+        # Create appropriate environment
+        if request.env == "playwright":
+            job.publish({'type': 'log', 'message': 'Creating Playwright environment'})
+            env = create_playwright_computer(request, cancellation)
+        else:  # browserbase
+            job.publish({'type': 'log', 'message': 'Creating Browserbase environment'})
 
-    # Create a queue for passing logs from the thread to the async generator
-    log_queue: queue.Queue = queue.Queue()
+            # Check for required env vars
+            if "BROWSERBASE_API_KEY" not in os.environ:
+                result.error = 'BROWSERBASE_API_KEY environment variable not set'
+                job.publish({'type': 'error', 'message': result.error, 'traceback': None})
+                return
+            if "BROWSERBASE_PROJECT_ID" not in os.environ:
+                result.error = 'BROWSERBASE_PROJECT_ID environment variable not set'
+                job.publish({'type': 'error', 'message': result.error, 'traceback': None})
+                return
 
-    def run_browser_automation():
-        """Run browser automation in a separate thread."""
-        try:
-            log_queue.put(('log', f'Starting execution with query: {request.query[:100]}...'))
-            log_queue.put(('log', f'Environment: {request.env}, Use proxy: {request.use_proxy}'))
+            env = create_browserbase_computer(request, cancellation)
 
-            # Validate environment
-            if request.env not in ["browserbase", "playwright"]:
-                log_queue.put(('error', f'Invalid environment: {request.env}', None))
-                return
+        # Execute the task
+        session_url = None
+        live_view_url = None
+        job.publish({'type': 'log', 'message': 'Starting browser session'})
+
+        session_started = time.perf_counter()
+        with (
+            SERVER_METRICS.track_task(request.env),
+            env as browser_computer,
+            record_blocked_requests(request.env, env, job),
+        ):
+            SERVER_METRICS.observe_session_setup(
+                request.env, time.perf_counter() - session_started, env.startup_timings
+            )
+            if env.startup_timings:
+                job.publish({'type': 'log', 'message': 'Browser session phases: ' + ', '.join(
+                    f'{phase} {seconds:.2f}s' for phase, seconds in env.startup_timings.items()
+                )})
+            # Capture session URL and live view URL if browserbase
+            if request.env == "browserbase":
+                session_url = env.session_url
+                live_view_url = env.live_view_url
+                job.publish({'type': 'live_view_url', 'url': live_view_url})
+                job.publish({'type': 'session_url', 'url': session_url})
+                job.publish({'type': 'log', 'message': f'Session URL: {session_url}'})
+                job.publish({'type': 'log', 'message': f'Live View URL: {live_view_url}'})
 
-            # Create appropriate environment
-            if request.env == "playwright":
-                log_queue.put(('log', 'Creating Playwright environment'))
-                env = PlaywrightComputer(
-                    screen_size=PLAYWRIGHT_SCREEN_SIZE,
-                    initial_url=request.initial_url,
-                    highlight_mouse=request.highlight_mouse,
-                )
-            else:  # browserbase
-                log_queue.put(('log', 'Creating Browserbase environment'))
-
-                # Check for required env vars
-                if "BROWSERBASE_API_KEY" not in os.environ:
-                    log_queue.put(('error', 'BROWSERBASE_API_KEY environment variable not set', None))
-                    return
-                if "BROWSERBASE_PROJECT_ID" not in os.environ:
-                    log_queue.put(('error', 'BROWSERBASE_PROJECT_ID environment variable not set', None))
-                    return
-
-                env = BrowserbaseComputer(
-                    screen_size=PLAYWRIGHT_SCREEN_SIZE,
-                    initial_url=request.initial_url,
-                    context_id=request.context_id,
-                    persist_context=request.persist_context,
-                    use_proxy=request.use_proxy,
-                )
+            # Run the agent
+            job.publish({'type': 'log', 'message': 'Initializing browser agent'})
+
+            # Define callback for agent reasoning logs
+            def reasoning_callback(data):
+                SERVER_METRICS.observe_agent_event(data)
+                if data['type'] in ('reasoning', 'reasoning_delta', 'turn'):
+                    job.publish(data)
+                elif data['type'] == 'compaction':
+                    job.publish({'type': 'log', 'message': (
+                        f"Compacted {data['turns_folded']} turns, saving about "
+                        f"{data['estimated_tokens_saved']} of {data['tokens_before']} tokens"
+                    )})
 
-            # Execute the task
-            session_url = None
-            live_view_url = None
-            log_queue.put(('log', 'Starting browser session'))
+            agent = BrowserAgent(
+                browser_computer=browser_computer,
+                query=request.query,
+                model_name=request.model,
+                log_callback=reasoning_callback,
+                screenshot_encoding=SCREENSHOT_ENCODING,
+                screen_change_threshold=SCREEN_CHANGE_THRESHOLD,
+                compaction_config=COMPACTION_CONFIG,
+                stream_responses=STREAM_MODEL_RESPONSES,
+                context_cache_config=CONTEXT_CACHE_CONFIG,
+                cancellation=cancellation,
+                safety_confirmation=lambda safety: job.request_confirmation(
+                    safety, SAFETY_CONFIRMATION_TIMEOUT_S, TASK_EXECUTOR.park
+                ),
+            )
 
-            with env as browser_computer:
-                # Capture session URL and live view URL if browserbase
-                if request.env == "browserbase":
-                    session_url = f"https://browserbase.com/sessions/{env._session.id}"
-                    live_view_url = env._live_view_url
-                    log_queue.put(('live_view_url', live_view_url))
-                    log_queue.put(('session_url', session_url))
-                    log_queue.put(('log', f'Session URL: {session_url}'))
-                    log_queue.put(('log', f'Live View URL: {live_view_url}'))
+            job.publish({'type': 'log', 'message': 'Starting agent execution loop'})
+            agent.agent_loop()
+            SERVER_METRICS.agent_steps.observe(len(agent.metrics.turns))
+            result.steps = len(agent.metrics.turns)
+            result.final_reasoning = agent.final_reasoning
+            job.publish({'type': 'log', 'message': 'Agent loop completed'})
+
+        result.status = "succeeded"
+        result.message = 'Execution completed successfully'
+        result.session_url = session_url
+        result.live_view_url = live_view_url
+        job.publish({'type': 'success', 'message': result.message, 'session_url': session_url, 'live_view_url': live_view_url})
+
+    except TaskCancelled as e:
+        logger.info(f"Job {job.id} cancelled: {e}")
+        result.status = "cancelled"
+        result.message = "Task cancelled"
+        result.error = str(e)
+        job.publish({'type': 'cancelled', 'reason': str(e)})
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        logger.error(f"Error in job {job.id}: {error_trace}")
+        result.error = str(e)
+        job.publish({'type': 'error', 'message': str(e), 'traceback': error_trace})
+    finally:
+        result.execution_s = time.time() - info.started_at
+        JOB_MANAGER.finish(job, result)
+
+
+def start_job(request: BrowserTaskRequest) -> Job:
+    """Queue a job for `request`, or answer 429 if no worker will be free soon."""
+    job = JOB_MANAGER.create(request.query, request.env, request.user_id)
+    job.publish({'type': 'job', 'job_id': job.id})
+    try:
+        ticket = submit_task(lambda: run_job(job, request), request.env)
+    except HTTPException:
+        JOB_MANAGER.discard(job)
+        raise
+    # A job cancelled while queued gives up its place right away.
+    job.cancellation.on_cancel(
+        lambda: ticket.future.cancel() and finish_unstarted_job(job)
+    )
+    return job
 
-                # Run the agent
-                log_queue.put(('log', 'Initializing browser agent'))
 
-                # Define callback for agent reasoning logs
-                def reasoning_callback(data):
-                    log_queue.put(('reasoning', data['reasoning'], data['function_calls']))
+def finish_unstarted_job(job: Job):
+    """Finishes a job that was cancelled before a worker picked it up."""
+    reason = job.cancellation.reason
+    logger.info(f"Job {job.id} cancelled while queued: {reason}")
+    job.publish({'type': 'cancelled', 'reason': reason})
+    JOB_MANAGER.finish(job, JobResult(
+        job_id=job.id, status="cancelled", message="Task cancelled", error=reason
+    ))
 
-                agent = BrowserAgent(
-                    browser_computer=browser_computer,
-                    query=request.query,
-                    model_name=request.model,
-                    log_callback=reasoning_callback,
-                )
 
-                log_queue.put(('log', 'Starting agent execution loop'))
-                agent.agent_loop()
-                log_queue.put(('log', 'Agent loop completed'))
+def cancel_if_unwatched(job: Job):
+    if not job.finished and job.subscriber_count == 0:
+        job.cancellation.cancel("client disconnected")
 
-            log_queue.put(('success', 'Execution completed successfully', session_url, live_view_url))
 
-        except Exception as e:
-            error_trace = traceback.format_exc()
-            logger.error(f"Error in streaming execution: {error_trace}")
-            log_queue.put(('error', str(e), error_trace))
-        finally:
-            log_queue.put(('done', None))
+def job_event_response(
+    job: Job, last_event_id: int = 0, cancel_on_disconnect: bool = False
+) -> StreamingResponse:
+    """Stream the events of `job` after `last_event_id` as Server-Sent Events.
 
-    async def generate_logs() -> AsyncGenerator[str, None]:
-        """Generate SSE events from the queue."""
-        # Start browser automation in a separate thread
-        thread = threading.Thread(target=run_browser_automation)
-        thread.start()
+    With `cancel_on_disconnect`, the job is cancelled if no client is following
+    it `DISCONNECT_GRACE_S` after this one went away.
+    """
+    stream = EventStream(
+        heartbeat_s=SSE_HEARTBEAT_S,
+        max_buffered=SSE_MAX_BUFFERED_EVENTS,
+        on_coalesce=SERVER_METRICS.sse_events_coalesced.inc,
+    )
+    job.subscribe(stream, last_event_id)
 
+    async def events():
         try:
-            while True:
-                # Check queue with timeout to allow async context switching
-                try:
-                    await asyncio.sleep(0.1)  # Allow other async tasks to run
-
-                    # Get all available messages from queue
-                    while not log_queue.empty():
-                        message = log_queue.get_nowait()
-
-                        if message[0] == 'done':
-                            return
-                        elif message[0] == 'log':
-                            yield f"data: {json.dumps({'type': 'log', 'message': message[1]})}\n\n"
-                        elif message[0] == 'reasoning':
-                            yield f"data: {json.dumps({'type': 'reasoning', 'reasoning': message[1], 'function_calls': message[2]})}\n\n"
-                        elif message[0] == 'live_view_url':
-                            yield f"data: {json.dumps({'type': 'live_view_url', 'url': message[1]})}\n\n"
-                        elif message[0] == 'session_url':
-                            yield f"data: {json.dumps({'type': 'session_url', 'url': message[1]})}\n\n"
-                        elif message[0] == 'success':
-                            yield f"data: {json.dumps({'type': 'success', 'message': message[1], 'session_url': message[2], 'live_view_url': message[3]})}\n\n"
-                        elif message[0] == 'error':
-                            yield f"data: {json.dumps({'type': 'error', 'message': message[1], 'traceback': message[2]})}\n\n"
-
-                except queue.Empty:
-                    continue
-
+            async for message in stream.sse():
+                yield message
         finally:
-            thread.join(timeout=5)  # Wait for thread to finish
+            job.unsubscribe(stream)
+            if cancel_on_disconnect and not job.finished:
+                asyncio.get_running_loop().call_later(
+                    DISCONNECT_GRACE_S, cancel_if_unwatched, job
+                )
 
     return StreamingResponse(
-        generate_logs(),
+        events(),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -351,6 +861,97 @@ async def execute_browser_task_stream(request: BrowserTaskRequest):
     )
 
 
+# Streaming execution endpoint
+@app.post("/api/execute-stream")
+async def execute_browser_task_stream(request: BrowserTaskRequest):
+    """
+    Execute a browser automation task with streaming logs.
+
+    Returns Server-Sent Events (SSE) with real-time execution logs. The first
+    event carries the job id, which can be used to reconnect through
+    /api/jobs/{job_id}/events if the connection drops. If nobody reconnects
+    within DISCONNECT_GRACE_S, the task is cancelled.
+
+    Note: This endpoint runs the synchronous browser automation on a worker
+    thread to avoid async/sync conflicts with Playwright.
+    """
+    return job_event_response(start_job(request), cancel_on_disconnect=True)
+
+
+@app.post("/api/jobs", response_model=JobInfo, status_code=202)
+async def create_job(request: BrowserTaskRequest):
+    """Start a browser task in the background and return its job id."""
+    return start_job(request).info
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    """Status of a job."""
+    info = JOB_MANAGER.info(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return info
+
+
+@app.get("/api/jobs/{job_id}/result", response_model=JobResult)
+async def get_job_result(job_id: str):
+    """Result of a finished job, including the agent's final reasoning."""
+    info = JOB_MANAGER.info(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    result = JOB_MANAGER.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {info.status}")
+    return result
+
+
+@app.post("/api/jobs/{job_id}/cancel", response_model=JobInfo, status_code=202)
+async def cancel_job(job_id: str):
+    """Cancel a job. Its browser is closed once the current step is interrupted."""
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        if JOB_MANAGER.info(job_id) is not None:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} has finished")
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has finished")
+    job.cancellation.cancel("cancelled by client")
+    return job.info
+
+
+@app.post(
+    "/api/jobs/{job_id}/confirmations/{confirmation_id}",
+    response_model=JobInfo,
+    status_code=202,
+)
+async def answer_safety_confirmation(
+    job_id: str, confirmation_id: str, answer: SafetyConfirmationAnswer
+):
+    """Confirm or deny an action the agent is waiting on."""
+    job = JOB_MANAGER.get(job_id)
+    if job is None or not job.answer_confirmation(confirmation_id, answer.confirm, answer.user_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} is not waiting for confirmation {confirmation_id}",
+        )
+    return job.info
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: Optional[int] = Header(None)):
+    """
+    Replay the events of a job and follow the new ones as Server-Sent Events.
+
+    Clients reconnecting with a Last-Event-ID header resume after that event.
+    """
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        if JOB_MANAGER.info(job_id) is not None:
+            raise HTTPException(status_code=410, detail=f"Events of job {job_id} are no longer available")
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job_event_response(job, last_event_id or 0)
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -361,6 +962,7 @@ async def root():
         "endpoints": {
             "health": "/api/health",
             "execute": "/api/execute (POST)",
+            "jobs": "/api/jobs (POST)",
         },
         "docs": "/docs"
     }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Benchmark of the session startup latency saved by BrowserbasePool.
+
+Runs a local stand-in for the Browserbase API, whose sessions are local
+Chromium processes, and measures how long tasks wait for a ready session with
+and without the pool. The stand-in delays its responses like the real API
+does. Requires the Playwright Chromium (`playwright install chromium`).
+
+    python benchmark_browserbase_pool.py --tasks 10 --create-latency-s 1.5
+"""
+
+import argparse
+import datetime
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI
+
+from computers import (
+    AsyncBrowserbaseComputer,
+    BrowserbaseComputer,
+    BrowserbasePool,
+    BrowserbasePoolConfig,
+    get_browser_loop,
+)
+
+SCREEN_SIZE = (1280, 800)
+
+
+class StandInBrowserbase:
+    """The parts of the Browserbase API the computers use, backed by local Chromium."""
+
+    def __init__(self, chromium_path: str, create_latency_s: float, api_latency_s: float):
+        self._chromium_path = chromium_path
+        self._create_latency_s = create_latency_s
+        self._api_latency_s = api_latency_s
+        self._browsers: dict[str, tuple[subprocess.Popen, str]] = {}
+        self._lock = threading.Lock()
+        self.app = FastAPI()
+        self.app.post("/v1/contexts")(self.create_context)
+        self.app.post("/v1/sessions")(self.create_session)
+        self.app.get("/v1/sessions/{session_id}/debug")(self.debug_session)
+        self.app.post("/v1/sessions/{session_id}")(self.update_session)
+
+    def _launch_chromium(self) -> tuple[subprocess.Popen, str, str]:
+        user_data_dir = tempfile.mkdtemp(prefix="standin-chromium-")
+        process = subprocess.Popen(
+            [
+                self._chromium_path,
+                "--headless=new",
+                "--remote-debugging-port=0",
+                f"--user-data-dir={user_data_dir}",
+                f"--window-size={SCREEN_SIZE[0]},{SCREEN_SIZE[1]}",
+                "about:blank",
+            ],
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for line in process.stderr:
+            match = re.search(r"DevTools listening on (ws://\S+)", line)
+            if match:
+                # Keeps Chromium from blocking on a full pipe.
+                threading.Thread(target=process.stderr.read, daemon=True).start()
+                return process, user_data_dir, match.group(1)
+        raise RuntimeError("Chromium exited before listening for CDP")
+
+    def _session(self, session_id: str, connect_url: str) -> dict:
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return {
+            "id": session_id,
+            "connectUrl": connect_url,
+            "createdAt": now,
+            "expiresAt": now,
+            "keepAlive": False,
+            "projectId": "benchmark",
+            "proxyBytes": 0,
+            "region": "us-west-2",
+            "seleniumRemoteUrl": "",
+            "signingKey": "",
+            "startedAt": now,
+            "status": "RUNNING",
+            "updatedAt": now,
+        }
+
+    def create_context(self):
+        time.sleep(self._api_latency_s)
+        return {
+            "id": uuid.uuid4().hex,
+            "cipherAlgorithm": "AES-256-CBC",
+            "initializationVectorSize": 16,
+            "publicKey": "",
+            "uploadUrl": "",
+        }
+
+    def create_session(self):
+        # Sync handlers run on a thread pool, so creations overlap like real ones.
+        time.sleep(self._create_latency_s)
+        process, user_data_dir, connect_url = self._launch_chromium()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._browsers[session_id] = (process, user_data_dir)
+        return self._session(session_id, connect_url)
+
+    def debug_session(self, session_id: str):
+        time.sleep(self._api_latency_s)
+        url = f"https://standin.invalid/debug/{session_id}"
+        return {"debuggerFullscreenUrl": url, "debuggerUrl": url, "pages": [], "wsUrl": ""}
+
+    def update_session(self, session_id: str):
+        time.sleep(self._api_latency_s)
+        self.end_session(session_id)
+        return self._session(session_id, "")
+
+    def end_session(self, session_id: str):
+        with self._lock:
+            browser = self._browsers.pop(session_id, None)
+        if browser:
+            process, user_data_dir = browser
+            process.kill()
+            process.wait()
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+
+    def end_all_sessions(self):
+        with self._lock:
+            session_ids = list(self._browsers)
+        for session_id in session_ids:
+            self.end_session(session_id)
+
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def chromium_executable() -> str:
+    from playwright.async_api import async_playwright
+
+    async def find():
+        async with async_playwright() as p:
+            return p.chromium.executable_path
+
+    return get_browser_loop().run(find())
+
+
+def run_tasks(stand_in: StandInBrowserbase, create_computer, tasks: int, task_s: float) -> list[float]:
+    """Runs `tasks` tasks one after the other, returning their startup latencies."""
+    latencies = []
+    for _ in range(tasks):
+        started = time.perf_counter()
+        with create_computer() as computer:
+            latencies.append(time.perf_counter() - started)
+            time.sleep(task_s)
+        # Browserbase ends sessions when their CDP connection closes.
+        stand_in.end_session(computer.session_url.rsplit("/", 1)[-1])
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    print(
+        f"{name:>10} {statistics.mean(latencies):>8.2f} "
+        f"{statistics.median(latencies):>8.2f} {max(latencies):>8.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--task-s", type=float, default=3.0, help="Duration of each task")
+    parser.add_argument("--create-latency-s", type=float, default=1.5)
+    parser.add_argument("--api-latency-s", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    stand_in = StandInBrowserbase(chromium_executable(), args.create_latency_s, args.api_latency_s)
+    server = start_server(stand_in.app, args.port)
+    os.environ["BROWSERBASE_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["BROWSERBASE_API_KEY"] = "benchmark"
+    os.environ["BROWSERBASE_PROJECT_ID"] = "benchmark"
+    # Keeps the saved context of real sessions untouched.
+    context_file = os.path.join(tempfile.mkdtemp(), ".browserbase_context")
+    initial_url = "about:blank"
+
+    try:
+        unpooled = run_tasks(
+            stand_in,
+            lambda: BrowserbaseComputer(
+                screen_size=SCREEN_SIZE,
+                initial_url=initial_url,
+                context_id="benchmark",
+                context_file=context_file,
+            ),
+            args.tasks,
+            args.task_s,
+        )
+
+        pool = BrowserbasePool(
+            BrowserbasePoolConfig(warm_keys=[("benchmark", False)]),
+            lambda context_id, use_proxy: AsyncBrowserbaseComputer(
+                screen_size=SCREEN_SIZE,
+                initial_url=initial_url,
+                context_id=context_id,
+                context_file=context_file,
+                use_proxy=use_proxy,
+            ),
+        )
+        pool.start()
+        while pool.stats.idle == 0:
+            time.sleep(0.05)
+        try:
+            pooled = run_tasks(
+                stand_in,
+                lambda: pool.computer(initial_url, context_id="benchmark"),
+                args.tasks,
+                args.task_s,
+            )
+        finally:
+            pool.close()
+    finally:
+        stand_in.end_all_sessions()
+        server.should_exit = True
+
+    print(f"Seconds until a session is ready, over {args.tasks} tasks:")
+    print(f"{'':>10} {'mean':>8} {'median':>8} {'max':>8}")
+    report("unpooled", unpooled)
+    report("pooled", pooled)
+
+
+if __name__ == "__main__":
+    main()
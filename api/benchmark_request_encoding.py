@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark of the CPU time spent encoding generate_content requests per turn.
+
+Simulates a long agent run and compares encoding the whole history with the SDK
+on every turn against IncrementalRequestEncoder. No requests are sent.
+
+    python benchmark_request_encoding.py --turns 100
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+from typing import Optional
+from unittest.mock import MagicMock
+
+from google.genai import types
+from PIL import Image
+
+from agent import BrowserAgent
+from request_encoding import IncrementalRequestEncoder
+from screenshots import ScreenshotHistory
+
+
+def make_screenshot() -> bytes:
+    output = io.BytesIO()
+    Image.effect_noise((1280, 720), 32).convert("RGB").save(
+        output, format="JPEG", quality=80
+    )
+    return output.getvalue()
+
+
+def make_turn(i: int, screenshot: bytes) -> tuple[types.Content, types.Content]:
+    model_turn = types.Content(
+        role="model",
+        parts=[
+            types.Part(text=f"Step {i}: I will click on the next result. " * 5),
+            types.Part(
+                function_call=types.FunctionCall(
+                    name="click_at", args={"x": 500, "y": 300}
+                )
+            ),
+        ],
+    )
+    response_turn = types.Content(
+        role="user",
+        parts=[
+            types.Part(
+                function_response=types.FunctionResponse(
+                    name="click_at",
+                    response={"url": f"https://example.com/{i}"},
+                    parts=[
+                        types.FunctionResponsePart(
+                            inline_data=types.FunctionResponseBlob(
+                                mime_type="image/jpeg", data=screenshot
+                            )
+                        )
+                    ],
+                )
+            )
+        ],
+    )
+    return model_turn, response_turn
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--report-every", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    agent = BrowserAgent(
+        browser_computer=MagicMock(), query="Benchmark query", model_name="benchmark"
+    )
+    config = agent._generate_content_config
+    encoder = IncrementalRequestEncoder(agent._client, "benchmark", config)
+    history = ScreenshotHistory(
+        full_turns=3, thumbnail_turns=4, on_degrade=encoder.invalidate
+    )
+    screenshot = make_screenshot()
+    contents = [types.Content(role="user", parts=[types.Part(text="Benchmark query")])]
+
+    print(f"{'turn':>6} {'sdk ms':>10} {'incremental ms':>16} {'body KB':>10}")
+    for i in range(1, args.turns + 1):
+        model_turn, response_turn = make_turn(i, screenshot)
+        contents += [model_turn, response_turn]
+        history.add(
+            response_turn, [response_turn.parts[0].function_response], len(contents) - 1
+        )
+
+        start = time.process_time()
+        parameters = types._GenerateContentParameters(
+            model="benchmark", contents=contents, config=config
+        )
+        body = json.dumps(encoder._encode(parameters))
+        sdk_ms = (time.process_time() - start) * 1000
+
+        start = time.process_time()
+        body = json.dumps(
+            {**encoder._template, "contents": encoder.encode_contents(contents)}
+        )
+        incremental_ms = (time.process_time() - start) * 1000
+
+        if i % args.report_every == 0:
+            print(
+                f"{i:>6} {sdk_ms:>10.2f} {incremental_ms:>16.2f} {len(body) / 1024:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
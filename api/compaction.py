@@ -0,0 +1,218 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Folds old turns of a long agent conversation into a summary."""
+import json
+from typing import Callable, Literal, Optional
+
+import pydantic
+from google.genai.types import Content, Part
+
+# Rough size of a text token, used to apportion the reported token counts.
+CHARS_PER_TOKEN = 4
+# What the model charges for a small image.
+TOKENS_PER_IMAGE = 258
+# Reasoning is truncated to this many characters in rule-based summaries.
+MAX_REASONING_CHARS = 300
+
+SUMMARY_HEADER = "Summary of the earlier steps of this task:"
+# Stands in for the oldest lines of a summary that grew past its cap.
+OMITTED_LINE = "- (earlier steps omitted)"
+
+MODEL_SUMMARY_PROMPT = """You are helping a browser agent keep its context short.
+Below is a log of the steps the agent has already taken for its task. Summarize it
+in a few short paragraphs: what has been done, what was found, which pages were
+visited and anything still left to do. Keep every fact the agent will need later,
+such as names, numbers, URLs and form values.
+
+"""
+
+
+class CompactionConfig(pydantic.BaseModel):
+    # Compact once a request's prompt exceeds this many tokens.
+    token_budget: int = 32_000
+    # Compaction folds turns until the prompt is about this fraction of the
+    # budget, so it doesn't have to run again on the next turn.
+    target_ratio: float = 0.5
+    # How many of the most recent model turns are kept verbatim. Fewer are
+    # kept if that's what it takes to reach the target, but always one.
+    keep_recent_turns: int = 8
+    # The summary keeps only its latest lines beyond this many tokens.
+    max_summary_tokens: int = 2_000
+    # "rules" summarizes mechanically; "model" asks the model for a summary and
+    # falls back to the rules if that fails.
+    summarizer: Literal["rules", "model"] = "rules"
+    # The model used for "model" summaries.
+    summary_model: str = "gemini-2.5-flash"
+
+
+class CompactionEvent(pydantic.BaseModel):
+    turns_folded: int
+    tokens_before: int
+    estimated_tokens_saved: int
+
+
+def estimate_tokens(content: Content) -> int:
+    """Estimates the size of a content from its text and images."""
+    chars = 0
+    images = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        if part.function_call:
+            chars += len(part.function_call.name or "")
+            chars += len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            chars += len(part.function_response.name or "")
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+            images += len(part.function_response.parts or [])
+    return chars // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE
+
+
+def _describe_turn(model_turn: Content, response_turn: Optional[Content]) -> str:
+    reasoning = " ".join(p.text for p in model_turn.parts or [] if p.text).strip()
+    if len(reasoning) > MAX_REASONING_CHARS:
+        reasoning = reasoning[:MAX_REASONING_CHARS] + "..."
+    calls = []
+    for part in model_turn.parts or []:
+        if part.function_call:
+            args = ", ".join(
+                f"{k}={v!r}"
+                for k, v in (part.function_call.args or {}).items()
+                if k != "safety_decision"
+            )
+            calls.append(f"{part.function_call.name}({args})")
+    urls = []
+    for part in (response_turn.parts if response_turn else None) or []:
+        response = part.function_response
+        if response and response.response and response.response.get("url"):
+            urls.append(response.response["url"])
+    line = reasoning or "(no reasoning)"
+    if calls:
+        line += " -> " + "; ".join(calls)
+    if urls:
+        line += f" [now at {urls[-1]}]"
+    return line
+
+
+class ConversationCompactor:
+    """Replaces the older turns of a conversation with a summary.
+
+    The original query and the most recent turns are kept verbatim. The summary
+    is appended to the query turn, so roles keep alternating and every kept
+    function call is still followed by its response. Compacting rewrites the
+    query turn and so the whole prompt prefix, so it folds well below the
+    budget, and the summary is capped, to keep it from recurring every turn.
+    """
+
+    def __init__(
+        self,
+        config: CompactionConfig,
+        summarize_with_model: Optional[Callable[[str], str]] = None,
+    ):
+        self._config = config
+        self._summarize_with_model = summarize_with_model
+
+    @property
+    def config(self) -> CompactionConfig:
+        return self._config
+
+    def should_compact(self, prompt_tokens: Optional[int]) -> bool:
+        return prompt_tokens is not None and prompt_tokens > self._config.token_budget
+
+    def compact(
+        self, contents: list[Content], prompt_tokens: int
+    ) -> Optional[tuple[list[Content], CompactionEvent]]:
+        """Returns the compacted contents, or None if there is nothing to fold."""
+        estimated_before = sum(estimate_tokens(c) for c in contents) or 1
+        start = self._fold_until(contents, prompt_tokens / estimated_before)
+        query_turn, folded = contents[0], contents[1:start]
+        if not folded:
+            return None
+
+        query_parts = query_turn.parts[:1]
+        previous_summary = "\n".join(p.text for p in query_turn.parts[1:] if p.text)
+        summary = self._summarize(previous_summary, folded)
+        compacted = [
+            Content(role="user", parts=[*query_parts, Part(text=summary)])
+        ] + contents[start:]
+
+        # The prompt tokens were counted on the contents before this compaction, so
+        # apportion them by the estimated size of what was removed.
+        estimated_after = sum(estimate_tokens(c) for c in compacted)
+        saved = max(0, estimated_before - estimated_after)
+        event = CompactionEvent(
+            turns_folded=sum(1 for c in folded if c.role == "model"),
+            tokens_before=prompt_tokens,
+            estimated_tokens_saved=int(prompt_tokens * saved / estimated_before),
+        )
+        return compacted, event
+
+    def _fold_until(self, contents: list[Content], tokens_per_estimate: float) -> int:
+        """Returns the index of the first content to keep verbatim.
+
+        Keeps up to `keep_recent_turns` model turns, and fewer while the kept
+        turns and a full-size summary would exceed the target.
+        """
+        model_turns = [i for i, c in enumerate(contents) if c.role == "model"]
+        keep = min(self._config.keep_recent_turns, len(model_turns))
+        if keep == 0:
+            return len(contents)
+        target = self._config.token_budget * self._config.target_ratio
+        fixed = estimate_tokens(contents[0]) + self._config.max_summary_tokens
+        start = model_turns[len(model_turns) - keep]
+        kept = sum(estimate_tokens(c) for c in contents[start:])
+        while keep > 1 and (fixed + kept) * tokens_per_estimate > target:
+            keep -= 1
+            next_start = model_turns[len(model_turns) - keep]
+            kept -= sum(estimate_tokens(c) for c in contents[start:next_start])
+            start = next_start
+        return start
+
+    def _cap(self, lines: list[str]) -> list[str]:
+        """Drops the oldest summary lines beyond `max_summary_tokens`."""
+        max_chars = self._config.max_summary_tokens * CHARS_PER_TOKEN
+        omitted = bool(lines) and lines[0] == OMITTED_LINE
+        if omitted:
+            lines = lines[1:]
+        chars = sum(len(line) + 1 for line in lines)
+        dropped = 0
+        while dropped < len(lines) - 1 and chars > max_chars:
+            chars -= len(lines[dropped]) + 1
+            dropped += 1
+        if dropped or omitted:
+            return [OMITTED_LINE] + lines[dropped:]
+        return lines
+
+    def _summarize(self, previous_summary: str, folded: list[Content]) -> str:
+        steps = []
+        for i, content in enumerate(folded):
+            if content.role != "model":
+                continue
+            response_turn = folded[i + 1] if i + 1 < len(folded) else None
+            steps.append(f"- {_describe_turn(content, response_turn)}")
+        log = "\n".join(steps)
+        if previous_summary.startswith(SUMMARY_HEADER):
+            previous_summary = previous_summary[len(SUMMARY_HEADER) :].strip()
+
+        if self._config.summarizer == "model" and self._summarize_with_model:
+            try:
+                transcript = "\n".join(filter(None, [previous_summary, log]))
+                summary = self._summarize_with_model(MODEL_SUMMARY_PROMPT + transcript)
+                if summary:
+                    lines = self._cap(summary.strip().splitlines())
+                    return "\n".join([SUMMARY_HEADER, *lines])
+            except Exception as e:
+                print(f"Model summary failed, summarizing by rules instead: {e}")
+        lines = self._cap(previous_summary.splitlines() + steps)
+        return "\n".join([SUMMARY_HEADER, *lines])
@@ -11,13 +11,87 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from .computer import Computer, EnvState
+from .computer import (
+    AsyncComputer,
+    AsyncDeferredEnvState,
+    AsyncObservation,
+    Computer,
+    DeferredEnvState,
+    EnvState,
+    Observation,
+)
+from .browser_loop import BrowserLoop, get_browser_loop
+from .cancellation import CancellationToken, TaskCancelled
+from .browserbase.async_browserbase import AsyncBrowserbaseComputer
 from .browserbase.browserbase import BrowserbaseComputer
+from .browserbase.pool import (
+    BrowserbasePool,
+    BrowserbasePoolConfig,
+    BrowserbasePoolStats,
+    PooledBrowserbaseComputer,
+)
+from .playwright.async_playwright import AsyncPlaywrightComputer
+from .playwright.memory import (
+    HostMemoryLow,
+    MemoryGovernor,
+    MemoryGovernorConfig,
+    MemoryGovernorStats,
+    MemorySample,
+)
 from .playwright.playwright import PlaywrightComputer
+from .playwright.pool import (
+    PlaywrightPool,
+    PlaywrightPoolConfig,
+    PlaywrightPoolStats,
+    PooledPlaywrightComputer,
+)
+from .playwright.profiles import (
+    ProfileClone,
+    ProfileSnapshotConfig,
+    ProfileSnapshots,
+    ProfileSnapshotStats,
+)
+from .playwright.routing import RequestRouter, RoutingConfig, RoutingStats
+from .playwright.settle import SettleConfig, SettleResult
+from .playwright.shared_browser import SharedChromium
 
 __all__ = [
+    "AsyncBrowserbaseComputer",
+    "AsyncComputer",
+    "AsyncDeferredEnvState",
+    "AsyncObservation",
+    "AsyncPlaywrightComputer",
+    "BrowserLoop",
+    "CancellationToken",
     "Computer",
+    "DeferredEnvState",
     "EnvState",
+    "HostMemoryLow",
+    "MemoryGovernor",
+    "MemoryGovernorConfig",
+    "MemoryGovernorStats",
+    "MemorySample",
+    "Observation",
     "BrowserbaseComputer",
+    "BrowserbasePool",
+    "BrowserbasePoolConfig",
+    "BrowserbasePoolStats",
     "PlaywrightComputer",
+    "PlaywrightPool",
+    "PlaywrightPoolConfig",
+    "PlaywrightPoolStats",
+    "PooledBrowserbaseComputer",
+    "PooledPlaywrightComputer",
+    "ProfileClone",
+    "ProfileSnapshotConfig",
+    "ProfileSnapshotStats",
+    "ProfileSnapshots",
+    "RequestRouter",
+    "RoutingConfig",
+    "RoutingStats",
+    "SettleConfig",
+    "SettleResult",
+    "SharedChromium",
+    "TaskCancelled",
+    "get_browser_loop",
 ]
@@ -0,0 +1,61 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BrowserLoop:
+    """An asyncio event loop running on a daemon thread.
+
+    The synchronous computers run their async counterparts here. Since all the
+    Playwright objects live on this one loop, a synchronous computer can be used
+    from any thread, and browsers can be shared between computers.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="browser-loop", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Runs the coroutine on the loop and waits for its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("BrowserLoop.run() would deadlock on the loop thread.")
+        return self.submit(coroutine).result(timeout)
+
+
+_browser_loop: Optional[BrowserLoop] = None
+_browser_loop_lock = threading.Lock()
+
+
+def get_browser_loop() -> BrowserLoop:
+    """Returns the process-wide browser loop, starting it on first use."""
+    global _browser_loop
+    with _browser_loop_lock:
+        if _browser_loop is None:
+            _browser_loop = BrowserLoop()
+        return _browser_loop
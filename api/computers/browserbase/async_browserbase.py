@@ -0,0 +1,244 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import os
+import termcolor
+import time
+from typing import Optional
+from ..playwright.async_playwright import AsyncPlaywrightComputer
+from ..playwright.routing import RoutingConfig
+from ..playwright.settle import SettleConfig
+import browserbase
+from playwright.async_api import async_playwright
+
+
+class AsyncBrowserbaseComputer(AsyncPlaywrightComputer):
+    def __init__(
+        self,
+        screen_size: tuple[int, int],
+        initial_url: str = "https://www.google.com",
+        context_id: str = None,
+        persist_context: bool = True,
+        context_file: str = ".browserbase_context",
+        use_proxy: bool = False,
+        settle_config: Optional[SettleConfig] = None,
+        session_timeout_s: Optional[int] = None,
+        routing_config: Optional[RoutingConfig] = None,
+    ):
+        super().__init__(
+            screen_size, initial_url, settle_config=settle_config, routing_config=routing_config
+        )
+        self._context_id = context_id
+        self._persist_context = persist_context
+        self._context_file = context_file
+        self._use_proxy = use_proxy
+        # Browserbase ends the session after this long. Defaults to the project's setting.
+        self._session_timeout_s = session_timeout_s
+        self._live_view_url = None
+        self._live_view_lookup: Optional[asyncio.Task] = None
+        self._active_context_id: Optional[str] = None
+        self._browserbase: Optional[browserbase.AsyncBrowserbase] = None
+        self._session = None
+        self._browser = None
+
+    def _load_context_id(self) -> str:
+        """Load context ID from file if it exists."""
+        if os.path.exists(self._context_file):
+            with open(self._context_file, 'r') as f:
+                context_id = f.read().strip()
+                if context_id:
+                    return context_id
+        return None
+
+    def _save_context_id(self, context_id: str):
+        """Save context ID to file."""
+        with open(self._context_file, 'w') as f:
+            f.write(context_id)
+
+    async def _create_or_load_context(self, browserbase_client):
+        """Create a new context or load an existing one."""
+        # If context_id was explicitly provided, use it
+        if self._context_id:
+            print(f"Using provided context ID: {self._context_id}")
+            return self._context_id
+
+        # Try to load from file
+        saved_context_id = self._load_context_id()
+        if saved_context_id:
+            print(f"Using saved context ID: {saved_context_id}")
+            return saved_context_id
+
+        # Create new context
+        print("Creating new Browserbase context...")
+        context = await browserbase_client.contexts.create(
+            project_id=os.environ["BROWSERBASE_PROJECT_ID"]
+        )
+        print(f"Created new context ID: {context.id}")
+        return context.id
+
+    @property
+    def session_url(self) -> str:
+        return f"https://browserbase.com/sessions/{self._session.id}"
+
+    @property
+    def live_view_url(self) -> Optional[str]:
+        """The live view URL, or None if it isn't known (yet)."""
+        return self._live_view_url
+
+    async def get_live_view_url(self) -> Optional[str]:
+        """The live view URL, waiting for it to be looked up if need be."""
+        if self._live_view_lookup:
+            # Unlike awaiting the task, doesn't raise if it was cancelled.
+            await asyncio.wait({self._live_view_lookup})
+        return self._live_view_url
+
+    def _session_params(self) -> dict:
+        # Build browser settings
+        browser_settings = {
+            "fingerprint": {
+                "screen": {
+                    "maxWidth": 1920,
+                    "maxHeight": 1080,
+                    "minWidth": 1024,
+                    "minHeight": 768,
+                },
+            },
+            "viewport": {
+                "width": self._screen_size[0],
+                "height": self._screen_size[1],
+            },
+        }
+
+        # Add context configuration if persistence is enabled
+        if self._persist_context:
+            browser_settings["context"] = {
+                "id": self._active_context_id,
+                "persist": True,
+            }
+
+        # Create session with optional proxy support
+        session_params = {
+            "project_id": os.environ["BROWSERBASE_PROJECT_ID"],
+            "browser_settings": browser_settings,
+        }
+
+        if self._session_timeout_s:
+            session_params["api_timeout"] = self._session_timeout_s
+
+        # Add proxy configuration if enabled
+        if self._use_proxy:
+            session_params["proxies"] = [{
+                "type": "browserbase",
+                "geolocation": {
+                    "country": "US",  # Residential IP in US
+                }
+            }]
+        return session_params
+
+    async def _start_driver(self):
+        self._playwright = await async_playwright().start()
+
+    async def _create_session(self):
+        # Get or create context
+        self._active_context_id = await self._create_or_load_context(self._browserbase)
+        self._session = await self._browserbase.sessions.create(**self._session_params())
+
+    async def _look_up_live_view_url(self):
+        try:
+            live_view_links = await self._browserbase.sessions.debug(self._session.id)
+            self._live_view_url = live_view_links.debugger_fullscreen_url
+            termcolor.cprint(
+                f"🔍 Live View URL: {self._live_view_url}",
+                color="cyan",
+                attrs=["bold"],
+            )
+        except Exception as e:
+            print(f"Warning: Could not get live view URL: {e}")
+
+    async def __aenter__(self):
+        print("Creating session...")
+        started = time.perf_counter()
+
+        self._browserbase = browserbase.AsyncBrowserbase(
+            api_key=os.environ["BROWSERBASE_API_KEY"]
+        )
+        # The driver starts while Browserbase creates the session. Both are
+        # awaited before raising, so a failure leaves nothing behind unreleased.
+        results = await asyncio.gather(
+            self._timed("driver_start", self._start_driver()),
+            self._timed("session_create", self._create_session()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        # Only needed once someone asks for it, so it doesn't hold up the session.
+        self._live_view_lookup = self._run_in_background(
+            self._timed("live_view", self._look_up_live_view_url())
+        )
+
+        self._browser = await self._timed(
+            "connect", self._playwright.chromium.connect_over_cdp(self._session.connect_url)
+        )
+        self._context = self._browser.contexts[0]
+        self._adopt_page(self._context.pages[0])
+        self._context.on("page", self._handle_new_page)
+        if self._router:
+            await self._timed("routing", self._router.attach(self._context))
+        await self._timed("navigate", self._page.goto(self._initial_url))
+        self.startup_timings["total"] = time.perf_counter() - started
+
+        termcolor.cprint(
+            f"Session started at {self.session_url} ({self._format_startup_timings()})",
+            color="green",
+            attrs=["bold"],
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._cancel_background_tasks()
+        if self._page:
+            await self._page.close()
+            self._page = None
+
+        if self._context:
+            await self._context.close()
+            self._context = None
+
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+        # Save context ID to file if persistence is enabled and we have an active context
+        if self._persist_context and self._active_context_id:
+            self._save_context_id(self._active_context_id)
+
+    async def abort(self):
+        """Releases the session, so it stops being billed, and stops the driver."""
+        if self._session and self._browserbase:
+            try:
+                await self._browserbase.sessions.update(
+                    self._session.id,
+                    project_id=os.environ["BROWSERBASE_PROJECT_ID"],
+                    status="REQUEST_RELEASE",
+                )
+            except Exception as e:
+                print(f"Releasing session {self._session.id} failed: {e}")
+        self._browser = None
+        await super().abort()
@@ -0,0 +1,308 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import collections
+import logging
+import time
+from typing import Callable, Optional
+
+import pydantic
+
+from ..browser_loop import get_browser_loop
+from ..cancellation import CancellationToken
+from ..playwright.playwright import CLOSE_TIMEOUT_S
+from .async_browserbase import AsyncBrowserbaseComputer
+from .browserbase import BrowserbaseComputer
+
+logger = logging.getLogger(__name__)
+
+# The context id, None for the saved one, and whether the session uses proxies.
+SessionKey = tuple[Optional[str], bool]
+
+
+class BrowserbasePoolConfig(pydantic.BaseModel):
+    # Sessions kept ready for each key in use.
+    sessions_per_key: int = 1
+    # Keys kept ready from the start, before any lease asks for them.
+    warm_keys: list[SessionKey] = [(None, False)]
+    # At most this many keys are kept ready. The least recently leased go first.
+    max_keys: int = 4
+    # Keys not leased for this long stop being kept ready.
+    key_ttl_s: float = 1800.0
+    # Idle sessions older than this are released and replaced, so that a task
+    # leasing one has the rest of the session timeout to run.
+    max_idle_s: float = 600.0
+    # How often the pool retires old sessions and replaces missing ones, besides
+    # right after every lease.
+    refill_interval_s: float = 5.0
+
+
+class BrowserbasePoolStats(pydantic.BaseModel):
+    keys: int
+    idle: int
+    # Sessions being created in the background.
+    creating: int
+    # Leases served by a session created ahead of time, and by a new one.
+    warm_leases: int
+    cold_leases: int
+    # Idle sessions released because they got too old or stopped responding.
+    recycled: int
+    # The same, by "age", "unused" (no recent leases of the key) or "unusable".
+    recycled_by_reason: dict[str, int]
+    creation_failures: int
+
+
+class _IdleSession:
+    def __init__(self, computer: AsyncBrowserbaseComputer):
+        self.computer = computer
+        self.created_at = time.monotonic()
+
+
+class BrowserbasePool:
+    """Browserbase sessions created and CDP-connected ahead of demand.
+
+    `computer_factory` makes an unstarted computer for a key. For every key
+    leased recently, plus `warm_keys`, the pool keeps `sessions_per_key`
+    sessions started on the shared browser loop and refills them in the
+    background. Sessions are used for one task only and released when it ends,
+    like unpooled ones.
+
+    Sessions read their context when they are created, so a pooled session
+    doesn't see cookies saved to the context after that.
+    """
+
+    def __init__(
+        self,
+        config: BrowserbasePoolConfig,
+        computer_factory: Callable[[Optional[str], bool], AsyncBrowserbaseComputer],
+    ):
+        self._config = config
+        self._computer_factory = computer_factory
+        self._browser_loop = get_browser_loop()
+        self._idle: dict[SessionKey, collections.deque[_IdleSession]] = collections.defaultdict(collections.deque)
+        self._creating: collections.Counter[SessionKey] = collections.Counter()
+        # Monotonic time each key was last leased.
+        self._last_leased: dict[SessionKey, float] = {}
+        self._refill_needed = asyncio.Event()
+        self._warm_leases = 0
+        self._cold_leases = 0
+        self._recycled: collections.Counter[str] = collections.Counter()
+        self._creation_failures = 0
+        self._closed = False
+        self._refills: Optional[asyncio.Task] = None
+        # Keeps the background tasks from being garbage collected.
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def config(self) -> BrowserbasePoolConfig:
+        return self._config
+
+    @property
+    def stats(self) -> BrowserbasePoolStats:
+        return BrowserbasePoolStats(
+            keys=len(self._active_keys()),
+            idle=sum(len(sessions) for sessions in list(self._idle.values())),
+            creating=sum(self._creating.values()),
+            warm_leases=self._warm_leases,
+            cold_leases=self._cold_leases,
+            recycled=sum(self._recycled.values()),
+            recycled_by_reason=dict(self._recycled),
+            creation_failures=self._creation_failures,
+        )
+
+    def start(self):
+        """Starts creating sessions for the warm keys, and refilling them."""
+        self._browser_loop.run(self._start())
+
+    def close(self):
+        """Releases the idle sessions. Leased ones are released by their task."""
+        self._browser_loop.run(self._close())
+
+    def computer(
+        self,
+        initial_url: str,
+        context_id: Optional[str] = None,
+        use_proxy: bool = False,
+        highlight_mouse: bool = False,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> "PooledBrowserbaseComputer":
+        """A computer that leases a session of the pool when its context is entered."""
+        return PooledBrowserbaseComputer(
+            self, (context_id, use_proxy), initial_url, highlight_mouse, cancellation
+        )
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _start(self):
+        self._refill_needed.set()
+        self._refills = self._spawn(self._refill_periodically())
+
+    async def _close(self):
+        self._closed = True
+        if self._refills:
+            self._refills.cancel()
+        # Let session creations finish, so their sessions get released too.
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for sessions in self._idle.values():
+            while sessions:
+                await self._release(sessions.popleft().computer)
+
+    def _active_keys(self) -> list[SessionKey]:
+        """The keys to keep sessions ready for, most recently leased first."""
+        now = time.monotonic()
+        last_leased = dict(self._last_leased)
+        leased = sorted(
+            (key for key, at in last_leased.items() if now - at < self._config.key_ttl_s),
+            key=last_leased.get,
+            reverse=True,
+        )
+        keys = leased + [key for key in self._config.warm_keys if key not in leased]
+        return keys[: self._config.max_keys]
+
+    async def _refill_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_needed.wait(), self._config.refill_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_needed.clear()
+            self._refill()
+
+    def _refill(self):
+        """Releases stale sessions and starts creating the missing ones."""
+        active = self._active_keys()
+        now = time.monotonic()
+        for key, sessions in self._idle.items():
+            for session in list(sessions):
+                if key not in active or now - session.created_at > self._config.max_idle_s:
+                    sessions.remove(session)
+                    self._recycled["unused" if key not in active else "age"] += 1
+                    self._spawn(self._release(session.computer))
+        for key in active:
+            missing = self._config.sessions_per_key - len(self._idle[key]) - self._creating[key]
+            for _ in range(missing):
+                self._spawn(self._create(key))
+
+    async def _create(self, key: SessionKey):
+        self._creating[key] += 1
+        try:
+            computer = await self._start_session(key)
+        except Exception as e:
+            self._creation_failures += 1
+            logger.warning("Creating a pooled Browserbase session failed: %r", e)
+            return
+        finally:
+            self._creating[key] -= 1
+        if self._closed:
+            await self._release(computer)
+        else:
+            self._idle[key].append(_IdleSession(computer))
+
+    async def _start_session(self, key: SessionKey) -> AsyncBrowserbaseComputer:
+        computer = self._computer_factory(*key)
+        try:
+            await computer.__aenter__()
+        except BaseException:
+            await computer.abort()
+            raise
+        return computer
+
+    async def _release(self, computer: AsyncBrowserbaseComputer):
+        try:
+            await asyncio.wait_for(computer.__aexit__(None, None, None), CLOSE_TIMEOUT_S)
+        except Exception as e:
+            logger.warning("Closing a pooled Browserbase session failed, releasing it: %r", e)
+            await computer.abort()
+
+    async def _acquire(
+        self, key: SessionKey, initial_url: str, highlight_mouse: bool
+    ) -> tuple[AsyncBrowserbaseComputer, bool]:
+        """Leases a session ready at `initial_url`, and whether it was created ahead of time."""
+        if self._closed:
+            raise RuntimeError("The Browserbase session pool is closed.")
+        self._last_leased[key] = time.monotonic()
+        # Replace the leased session right away.
+        self._refill_needed.set()
+        sessions = self._idle[key]
+        while sessions:
+            session = sessions.popleft()
+            if time.monotonic() - session.created_at > self._config.max_idle_s:
+                self._recycled["age"] += 1
+                self._spawn(self._release(session.computer))
+                continue
+            try:
+                await session.computer.prepare(initial_url, highlight_mouse)
+            except BaseException as e:
+                self._recycled["unusable"] += 1
+                self._spawn(self._release(session.computer))
+                if not isinstance(e, Exception):
+                    raise
+                logger.warning("Pooled Browserbase session is unusable: %r", e)
+                continue
+            self._warm_leases += 1
+            return session.computer, True
+
+        computer = await self._start_session(key)
+        try:
+            await computer.prepare(initial_url, highlight_mouse)
+        except BaseException:
+            self._spawn(self._release(computer))
+            raise
+        self._cold_leases += 1
+        return computer, False
+
+
+class PooledBrowserbaseComputer(BrowserbaseComputer):
+    """A `BrowserbaseComputer` whose session is leased from a `BrowserbasePool`.
+
+    Entering the context leases a session, which is usually running already.
+    Leaving it closes the session as usual.
+    """
+
+    def __init__(
+        self,
+        pool: BrowserbasePool,
+        key: SessionKey,
+        initial_url: str,
+        highlight_mouse: bool = False,
+        cancellation: Optional[CancellationToken] = None,
+    ):
+        # The session is set once leased.
+        self._setup(None, cancellation, CLOSE_TIMEOUT_S)
+        self._pool = pool
+        self._key = key
+        self._initial_url = initial_url
+        self._highlight_mouse = highlight_mouse
+        # Whether the session was created before the lease.
+        self.warm = False
+
+    @property
+    def startup_timings(self) -> dict[str, float]:
+        # A warm session's startup happened before the task asked for it.
+        return {} if self.warm else self._computer.startup_timings
+
+    def __enter__(self):
+        # The pool releases the session itself if leasing fails.
+        self._computer, self.warm = self._run(
+            self._pool._acquire(self._key, self._initial_url, self._highlight_mouse)
+        )
+        return self
+
+    def _close(self, exc_type, exc_val, exc_tb):
+        if self._computer is not None:
+            super()._close(exc_type, exc_val, exc_tb)
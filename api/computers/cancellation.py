@@ -0,0 +1,99 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from typing import Callable, Optional
+
+
+class TaskCancelled(BaseException):
+    """Raised in a cancelled task at its next cancellation point.
+
+    Like asyncio.CancelledError, this is not an Exception, so that the
+    `except Exception` clauses that retry or swallow errors let it through.
+    """
+
+
+class CancellationToken:
+    """Cooperative cancellation of an agent run and the browser it drives.
+
+    Thread-safe: the run checks the token on its own thread, while it may be
+    cancelled from any other.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._reason: Optional[str] = None
+        self._callbacks: list[Callable[[], None]] = []
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._reason = reason
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def cancel_after(self, timeout_s: float, reason: str = "deadline exceeded"):
+        """Cancels the token once `timeout_s` has passed, unless disposed first."""
+        timer = threading.Timer(timeout_s, self.cancel, args=(reason,))
+        timer.daemon = True
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._timer = timer
+        timer.start()
+
+    def dispose(self):
+        """Stops the deadline timer."""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Calls `callback` on cancellation, right away if already cancelled.
+
+        Returns a function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled(self._reason)
+
+    def sleep(self, seconds: float):
+        """Sleeps for `seconds`, raising TaskCancelled as soon as cancelled."""
+        if self._cancelled.wait(seconds):
+            raise TaskCancelled(self._reason)
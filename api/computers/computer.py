@@ -13,7 +13,7 @@
 # limitations under the License.
 import abc
 import pydantic
-from typing import Literal
+from typing import Awaitable, Callable, Literal, Optional, Union
 
 
 class EnvState(pydantic.BaseModel):
@@ -22,26 +22,83 @@ class EnvState(pydantic.BaseModel):
     url: str
 
 
+class DeferredEnvState:
+    """An EnvState whose screenshot is only captured when it is first needed.
+
+    Actions return this instead of capturing eagerly, so that composite actions
+    and multi-call turns don't pay for screenshots nobody looks at. The URL is
+    recorded right after the action since it is cheap to read; the screenshot is
+    taken by `materialize()` (or on first access to `screenshot`) and cached.
+    """
+
+    def __init__(self, url: str, capture: Callable[[], EnvState]):
+        self.url = url
+        self._capture = capture
+        self._state: Optional[EnvState] = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._state is not None
+
+    def materialize(self) -> EnvState:
+        if self._state is None:
+            self._state = self._capture()
+            self.url = self._state.url
+        return self._state
+
+    @property
+    def screenshot(self) -> bytes:
+        return self.materialize().screenshot
+
+
+class AsyncDeferredEnvState:
+    """The `AsyncComputer` counterpart of `DeferredEnvState`."""
+
+    def __init__(self, url: str, capture: Callable[[], Awaitable[EnvState]]):
+        self.url = url
+        self._capture = capture
+        self._state: Optional[EnvState] = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._state is not None
+
+    async def materialize(self) -> EnvState:
+        if self._state is None:
+            self._state = await self._capture()
+            self.url = self._state.url
+        return self._state
+
+
+# What the Computer actions return: either a captured or a deferred state.
+Observation = Union[EnvState, DeferredEnvState]
+AsyncObservation = Union[EnvState, AsyncDeferredEnvState]
+
+
 class Computer(abc.ABC):
-    """Defines an interface for environments."""
+    """Defines an interface for environments.
+
+    Actions may return a `DeferredEnvState` instead of an `EnvState`; callers that
+    only need the final observation of a turn should materialize just that one.
+    """
 
     @abc.abstractmethod
     def screen_size(self) -> tuple[int, int]:
         """Returns the screen size of the environment."""
 
     @abc.abstractmethod
-    def open_web_browser(self) -> EnvState:
+    def open_web_browser(self) -> Observation:
         """Opens the web browser."""
 
     @abc.abstractmethod
-    def click_at(self, x: int, y: int) -> EnvState:
+    def click_at(self, x: int, y: int) -> Observation:
         """Clicks at a specific x, y  coordinate on the webpage.
 
         The 'x' and 'y' values are absolute values, scaled to the height and width of the screen.
         """
 
     @abc.abstractmethod
-    def hover_at(self, x: int, y: int) -> EnvState:
+    def hover_at(self, x: int, y: int) -> Observation:
         """Hovers at a specific x, y coordinate on the webpage.
 
         May be used to explore sub-menus that appear on hover.
@@ -56,7 +113,7 @@ class Computer(abc.ABC):
         text: str,
         press_enter: bool,
         clear_before_typing: bool,
-    ) -> EnvState:
+    ) -> Observation:
         """Types text at a specific x, y coordinate.
 
         The system automatically presses ENTER after typing. To disable this, set `press_enter` to False.
@@ -67,7 +124,7 @@ class Computer(abc.ABC):
     @abc.abstractmethod
     def scroll_document(
         self, direction: Literal["up", "down", "left", "right"]
-    ) -> EnvState:
+    ) -> Observation:
         """Scrolls the entire webpage "up", "down", "left" or "right" based on direction."""
 
     @abc.abstractmethod
@@ -77,26 +134,26 @@ class Computer(abc.ABC):
         y: int,
         direction: Literal["up", "down", "left", "right"],
         magnitude: int,
-    ) -> EnvState:
+    ) -> Observation:
         """Scrolls up, down, right, or left at a x, y coordinate by magnitude.
 
         The 'x' and 'y' values are absolute values, scaled to the height and width of the screen.
         """
 
     @abc.abstractmethod
-    def wait_5_seconds(self) -> EnvState:
+    def wait_5_seconds(self) -> Observation:
         """Waits for 5 seconds to allow unfinished webpage processes to complete."""
 
     @abc.abstractmethod
-    def go_back(self) -> EnvState:
+    def go_back(self) -> Observation:
         """Navigates back to the previous webpage in the browser history."""
 
     @abc.abstractmethod
-    def go_forward(self) -> EnvState:
+    def go_forward(self) -> Observation:
         """Navigates forward to the next webpage in the browser history."""
 
     @abc.abstractmethod
-    def search(self) -> EnvState:
+    def search(self) -> Observation:
         """Directly jumps to a search engine home page.
 
         Used when you need to start with a search. For example, this is used when
@@ -105,17 +162,17 @@ class Computer(abc.ABC):
         """
 
     @abc.abstractmethod
-    def navigate(self, url: str) -> EnvState:
+    def navigate(self, url: str) -> Observation:
         """Navigates directly to a specified URL."""
 
     @abc.abstractmethod
-    def key_combination(self, keys: list[str]) -> EnvState:
+    def key_combination(self, keys: list[str]) -> Observation:
         """Presses keyboard keys and combinations, such as "control+c" or "enter"."""
 
     @abc.abstractmethod
     def drag_and_drop(
         self, x: int, y: int, destination_x: int, destination_y: int
-    ) -> EnvState:
+    ) -> Observation:
         """Drag and drop an element from a x, y coordinate to a destination destination_y, destination_x coordinate.
         The 'x', 'y', 'destination_y' and 'destination_x' values are absolute values, scaled to the height and width of the screen.
         """
@@ -123,3 +180,88 @@ class Computer(abc.ABC):
     @abc.abstractmethod
     def current_state(self) -> EnvState:
         """Returns the current state of the current webpage."""
+
+
+class AsyncComputer(abc.ABC):
+    """The asyncio version of `Computer`.
+
+    Each method behaves like its `Computer` counterpart, but browser I/O doesn't
+    block the event loop, so one loop can drive many environments.
+    """
+
+    @abc.abstractmethod
+    def screen_size(self) -> tuple[int, int]:
+        """Returns the screen size of the environment."""
+
+    @abc.abstractmethod
+    async def open_web_browser(self) -> AsyncObservation:
+        """Opens the web browser."""
+
+    @abc.abstractmethod
+    async def click_at(self, x: int, y: int) -> AsyncObservation:
+        """Clicks at a specific x, y coordinate on the webpage."""
+
+    @abc.abstractmethod
+    async def hover_at(self, x: int, y: int) -> AsyncObservation:
+        """Hovers at a specific x, y coordinate on the webpage."""
+
+    @abc.abstractmethod
+    async def type_text_at(
+        self,
+        x: int,
+        y: int,
+        text: str,
+        press_enter: bool,
+        clear_before_typing: bool,
+    ) -> AsyncObservation:
+        """Types text at a specific x, y coordinate."""
+
+    @abc.abstractmethod
+    async def scroll_document(
+        self, direction: Literal["up", "down", "left", "right"]
+    ) -> AsyncObservation:
+        """Scrolls the entire webpage "up", "down", "left" or "right" based on direction."""
+
+    @abc.abstractmethod
+    async def scroll_at(
+        self,
+        x: int,
+        y: int,
+        direction: Literal["up", "down", "left", "right"],
+        magnitude: int,
+    ) -> AsyncObservation:
+        """Scrolls up, down, right, or left at a x, y coordinate by magnitude."""
+
+    @abc.abstractmethod
+    async def wait_5_seconds(self) -> AsyncObservation:
+        """Waits for 5 seconds to allow unfinished webpage processes to complete."""
+
+    @abc.abstractmethod
+    async def go_back(self) -> AsyncObservation:
+        """Navigates back to the previous webpage in the browser history."""
+
+    @abc.abstractmethod
+    async def go_forward(self) -> AsyncObservation:
+        """Navigates forward to the next webpage in the browser history."""
+
+    @abc.abstractmethod
+    async def search(self) -> AsyncObservation:
+        """Directly jumps to a search engine home page."""
+
+    @abc.abstractmethod
+    async def navigate(self, url: str) -> AsyncObservation:
+        """Navigates directly to a specified URL."""
+
+    @abc.abstractmethod
+    async def key_combination(self, keys: list[str]) -> AsyncObservation:
+        """Presses keyboard keys and combinations, such as "control+c" or "enter"."""
+
+    @abc.abstractmethod
+    async def drag_and_drop(
+        self, x: int, y: int, destination_x: int, destination_y: int
+    ) -> AsyncObservation:
+        """Drag and drop an element from a x, y coordinate to a destination coordinate."""
+
+    @abc.abstractmethod
+    async def current_state(self) -> EnvState:
+        """Returns the current state of the current webpage."""
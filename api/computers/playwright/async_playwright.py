@@ -0,0 +1,573 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import logging
+import termcolor
+import os
+import sys
+import time
+from ..computer import (
+    AsyncComputer,
+    AsyncDeferredEnvState,
+    EnvState,
+)
+import playwright.async_api
+from playwright.async_api import async_playwright
+from playwright_stealth.stealth import Stealth
+from typing import Awaitable, Literal, Optional, TypeVar
+from .memory import MemorySample, process_tree_rss
+from .profiles import ProfileClone, ProfileSnapshots
+from .routing import RequestRouter, RoutingConfig, RoutingStats
+from .settle import PageSettler, SettleConfig, SettleResult
+from .shared_browser import BROWSER_ARGS, SharedChromium
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Define a mapping from the user-friendly key names to Playwright's expected key names.
+# Playwright is generally good with case-insensitivity for these, but it's best to be canonical.
+# See: https://playwright.dev/docs/api/class-keyboard#keyboard-press
+# Keys like 'a', 'b', '1', '$' are passed directly.
+PLAYWRIGHT_KEY_MAP = {
+    "backspace": "Backspace",
+    "tab": "Tab",
+    "return": "Enter",  # Playwright uses 'Enter'
+    "enter": "Enter",
+    "shift": "Shift",
+    "control": "ControlOrMeta",
+    "alt": "Alt",
+    "escape": "Escape",
+    "space": "Space",  # Can also just be " "
+    "pageup": "PageUp",
+    "pagedown": "PageDown",
+    "end": "End",
+    "home": "Home",
+    "left": "ArrowLeft",
+    "up": "ArrowUp",
+    "right": "ArrowRight",
+    "down": "ArrowDown",
+    "insert": "Insert",
+    "delete": "Delete",
+    "semicolon": ";",  # For actual character ';'
+    "equals": "=",  # For actual character '='
+    "multiply": "Multiply",  # NumpadMultiply
+    "add": "Add",  # NumpadAdd
+    "separator": "Separator",  # Numpad specific
+    "subtract": "Subtract",  # NumpadSubtract, or just '-' for character
+    "decimal": "Decimal",  # NumpadDecimal, or just '.' for character
+    "divide": "Divide",  # NumpadDivide, or just '/' for character
+    "f1": "F1",
+    "f2": "F2",
+    "f3": "F3",
+    "f4": "F4",
+    "f5": "F5",
+    "f6": "F6",
+    "f7": "F7",
+    "f8": "F8",
+    "f9": "F9",
+    "f10": "F10",
+    "f11": "F11",
+    "f12": "F12",
+    "command": "Meta",  # 'Meta' is Command on macOS, Windows key on Windows
+}
+
+
+class AsyncPlaywrightComputer(AsyncComputer):
+    """Connects to a local Playwright instance.
+
+    By default the computer launches its own Chromium on the persistent profile
+    in `user_data_dir`. Given a `shared_browser`, it opens a context in that
+    browser instead, and `user_data_dir` is unused. Given `profile_snapshots`,
+    it launches on a clone of their golden profile instead of `user_data_dir`,
+    so several computers can run on the same login at once. Given a
+    `routing_config`, requests for ads, trackers and the like are blocked.
+    """
+
+    def __init__(
+        self,
+        screen_size: tuple[int, int],
+        initial_url: str = "https://www.google.com",
+        search_engine_url: str = "https://www.google.com",
+        highlight_mouse: bool = False,
+        user_data_dir: str = "./browser_data",
+        settle_config: Optional[SettleConfig] = None,
+        shared_browser: Optional[SharedChromium] = None,
+        profile_snapshots: Optional[ProfileSnapshots] = None,
+        routing_config: Optional[RoutingConfig] = None,
+    ):
+        self._initial_url = initial_url
+        self._screen_size = screen_size
+        self._search_engine_url = search_engine_url
+        self._highlight_mouse = highlight_mouse
+        self._user_data_dir = user_data_dir
+        self._shared_browser = shared_browser
+        self._profile_snapshots = profile_snapshots
+        # The clone the browser runs on, if cloning.
+        self._profile: Optional[ProfileClone] = None
+        self._settler = PageSettler(settle_config)
+        self._router = RequestRouter(routing_config) if routing_config else None
+        # The outcome of the most recent settle, for tuning the settle config.
+        self.last_settle: Optional[SettleResult] = None
+        # Set in __aenter__. May be left unset if starting the browser fails.
+        self._playwright: Optional[playwright.async_api.Playwright] = None
+        self._context: Optional[playwright.async_api.BrowserContext] = None
+        self._page: Optional[playwright.async_api.Page] = None
+        # How long each phase of __aenter__ took, in seconds. Phases may overlap.
+        self.startup_timings: dict[str, float] = {}
+        # Non-essential startup work left running in the background.
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def _timed(self, phase: str, awaitable: Awaitable[T]) -> T:
+        """Awaits `awaitable`, recording its duration as a startup phase."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started
+
+    def _run_in_background(self, awaitable: Awaitable) -> asyncio.Task:
+        task = asyncio.ensure_future(awaitable)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _cancel_background_tasks(self):
+        for task in list(self._background_tasks):
+            task.cancel()
+
+    @property
+    def routing_stats(self) -> Optional[RoutingStats]:
+        """What request routing blocked this session, if routing."""
+        return self._router.stats if self._router else None
+
+    def _format_startup_timings(self) -> str:
+        return ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items())
+
+    async def _report_cookies(self):
+        # Only informative, so it doesn't hold up the first action.
+        try:
+            all_cookies = await self._context.cookies()
+        except playwright.async_api.Error as e:
+            print(f"Could not count cookies: {e}")
+            return
+        print(f"Loaded {len(all_cookies)} cookies from persistent storage")
+
+    def _adopt_page(self, page: playwright.async_api.Page):
+        """Makes `page` the one the model sees and acts on."""
+        self._page = page
+        self._settler.attach(page)
+        page.on("close", self._handle_page_closed)
+
+    async def _handle_new_page(self, new_page: playwright.async_api.Page):
+        """The Computer Use model only supports a single tab at the moment.
+
+        Some websites, however, try to open links in a new tab. The new tab
+        replaces the current one as the page the model sees, keeping whatever
+        it has loaded, so links aren't loaded twice and POST results or
+        redirects through about:blank survive. The old tab is closed, unless
+        the new one is a popup it scripted, like a login window, which may
+        report back to it and close itself.
+        """
+        old_page = self._page
+        self._adopt_page(new_page)
+        if old_page is None or old_page.is_closed():
+            return
+        print(f"Switched to a new tab at {new_page.url or 'about:blank'}")
+        # Keep what the model sees the same size.
+        if old_page.viewport_size and new_page.viewport_size != old_page.viewport_size:
+            await new_page.set_viewport_size(old_page.viewport_size)
+        # Tabs opened without window.opener, like target=_blank links, can't
+        # reach back to the old tab.
+        if await new_page.opener() is not old_page:
+            await old_page.close()
+
+    def _handle_page_closed(self, page: playwright.async_api.Page):
+        """Falls back to the most recent open tab when the model's tab closes,
+        e.g. the opener of a login popup that closed itself."""
+        if page is not self._page or self._context is None:
+            return
+        open_pages = [p for p in self._context.pages if p is not page and not p.is_closed()]
+        if open_pages:
+            self._adopt_page(open_pages[-1])
+
+    async def _close_other_pages(self):
+        """Closes the tabs other than the model's, such as kept popup openers."""
+        for page in self._context.pages:
+            if page is not self._page:
+                await page.close()
+
+    async def __aenter__(self):
+        print("Creating session...")
+        started = time.perf_counter()
+        if self._shared_browser:
+            self._context = await self._timed(
+                "new_context", self._shared_browser.new_context(self._screen_size)
+            )
+        else:
+            if self._profile_snapshots:
+                self._profile = await self._timed(
+                    "clone_profile", asyncio.to_thread(self._profile_snapshots.clone)
+                )
+                self._user_data_dir = self._profile.path
+            print(f"User data directory: {self._user_data_dir}")
+            print(f"Absolute path: {os.path.abspath(self._user_data_dir)}")
+            self._playwright = await self._timed("driver_start", async_playwright().start())
+            self._context = await self._timed(
+                "launch",
+                self._playwright.chromium.launch_persistent_context(
+                    user_data_dir=self._user_data_dir,
+                    args=BROWSER_ARGS,
+                    headless=bool(os.environ.get("PLAYWRIGHT_HEADLESS", False)),
+                    viewport={
+                        "width": self._screen_size[0],
+                        "height": self._screen_size[1],
+                    },
+                ),
+            )
+
+        # Use existing page if available (preserves cookies), otherwise create new one
+        if self._context.pages:
+            self._page = self._context.pages[0]
+            print(f"Using existing page from persistent context")
+        else:
+            self._page = await self._context.new_page()
+            print(f"Created new page")
+
+        self._run_in_background(self._report_cookies())
+
+        # Apply stealth to avoid detection. Its scripts must be in place before
+        # the first navigation. Applied to the context, so new tabs get it too.
+        await self._timed("stealth", Stealth().apply_stealth_async(self._context))
+
+        self._adopt_page(self._page)
+        self._context.on("page", self._handle_new_page)
+        if self._router:
+            await self._timed("routing", self._router.attach(self._context))
+        await self._timed("navigate", self._page.goto(self._initial_url))
+        self.startup_timings["total"] = time.perf_counter() - started
+
+        termcolor.cprint(
+            f"Started local playwright ({self._format_startup_timings()}).",
+            color="green",
+            attrs=["bold"],
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._cancel_background_tasks()
+        if self._context and self._shared_browser:
+            context, self._context = self._context, None
+            await self._shared_browser.close_context(context)
+        elif self._context:
+            await self._context.close()
+            self._context = None
+
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        # If closing fails, abort() releases the profile once the browser is dead.
+        await self._release_profile()
+
+    async def _release_profile(self, merge: Optional[bool] = None):
+        profile, self._profile = self._profile, None
+        if profile:
+            await asyncio.to_thread(self._profile_snapshots.release, profile, merge)
+
+    async def prepare(self, url: str, highlight_mouse: bool = False):
+        """Readies a started browser for the next task, starting at `url`."""
+        self._highlight_mouse = highlight_mouse
+        self.last_settle = None
+        if self._router:
+            self._router.reset()
+        await self._close_other_pages()
+        if self._page.url != url:
+            await self._page.goto(url)
+
+    async def reset(self, url: str):
+        """Clears what the last task left behind and goes to `url`.
+
+        The task's tab is replaced by a new one, which drops its history,
+        sessionStorage and page state. Cookies and local storage are kept.
+        """
+        # The new tab is adopted here, not as one the page opened.
+        self._context.remove_listener("page", self._handle_new_page)
+        try:
+            page = await self._context.new_page()
+        finally:
+            self._context.on("page", self._handle_new_page)
+        self._adopt_page(page)
+        await self.prepare(url)
+
+    async def is_healthy(self) -> bool:
+        """Whether the browser is still running and its page responds."""
+        if self._page is None or self._page.is_closed():
+            return False
+        try:
+            return await self._page.evaluate("1") == 1
+        except playwright.async_api.Error:
+            return False
+
+    async def memory_usage(self) -> MemorySample:
+        """The memory the browser and its page use, as far as it can be measured."""
+        sample = MemorySample()
+        try:
+            session = await self._context.new_cdp_session(self._page)
+            try:
+                await session.send("Performance.enable")
+                metrics = (await session.send("Performance.getMetrics"))["metrics"]
+            finally:
+                await session.detach()
+            sample.js_heap_bytes = next(
+                (int(m["value"]) for m in metrics if m["name"] == "JSHeapUsedSize"), None
+            )
+        except playwright.async_api.Error as e:
+            logger.debug("Sampling the JS heap failed: %s", e)
+        # Contexts of a shared browser have no processes of their own.
+        if not self._shared_browser:
+            sample.rss_bytes = await asyncio.to_thread(process_tree_rss, self._user_data_dir)
+        return sample
+
+    async def abort(self):
+        """Tears the browser down without closing it cleanly."""
+        self._cancel_background_tasks()
+        if self._context and self._shared_browser:
+            # The shared browser stays up, so its context must still go. Closing
+            # a context hung in a page can't wait on it, though.
+            self._run_in_background(self._context.close()).add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+        self._context = None
+        if self._playwright:
+            # Stopping the driver kills the browsers it launched.
+            await self._playwright.stop()
+            self._playwright = None
+        # A killed browser may have left its profile half written.
+        await self._release_profile(merge=False)
+
+    async def open_web_browser(self) -> AsyncDeferredEnvState:
+        return self._deferred_state()
+
+    async def click_at(self, x: int, y: int) -> AsyncDeferredEnvState:
+        await self.highlight_mouse(x, y)
+        await self._page.mouse.click(x, y)
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def hover_at(self, x: int, y: int) -> AsyncDeferredEnvState:
+        await self.highlight_mouse(x, y)
+        await self._page.mouse.move(x, y)
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def type_text_at(
+        self,
+        x: int,
+        y: int,
+        text: str,
+        press_enter: bool = False,
+        clear_before_typing: bool = True,
+    ) -> AsyncDeferredEnvState:
+        await self.highlight_mouse(x, y)
+        await self._page.mouse.click(x, y)
+        # await self._page.wait_for_load_state()
+
+        if clear_before_typing:
+            if sys.platform == "darwin":
+                await self._press_keys(["Command", "A"])
+            else:
+                await self._press_keys(["Control", "A"])
+            await self._press_keys(["Delete"])
+
+        await self._page.keyboard.type(text)
+        # await self._page.wait_for_load_state()
+
+        if press_enter:
+            await self._press_keys(["Enter"])
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def _horizontal_document_scroll(
+        self, direction: Literal["left", "right"]
+    ) -> AsyncDeferredEnvState:
+        # Scroll by 50% of the viewport size.
+        horizontal_scroll_amount = self.screen_size()[0] // 2
+        if direction == "left":
+            sign = "-"
+        else:
+            sign = ""
+        scroll_argument = f"{sign}{horizontal_scroll_amount}"
+        # Scroll using JS.
+        await self._page.evaluate(f"window.scrollBy({scroll_argument}, 0); ")
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def scroll_document(
+        self, direction: Literal["up", "down", "left", "right"]
+    ) -> AsyncDeferredEnvState:
+        if direction == "down":
+            return await self.key_combination(["PageDown"])
+        elif direction == "up":
+            return await self.key_combination(["PageUp"])
+        elif direction in ("left", "right"):
+            return await self._horizontal_document_scroll(direction)
+        else:
+            raise ValueError("Unsupported direction: ", direction)
+
+    async def scroll_at(
+        self,
+        x: int,
+        y: int,
+        direction: Literal["up", "down", "left", "right"],
+        magnitude: int = 800,
+    ) -> AsyncDeferredEnvState:
+        await self.highlight_mouse(x, y)
+
+        await self._page.mouse.move(x, y)
+        # await self._page.wait_for_load_state()
+
+        dx = 0
+        dy = 0
+        if direction == "up":
+            dy = -magnitude
+        elif direction == "down":
+            dy = magnitude
+        elif direction == "left":
+            dx = -magnitude
+        elif direction == "right":
+            dx = magnitude
+        else:
+            raise ValueError("Unsupported direction: ", direction)
+
+        await self._page.mouse.wheel(dx, dy)
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def wait_5_seconds(self) -> AsyncDeferredEnvState:
+        # Waits up to 5 seconds, but returns as soon as the page is quiet.
+        await self._settle(timeout_s=5)
+        return self._deferred_state()
+
+    async def go_back(self) -> AsyncDeferredEnvState:
+        await self._page.go_back()
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def go_forward(self) -> AsyncDeferredEnvState:
+        await self._page.go_forward()
+        # await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def search(self) -> AsyncDeferredEnvState:
+        return await self.navigate(self._search_engine_url)
+
+    async def navigate(self, url: str) -> AsyncDeferredEnvState:
+        normalized_url = url
+        if not normalized_url.startswith(("http://", "https://")):
+            normalized_url = "https://" + normalized_url
+        await self._page.goto(normalized_url)
+        await self._page.wait_for_load_state()
+        return self._deferred_state()
+
+    async def key_combination(self, keys: list[str]) -> AsyncDeferredEnvState:
+        await self._press_keys(keys)
+        return self._deferred_state()
+
+    async def _press_keys(self, keys: list[str]):
+        """Presses a key combination without capturing any state."""
+        # Normalize all keys to the Playwright compatible version.
+        keys = [PLAYWRIGHT_KEY_MAP.get(k.lower(), k) for k in keys]
+
+        for key in keys[:-1]:
+            await self._page.keyboard.down(key)
+
+        await self._page.keyboard.press(keys[-1])
+
+        for key in reversed(keys[:-1]):
+            await self._page.keyboard.up(key)
+
+    async def drag_and_drop(
+        self, x: int, y: int, destination_x: int, destination_y: int
+    ) -> AsyncDeferredEnvState:
+        await self.highlight_mouse(x, y)
+        await self._page.mouse.move(x, y)
+        # await self._page.wait_for_load_state()
+        await self._page.mouse.down()
+        # await self._page.wait_for_load_state()
+
+        await self.highlight_mouse(destination_x, destination_y)
+        await self._page.mouse.move(destination_x, destination_y)
+        # await self._page.wait_for_load_state()
+        await self._page.mouse.up()
+        return self._deferred_state()
+
+    def _deferred_state(self) -> AsyncDeferredEnvState:
+        """Records the URL now and defers the screenshot until it is needed."""
+        return AsyncDeferredEnvState(url=self._page.url, capture=self.current_state)
+
+    async def _settle(self, timeout_s: Optional[float] = None) -> SettleResult:
+        result = await self._settler.wait(self._page, timeout_s=timeout_s)
+        self.last_settle = result
+        logger.debug(
+            "Page %s after %.3fs",
+            "settled" if result.settled else "did not settle",
+            result.waited_s,
+        )
+        return result
+
+    async def current_state(self) -> EnvState:
+        # Even if Playwright reports the page as loaded, it may not be so.
+        # Wait until the page is quiet to make sure it has finished rendering.
+        settle = await self._settle()
+        screenshot_bytes = settle.screenshot or await self._page.screenshot(
+            type="png", full_page=False
+        )
+        return EnvState(screenshot=screenshot_bytes, url=self._page.url)
+
+    def screen_size(self) -> tuple[int, int]:
+        viewport_size = self._page.viewport_size
+        # If available, try to take the local playwright viewport size.
+        if viewport_size:
+            return viewport_size["width"], viewport_size["height"]
+        # If unavailable, fall back to the original provided size.
+        return self._screen_size
+
+    async def highlight_mouse(self, x: int, y: int):
+        if not self._highlight_mouse:
+            return
+        await self._page.evaluate(
+            f"""
+        () => {{
+            const element_id = "playwright-feedback-circle";
+            const div = document.createElement('div');
+            div.id = element_id;
+            div.style.pointerEvents = 'none';
+            div.style.border = '4px solid red';
+            div.style.borderRadius = '50%';
+            div.style.width = '20px';
+            div.style.height = '20px';
+            div.style.position = 'fixed';
+            div.style.zIndex = '9999';
+            document.body.appendChild(div);
+
+            div.hidden = false;
+            div.style.left = {x} - 10 + 'px';
+            div.style.top = {y} - 10 + 'px';
+
+            setTimeout(() => {{
+                div.hidden = true;
+            }}, 2000);
+        }}
+    """
+        )
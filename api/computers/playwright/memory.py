@@ -0,0 +1,190 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import os
+import threading
+import time
+from typing import Optional
+
+import pydantic
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class HostMemoryLow(RuntimeError):
+    """Raised instead of leasing a browser while the host is short of memory."""
+
+    def __init__(self, available_bytes: int, retry_after_s: int = 30):
+        super().__init__(
+            f"Only {available_bytes / 2**20:.0f} MiB of host memory available; "
+            "not starting another browser."
+        )
+        self.available_bytes = available_bytes
+        self.retry_after_s = retry_after_s
+
+
+class MemorySample(pydantic.BaseModel):
+    # Resident memory of the browser and its child processes. None if unknown,
+    # as for contexts of a shared browser or off Linux.
+    rss_bytes: Optional[int] = None
+    # JavaScript heap in use by the page, as reported over CDP.
+    js_heap_bytes: Optional[int] = None
+
+
+class MemoryGovernorConfig(pydantic.BaseModel):
+    # Browsers are recycled after running this long. 0 disables the limit.
+    max_age_s: float = 3600.0
+    # Browsers are recycled once their processes use more than this. 0 disables the limit.
+    max_rss_bytes: int = 2 * 2**30
+    # Browsers are recycled once their page's JS heap grows past this. 0 disables the limit.
+    max_js_heap_bytes: int = 2**30
+    # No browser is leased while the host has less memory available than this.
+    # 0 disables the check.
+    min_host_available_bytes: int = 512 * 2**20
+
+
+class MemoryGovernorStats(pydantic.BaseModel):
+    # The largest values sampled so far.
+    rss_high_water_bytes: int
+    js_heap_high_water_bytes: int
+    # None if unknown.
+    host_available_bytes: Optional[int]
+    leases_refused: int
+
+
+def host_memory_available() -> Optional[int]:
+    """MemAvailable of /proc/meminfo, in bytes. None off Linux."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _read_processes() -> tuple[dict[int, int], dict[int, bytes]]:
+    """The parent and command line of every process, by pid."""
+    parents = {}
+    cmdlines = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        pid = int(name)
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read()
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdlines[pid] = f.read()
+        except OSError:
+            # Exited meanwhile.
+            continue
+        # The command name in parentheses may contain spaces.
+        parents[pid] = int(stat[stat.rindex(b")") + 2 :].split()[1])
+    return parents, cmdlines
+
+
+def process_tree_rss(user_data_dir: str) -> Optional[int]:
+    """Resident bytes of the Chromium running on `user_data_dir` and its children.
+
+    None if no such Chromium is running, or off Linux.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    marker = f"--user-data-dir={os.path.abspath(user_data_dir)}".encode()
+    parents, cmdlines = _read_processes()
+    # The browser process is the one with the flag and no --type.
+    roots = [
+        pid
+        for pid, cmdline in cmdlines.items()
+        if marker in cmdline.split(b"\0") and b"--type=" not in cmdline
+    ]
+    if not roots:
+        return None
+    children = collections.defaultdict(list)
+    for pid, parent in parents.items():
+        children[parent].append(pid)
+    total = 0
+    pending = list(roots)
+    while pending:
+        pid = pending.pop()
+        pending.extend(children[pid])
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * _PAGE_SIZE
+        except OSError:
+            pass
+    return total
+
+
+class MemoryGovernor:
+    """Decides when pooled browsers have grown enough to be recycled, and when
+    the host has too little memory left for another one.
+
+    Thread-safe. Browsers report their memory with `observe`, which also
+    tracks the high-water marks.
+    """
+
+    def __init__(self, config: MemoryGovernorConfig):
+        self._config = config
+        self._lock = threading.Lock()
+        self._rss_high_water = 0
+        self._js_heap_high_water = 0
+        self._leases_refused = 0
+
+    @property
+    def config(self) -> MemoryGovernorConfig:
+        return self._config
+
+    @property
+    def stats(self) -> MemoryGovernorStats:
+        host_available = host_memory_available()
+        with self._lock:
+            return MemoryGovernorStats(
+                rss_high_water_bytes=self._rss_high_water,
+                js_heap_high_water_bytes=self._js_heap_high_water,
+                host_available_bytes=host_available,
+                leases_refused=self._leases_refused,
+            )
+
+    def admit(self):
+        """Raises HostMemoryLow if the host can't afford another busy browser."""
+        available = host_memory_available()
+        with self._lock:
+            if (
+                available is None
+                or not self._config.min_host_available_bytes
+                or available >= self._config.min_host_available_bytes
+            ):
+                return
+            self._leases_refused += 1
+        raise HostMemoryLow(available)
+
+    def observe(self, sample: MemorySample):
+        with self._lock:
+            self._rss_high_water = max(self._rss_high_water, sample.rss_bytes or 0)
+            self._js_heap_high_water = max(self._js_heap_high_water, sample.js_heap_bytes or 0)
+
+    def recycle_reason(self, launched_at: float, sample: MemorySample) -> Optional[str]:
+        """Why a browser launched at monotonic `launched_at` and using `sample`
+        should be recycled, or None if it can keep going."""
+        config = self._config
+        if config.max_age_s and time.monotonic() - launched_at > config.max_age_s:
+            return "age"
+        if config.max_rss_bytes and (sample.rss_bytes or 0) > config.max_rss_bytes:
+            return "rss"
+        if config.max_js_heap_bytes and (sample.js_heap_bytes or 0) > config.max_js_heap_bytes:
+            return "js_heap"
+        return None
@@ -11,70 +11,38 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import logging
-import termcolor
-import time
-import os
-import sys
+import asyncio
+import concurrent.futures
+from typing import Literal, Optional
+from ..browser_loop import get_browser_loop
+from ..cancellation import CancellationToken, TaskCancelled
 from ..computer import (
+    AsyncDeferredEnvState,
     Computer,
+    DeferredEnvState,
     EnvState,
+    Observation,
 )
-import playwright.sync_api
-from playwright.sync_api import sync_playwright
-from playwright_stealth.stealth import Stealth
-from typing import Literal
-
-# Define a mapping from the user-friendly key names to Playwright's expected key names.
-# Playwright is generally good with case-insensitivity for these, but it's best to be canonical.
-# See: https://playwright.dev/docs/api/class-keyboard#keyboard-press
-# Keys like 'a', 'b', '1', '$' are passed directly.
-PLAYWRIGHT_KEY_MAP = {
-    "backspace": "Backspace",
-    "tab": "Tab",
-    "return": "Enter",  # Playwright uses 'Enter'
-    "enter": "Enter",
-    "shift": "Shift",
-    "control": "ControlOrMeta",
-    "alt": "Alt",
-    "escape": "Escape",
-    "space": "Space",  # Can also just be " "
-    "pageup": "PageUp",
-    "pagedown": "PageDown",
-    "end": "End",
-    "home": "Home",
-    "left": "ArrowLeft",
-    "up": "ArrowUp",
-    "right": "ArrowRight",
-    "down": "ArrowDown",
-    "insert": "Insert",
-    "delete": "Delete",
-    "semicolon": ";",  # For actual character ';'
-    "equals": "=",  # For actual character '='
-    "multiply": "Multiply",  # NumpadMultiply
-    "add": "Add",  # NumpadAdd
-    "separator": "Separator",  # Numpad specific
-    "subtract": "Subtract",  # NumpadSubtract, or just '-' for character
-    "decimal": "Decimal",  # NumpadDecimal, or just '.' for character
-    "divide": "Divide",  # NumpadDivide, or just '/' for character
-    "f1": "F1",
-    "f2": "F2",
-    "f3": "F3",
-    "f4": "F4",
-    "f5": "F5",
-    "f6": "F6",
-    "f7": "F7",
-    "f8": "F8",
-    "f9": "F9",
-    "f10": "F10",
-    "f11": "F11",
-    "f12": "F12",
-    "command": "Meta",  # 'Meta' is Command on macOS, Windows key on Windows
-}
+from .async_playwright import AsyncPlaywrightComputer, PLAYWRIGHT_KEY_MAP
+from .profiles import ProfileSnapshots
+from .routing import RoutingConfig, RoutingStats
+from .settle import SettleConfig, SettleResult
+from .shared_browser import SharedChromium
+
+# How long closing a browser may take before it is torn down forcibly.
+CLOSE_TIMEOUT_S = 10.0
 
 
 class PlaywrightComputer(Computer):
-    """Connects to a local Playwright instance."""
+    """Connects to a local Playwright instance.
+
+    A thin synchronous wrapper around `AsyncPlaywrightComputer`, which runs on the
+    shared browser loop. The computer can therefore be used from any thread.
+
+    If a cancellation token is given, cancelling it interrupts the browser call
+    in progress with TaskCancelled. Leaving the context closes the browser in at
+    most `close_timeout_s`, tearing it down forcibly if a clean close hangs.
+    """
 
     def __init__(
         self,
@@ -83,87 +51,114 @@ class PlaywrightComputer(Computer):
         search_engine_url: str = "https://www.google.com",
         highlight_mouse: bool = False,
         user_data_dir: str = "./browser_data",
+        settle_config: Optional[SettleConfig] = None,
+        cancellation: Optional[CancellationToken] = None,
+        close_timeout_s: float = CLOSE_TIMEOUT_S,
+        shared_browser: Optional[SharedChromium] = None,
+        profile_snapshots: Optional[ProfileSnapshots] = None,
+        routing_config: Optional[RoutingConfig] = None,
     ):
-        self._initial_url = initial_url
-        self._screen_size = screen_size
-        self._search_engine_url = search_engine_url
-        self._highlight_mouse = highlight_mouse
-        self._user_data_dir = user_data_dir
-
-    def _handle_new_page(self, new_page: playwright.sync_api.Page):
-        """The Computer Use model only supports a single tab at the moment.
-
-        Some websites, however, try to open links in a new tab.
-        For those situations, we intercept the page-opening behavior, and instead overwrite the current page.
-        """
-        new_url = new_page.url
-        new_page.close()
-        self._page.goto(new_url)
-
-    def __enter__(self):
-        print("Creating session...")
-        print(f"User data directory: {self._user_data_dir}")
-        print(f"Absolute path: {os.path.abspath(self._user_data_dir)}")
-        self._playwright = sync_playwright().start()
-        self._context = self._playwright.chromium.launch_persistent_context(
-            user_data_dir=self._user_data_dir,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-            ],
-            headless=bool(os.environ.get("PLAYWRIGHT_HEADLESS", False)),
-            viewport={
-                "width": self._screen_size[0],
-                "height": self._screen_size[1],
-            },
+        self._setup(
+            AsyncPlaywrightComputer(
+                screen_size=screen_size,
+                initial_url=initial_url,
+                search_engine_url=search_engine_url,
+                highlight_mouse=highlight_mouse,
+                user_data_dir=user_data_dir,
+                settle_config=settle_config,
+                shared_browser=shared_browser,
+                profile_snapshots=profile_snapshots,
+                routing_config=routing_config,
+            ),
+            cancellation,
+            close_timeout_s,
         )
 
-        # Use existing page if available (preserves cookies), otherwise create new one
-        if self._context.pages:
-            self._page = self._context.pages[0]
-            print(f"Using existing page from persistent context")
-        else:
-            self._page = self._context.new_page()
-            print(f"Created new page in persistent context")
-
-        # Check cookies
-        all_cookies = self._context.cookies()
-        print(f"Loaded {len(all_cookies)} cookies from persistent storage")
-
-        # Apply stealth to avoid detection
-        Stealth().apply_stealth_sync(self._page)
-
-        self._page.goto(self._initial_url)
-
-        self._context.on("page", self._handle_new_page)
-
-        termcolor.cprint(
-            f"Started local playwright.",
-            color="green",
-            attrs=["bold"],
+    def _setup(
+        self,
+        computer: Optional[AsyncPlaywrightComputer],
+        cancellation: Optional[CancellationToken],
+        close_timeout_s: float,
+    ):
+        """Wraps `computer`, which subclasses may only set once entered."""
+        self._computer = computer
+        self._browser_loop = get_browser_loop()
+        self._cancellation = cancellation
+        self._close_timeout_s = close_timeout_s
+
+    @property
+    def async_computer(self) -> AsyncPlaywrightComputer:
+        return self._computer
+
+    @property
+    def startup_timings(self) -> dict[str, float]:
+        """How long each phase of starting the browser took, in seconds."""
+        return self._computer.startup_timings
+
+    @property
+    def routing_stats(self) -> Optional[RoutingStats]:
+        """What request routing blocked this session, if routing."""
+        return self._computer.routing_stats
+
+    @property
+    def last_settle(self) -> Optional[SettleResult]:
+        """The outcome of the most recent settle, for tuning the settle config."""
+        return self._computer.last_settle
+
+    def _run(self, coroutine):
+        if self._cancellation is None:
+            return self._browser_loop.run(coroutine)
+        self._cancellation.raise_if_cancelled()
+        future = self._browser_loop.submit(coroutine)
+        unregister = self._cancellation.on_cancel(future.cancel)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise TaskCancelled(self._cancellation.reason)
+        finally:
+            unregister()
+
+    def _deferred(self, state: AsyncDeferredEnvState) -> DeferredEnvState:
+        return DeferredEnvState(
+            url=state.url, capture=lambda: self._run(state.materialize())
         )
+
+    def __enter__(self):
+        try:
+            self._run(self._computer.__aenter__())
+        except BaseException as e:
+            # Release whatever was started before the failure or cancellation.
+            self._close(type(e), e, e.__traceback__)
+            raise
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._context:
-            self._context.close()
-
-        self._playwright.stop()
-
-    def open_web_browser(self) -> EnvState:
-        return self.current_state()
-
-    def click_at(self, x: int, y: int):
-        self.highlight_mouse(x, y)
-        self._page.mouse.click(x, y)
-        # self._page.wait_for_load_state()
-        return self.current_state()
-
-    def hover_at(self, x: int, y: int):
-        self.highlight_mouse(x, y)
-        self._page.mouse.move(x, y)
-        # self._page.wait_for_load_state()
-        return self.current_state()
+        self._close(exc_type, exc_val, exc_tb)
+
+    def _close(self, exc_type, exc_val, exc_tb):
+        # Not cancellable, since it releases the browser, but bounded.
+        try:
+            self._browser_loop.run(
+                asyncio.wait_for(
+                    self._computer.__aexit__(exc_type, exc_val, exc_tb),
+                    self._close_timeout_s,
+                )
+            )
+        except Exception as e:
+            print(f"Closing the browser failed, tearing it down: {e!r}")
+            try:
+                self._browser_loop.run(self._computer.abort(), self._close_timeout_s)
+            except Exception as e:
+                print(f"Tearing down the browser failed: {e!r}")
+
+    def open_web_browser(self) -> Observation:
+        return self._deferred(self._run(self._computer.open_web_browser()))
+
+    def click_at(self, x: int, y: int) -> Observation:
+        return self._deferred(self._run(self._computer.click_at(x, y)))
+
+    def hover_at(self, x: int, y: int) -> Observation:
+        return self._deferred(self._run(self._computer.hover_at(x, y)))
 
     def type_text_at(
         self,
@@ -172,52 +167,19 @@ class PlaywrightComputer(Computer):
         text: str,
         press_enter: bool = False,
         clear_before_typing: bool = True,
-    ) -> EnvState:
-        self.highlight_mouse(x, y)
-        self._page.mouse.click(x, y)
-        # self._page.wait_for_load_state()
-
-        if clear_before_typing:
-            if sys.platform == "darwin":
-                self.key_combination(["Command", "A"])
-            else:
-                self.key_combination(["Control", "A"])
-            self.key_combination(["Delete"])
-
-        self._page.keyboard.type(text)
-        # self._page.wait_for_load_state()
-
-        if press_enter:
-            self.key_combination(["Enter"])
-        # self._page.wait_for_load_state()
-        return self.current_state()
-
-    def _horizontal_document_scroll(
-        self, direction: Literal["left", "right"]
-    ) -> EnvState:
-        # Scroll by 50% of the viewport size.
-        horizontal_scroll_amount = self.screen_size()[0] // 2
-        if direction == "left":
-            sign = "-"
-        else:
-            sign = ""
-        scroll_argument = f"{sign}{horizontal_scroll_amount}"
-        # Scroll using JS.
-        self._page.evaluate(f"window.scrollBy({scroll_argument}, 0); ")
-        # self._page.wait_for_load_state()
-        return self.current_state()
+    ) -> Observation:
+        return self._deferred(
+            self._run(
+                self._computer.type_text_at(
+                    x, y, text, press_enter, clear_before_typing
+                )
+            )
+        )
 
     def scroll_document(
         self, direction: Literal["up", "down", "left", "right"]
-    ) -> EnvState:
-        if direction == "down":
-            return self.key_combination(["PageDown"])
-        elif direction == "up":
-            return self.key_combination(["PageUp"])
-        elif direction in ("left", "right"):
-            return self._horizontal_document_scroll(direction)
-        else:
-            raise ValueError("Unsupported direction: ", direction)
+    ) -> Observation:
+        return self._deferred(self._run(self._computer.scroll_document(direction)))
 
     def scroll_at(
         self,
@@ -225,124 +187,43 @@ class PlaywrightComputer(Computer):
         y: int,
         direction: Literal["up", "down", "left", "right"],
         magnitude: int = 800,
-    ) -> EnvState:
-        self.highlight_mouse(x, y)
-
-        self._page.mouse.move(x, y)
-        # self._page.wait_for_load_state()
-
-        dx = 0
-        dy = 0
-        if direction == "up":
-            dy = -magnitude
-        elif direction == "down":
-            dy = magnitude
-        elif direction == "left":
-            dx = -magnitude
-        elif direction == "right":
-            dx = magnitude
-        else:
-            raise ValueError("Unsupported direction: ", direction)
-
-        self._page.mouse.wheel(dx, dy)
-        # self._page.wait_for_load_state()
-        return self.current_state()
-
-    def wait_5_seconds(self) -> EnvState:
-        time.sleep(5)
-        return self.current_state()
-
-    def go_back(self) -> EnvState:
-        self._page.go_back()
-        # self._page.wait_for_load_state()
-        return self.current_state()
-
-    def go_forward(self) -> EnvState:
-        self._page.go_forward()
-        # self._page.wait_for_load_state()
-        return self.current_state()
-
-    def search(self) -> EnvState:
-        return self.navigate(self._search_engine_url)
-
-    def navigate(self, url: str) -> EnvState:
-        normalized_url = url
-        if not normalized_url.startswith(("http://", "https://")):
-            normalized_url = "https://" + normalized_url
-        self._page.goto(normalized_url)
-        self._page.wait_for_load_state()
-        return self.current_state()
-
-    def key_combination(self, keys: list[str]) -> EnvState:
-        # Normalize all keys to the Playwright compatible version.
-        keys = [PLAYWRIGHT_KEY_MAP.get(k.lower(), k) for k in keys]
-
-        for key in keys[:-1]:
-            self._page.keyboard.down(key)
-
-        self._page.keyboard.press(keys[-1])
-
-        for key in reversed(keys[:-1]):
-            self._page.keyboard.up(key)
-
-        return self.current_state()
+    ) -> Observation:
+        return self._deferred(
+            self._run(self._computer.scroll_at(x, y, direction, magnitude))
+        )
+
+    def wait_5_seconds(self) -> Observation:
+        return self._deferred(self._run(self._computer.wait_5_seconds()))
+
+    def go_back(self) -> Observation:
+        return self._deferred(self._run(self._computer.go_back()))
+
+    def go_forward(self) -> Observation:
+        return self._deferred(self._run(self._computer.go_forward()))
+
+    def search(self) -> Observation:
+        return self._deferred(self._run(self._computer.search()))
+
+    def navigate(self, url: str) -> Observation:
+        return self._deferred(self._run(self._computer.navigate(url)))
+
+    def key_combination(self, keys: list[str]) -> Observation:
+        return self._deferred(self._run(self._computer.key_combination(keys)))
 
     def drag_and_drop(
         self, x: int, y: int, destination_x: int, destination_y: int
-    ) -> EnvState:
-        self.highlight_mouse(x, y)
-        self._page.mouse.move(x, y)
-        # self._page.wait_for_load_state()
-        self._page.mouse.down()
-        # self._page.wait_for_load_state()
-
-        self.highlight_mouse(destination_x, destination_y)
-        self._page.mouse.move(destination_x, destination_y)
-        # self._page.wait_for_load_state()
-        self._page.mouse.up()
-        return self.current_state()
+    ) -> Observation:
+        return self._deferred(
+            self._run(
+                self._computer.drag_and_drop(x, y, destination_x, destination_y)
+            )
+        )
 
     def current_state(self) -> EnvState:
-        # self._page.wait_for_load_state()
-        # Even if Playwright reports the page as loaded, it may not be so.
-        # Add a manual sleep to make sure the page has finished rendering.
-        time.sleep(0.5)
-        screenshot_bytes = self._page.screenshot(type="png", full_page=False)
-        return EnvState(screenshot=screenshot_bytes, url=self._page.url)
+        return self._run(self._computer.current_state())
 
     def screen_size(self) -> tuple[int, int]:
-        viewport_size = self._page.viewport_size
-        # If available, try to take the local playwright viewport size.
-        if viewport_size:
-            return viewport_size["width"], viewport_size["height"]
-        # If unavailable, fall back to the original provided size.
-        return self._screen_size
+        return self._computer.screen_size()
 
     def highlight_mouse(self, x: int, y: int):
-        if not self._highlight_mouse:
-            return
-        self._page.evaluate(
-            f"""
-        () => {{
-            const element_id = "playwright-feedback-circle";
-            const div = document.createElement('div');
-            div.id = element_id;
-            div.style.pointerEvents = 'none';
-            div.style.border = '4px solid red';
-            div.style.borderRadius = '50%';
-            div.style.width = '20px';
-            div.style.height = '20px';
-            div.style.position = 'fixed';
-            div.style.zIndex = '9999';
-            document.body.appendChild(div);
-
-            div.hidden = false;
-            div.style.left = {x} - 10 + 'px';
-            div.style.top = {y} - 10 + 'px';
-
-            setTimeout(() => {{
-                div.hidden = true;
-            }}, 2000);
-        }}
-    """
-        )
+        self._run(self._computer.highlight_mouse(x, y))
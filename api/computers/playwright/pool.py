@@ -0,0 +1,357 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import collections
+import logging
+import time
+from typing import Callable, Optional
+
+import pydantic
+
+from ..browser_loop import get_browser_loop
+from ..cancellation import CancellationToken, TaskCancelled
+from .async_playwright import AsyncPlaywrightComputer
+from .memory import MemoryGovernor
+from .playwright import CLOSE_TIMEOUT_S, PlaywrightComputer
+
+logger = logging.getLogger(__name__)
+
+
+class PlaywrightPoolConfig(pydantic.BaseModel):
+    # Browsers kept launched. Each one needs its own user data directory.
+    size: int = 2
+    # Launch every browser when the pool starts instead of on first lease, and
+    # relaunch recycled browsers right away.
+    warm_up: bool = True
+    # Interval between health checks of idle browsers. 0 disables them.
+    health_check_interval_s: float = 30.0
+    # Browsers slower than this to answer a health check are relaunched.
+    health_check_timeout_s: float = 5.0
+    # Browsers are relaunched after this many tasks, so leaks don't pile up.
+    max_tasks_per_browser: int = 50
+    # Where idle browsers wait. Tasks starting here skip the initial navigation.
+    idle_url: str = "https://www.google.com"
+
+
+class PlaywrightPoolStats(pydantic.BaseModel):
+    size: int
+    # Slots with a launched browser, whether idle or leased.
+    launched: int
+    idle: int
+    leased: int
+    # Leases served by an already launched browser, and by a fresh launch.
+    warm_leases: int
+    cold_leases: int
+    # Browsers closed because they were unhealthy, worn out or interrupted.
+    recycled: int
+    # The same, by reason: "unhealthy", "unusable", "cancelled", "reset_failed",
+    # "tasks", or the memory governor's "age", "rss" and "js_heap".
+    recycled_by_reason: dict[str, int]
+    health_check_failures: int
+
+
+class _Slot:
+    """A place in the pool, holding a launched browser or none."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.computer: Optional[AsyncPlaywrightComputer] = None
+        self.tasks = 0
+        # Monotonic time the browser was launched.
+        self.launched_at = 0.0
+
+
+class PlaywrightPool:
+    """Launched and stealthed Playwright browsers, leased out one task at a time.
+
+    `computer_factory` makes the browser of a slot, given the slot's index.
+    Persistent contexts lock their user data directory, so every slot needs
+    its own, e.g. a clone from ProfileSnapshots.
+
+    Browsers live on the shared browser loop. After a task, its browser goes
+    back to `idle_url` in a new tab in the background and waits for the next
+    lease. Browsers
+    that fail a health check, were interrupted by a cancellation or have run
+    `max_tasks_per_browser` tasks are closed and relaunched instead.
+
+    Given a `governor`, browsers are also sampled for memory after every task
+    and health check, and relaunched once they run too long or grow too big.
+    Leases are refused with HostMemoryLow while the host is short of memory.
+    """
+
+    def __init__(
+        self,
+        config: PlaywrightPoolConfig,
+        computer_factory: Callable[[int], AsyncPlaywrightComputer],
+        governor: Optional[MemoryGovernor] = None,
+    ):
+        self._config = config
+        self._computer_factory = computer_factory
+        self._governor = governor
+        self._browser_loop = get_browser_loop()
+        self._slots = [_Slot(i) for i in range(config.size)]
+        self._idle: asyncio.Queue[_Slot] = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        self._leased = 0
+        self._warm_leases = 0
+        self._cold_leases = 0
+        self._recycled: collections.Counter[str] = collections.Counter()
+        self._health_check_failures = 0
+        self._closed = False
+        self._health_checks: Optional[asyncio.Task] = None
+        # Keeps the background tasks from being garbage collected.
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def config(self) -> PlaywrightPoolConfig:
+        return self._config
+
+    @property
+    def stats(self) -> PlaywrightPoolStats:
+        return PlaywrightPoolStats(
+            size=self._config.size,
+            launched=sum(1 for slot in self._slots if slot.computer),
+            idle=self._idle.qsize(),
+            leased=self._leased,
+            warm_leases=self._warm_leases,
+            cold_leases=self._cold_leases,
+            recycled=sum(self._recycled.values()),
+            recycled_by_reason=dict(self._recycled),
+            health_check_failures=self._health_check_failures,
+        )
+
+    def start(self):
+        """Starts warming up the browsers and checking their health."""
+        self._browser_loop.run(self._start())
+
+    def close(self):
+        """Closes the idle browsers. Leased ones are closed when returned."""
+        self._browser_loop.run(self._close())
+
+    def computer(
+        self,
+        initial_url: str,
+        highlight_mouse: bool = False,
+        cancellation: Optional[CancellationToken] = None,
+    ) -> "PooledPlaywrightComputer":
+        """A computer that leases a browser of the pool while its context is entered."""
+        return PooledPlaywrightComputer(self, initial_url, highlight_mouse, cancellation)
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _start(self):
+        if self._config.warm_up:
+            while not self._idle.empty():
+                self._spawn(self._relaunch(self._idle.get_nowait(), "warm_up"))
+        if self._config.health_check_interval_s > 0:
+            self._health_checks = self._spawn(self._check_health_periodically())
+
+    async def _close(self):
+        self._closed = True
+        if self._health_checks:
+            self._health_checks.cancel()
+        # Let launches and resets finish, so their browsers get closed too.
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while not self._idle.empty():
+            await self._shut_down(self._idle.get_nowait())
+
+    async def _launch(self, slot: _Slot):
+        computer = self._computer_factory(slot.index)
+        try:
+            await computer.__aenter__()
+        except BaseException:
+            await computer.abort()
+            raise
+        slot.computer = computer
+        slot.tasks = 0
+        slot.launched_at = time.monotonic()
+
+    async def _shut_down(self, slot: _Slot):
+        computer, slot.computer = slot.computer, None
+        if computer is None:
+            return
+        try:
+            await asyncio.wait_for(computer.__aexit__(None, None, None), CLOSE_TIMEOUT_S)
+        except Exception as e:
+            logger.warning("Closing pooled browser %d failed, tearing it down: %r", slot.index, e)
+            await computer.abort()
+
+    async def _relaunch(self, slot: _Slot, reason: str):
+        """Replaces the browser of `slot` and returns the slot to the pool."""
+        if slot.computer:
+            self._recycled[reason] += 1
+            await self._shut_down(slot)
+        if self._config.warm_up and not self._closed:
+            try:
+                await self._launch(slot)
+            except Exception as e:
+                # Leasing the slot will try again.
+                logger.warning("Launching pooled browser %d failed: %r", slot.index, e)
+        self._idle.put_nowait(slot)
+
+    async def _acquire(self, initial_url: str, highlight_mouse: bool) -> tuple[_Slot, bool]:
+        """Leases a slot with a browser ready at `initial_url`, and whether it was warm."""
+        if self._closed:
+            raise RuntimeError("The browser pool is closed.")
+        if self._governor:
+            self._governor.admit()
+        slot = await self._idle.get()
+        warm = slot.computer is not None
+        try:
+            if not warm:
+                await self._launch(slot)
+            try:
+                await slot.computer.prepare(initial_url, highlight_mouse)
+            except Exception as e:
+                if not warm:
+                    raise
+                # The browser died while idle. Start over with a fresh one.
+                logger.warning("Pooled browser %d is unusable, relaunching: %r", slot.index, e)
+                warm = False
+                self._recycled["unusable"] += 1
+                await self._shut_down(slot)
+                await self._launch(slot)
+                await slot.computer.prepare(initial_url, highlight_mouse)
+        except BaseException:
+            self._spawn(self._relaunch(slot, "unusable"))
+            raise
+        slot.tasks += 1
+        self._leased += 1
+        if warm:
+            self._warm_leases += 1
+        else:
+            self._cold_leases += 1
+        return slot, warm
+
+    async def _release(self, slot: _Slot, reuse: bool):
+        """Resets the browser of a returned slot, or replaces it."""
+        self._leased -= 1
+        if self._closed:
+            await self._shut_down(slot)
+            return
+        if slot.computer is None or not reuse:
+            reason = "cancelled"
+        elif slot.tasks >= self._config.max_tasks_per_browser:
+            reason = "tasks"
+        else:
+            reason = await self._check_memory(slot)
+        if reason is None:
+            try:
+                await asyncio.wait_for(
+                    slot.computer.reset(self._config.idle_url),
+                    self._config.health_check_timeout_s,
+                )
+            except Exception as e:
+                logger.warning("Resetting pooled browser %d failed: %r", slot.index, e)
+                reason = "reset_failed"
+        if reason is None:
+            self._idle.put_nowait(slot)
+        else:
+            await self._relaunch(slot, reason)
+
+    async def _check_memory(self, slot: _Slot) -> Optional[str]:
+        """Why the governor wants the browser of `slot` recycled, if it does."""
+        if self._governor is None:
+            return None
+        try:
+            sample = await asyncio.wait_for(
+                slot.computer.memory_usage(), self._config.health_check_timeout_s
+            )
+        except Exception as e:
+            # Browsers that stopped responding fail their reset or health check.
+            logger.warning("Sampling the memory of pooled browser %d failed: %r", slot.index, e)
+            return None
+        self._governor.observe(sample)
+        reason = self._governor.recycle_reason(slot.launched_at, sample)
+        if reason:
+            logger.info("Recycling pooled browser %d (%s): %s", slot.index, reason, sample)
+        return reason
+
+    async def _check_health_periodically(self):
+        while True:
+            await asyncio.sleep(self._config.health_check_interval_s)
+            # Checked slots are out of the pool, so a lease can't take them meanwhile.
+            slots = []
+            while not self._idle.empty():
+                slots.append(self._idle.get_nowait())
+            await asyncio.gather(*(self._check_health(slot) for slot in slots))
+
+    async def _check_health(self, slot: _Slot):
+        healthy = slot.computer is None
+        if slot.computer:
+            try:
+                healthy = await asyncio.wait_for(
+                    slot.computer.is_healthy(), self._config.health_check_timeout_s
+                )
+            except asyncio.TimeoutError:
+                healthy = False
+        if not healthy:
+            self._health_check_failures += 1
+            logger.warning("Pooled browser %d failed its health check", slot.index)
+            await self._relaunch(slot, "unhealthy")
+            return
+        reason = await self._check_memory(slot) if slot.computer else None
+        if reason:
+            await self._relaunch(slot, reason)
+        else:
+            self._idle.put_nowait(slot)
+
+
+class PooledPlaywrightComputer(PlaywrightComputer):
+    """A `PlaywrightComputer` whose browser is leased from a `PlaywrightPool`.
+
+    Entering the context leases a browser, which is usually launched already.
+    Leaving it returns the browser to the pool without waiting for the reset.
+    """
+
+    def __init__(
+        self,
+        pool: PlaywrightPool,
+        initial_url: str,
+        highlight_mouse: bool = False,
+        cancellation: Optional[CancellationToken] = None,
+    ):
+        # The browser is set once leased.
+        self._setup(None, cancellation, CLOSE_TIMEOUT_S)
+        self._pool = pool
+        self._initial_url = initial_url
+        self._highlight_mouse = highlight_mouse
+        self._slot: Optional[_Slot] = None
+        # Whether the leased browser was launched before the lease.
+        self.warm = False
+
+    @property
+    def startup_timings(self) -> dict[str, float]:
+        # A warm browser's startup happened before the task asked for it.
+        return {} if self.warm else self._computer.startup_timings
+
+    def __enter__(self):
+        self._slot, self.warm = self._run(
+            self._pool._acquire(self._initial_url, self._highlight_mouse)
+        )
+        self._computer = self._slot.computer
+        return self
+
+    def _close(self, exc_type, exc_val, exc_tb):
+        slot, self._slot = self._slot, None
+        if slot is None:
+            return
+        # A cancelled task may have left the browser in the middle of an action.
+        reuse = not (exc_type and issubclass(exc_type, TaskCancelled))
+        self._browser_loop.submit(self._pool._release(slot, reuse))
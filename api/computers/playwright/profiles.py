@@ -0,0 +1,262 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Literal, Optional
+
+import pydantic
+
+logger = logging.getLogger(__name__)
+
+# ioctl cloning a whole file on copy-on-write filesystems (Btrfs, XFS, overlayfs
+# over them). From linux/fs.h.
+_FICLONE = 0x40049409
+
+# Errors of FICLONE on filesystems or file pairs that can't share extents.
+_NO_REFLINK_ERRNOS = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EPERM)
+
+# Directories Chromium rebuilds on demand. Not worth cloning.
+CACHE_DIRS = frozenset({
+    "Cache",
+    "Code Cache",
+    "GPUCache",
+    "GrShaderCache",
+    "GraphiteDawnCache",
+    "ShaderCache",
+    "DawnCache",
+    "DawnGraphiteCache",
+    "DawnWebGPUCache",
+    "CacheStorage",
+    "ScriptCache",
+    "Crashpad",
+    "component_crx_cache",
+})
+
+# Lock files of the Chromium using a profile. A clone carrying them would look
+# in use by the golden profile's browser.
+SINGLETON_FILES = frozenset({"SingletonLock", "SingletonCookie", "SingletonSocket"})
+
+# What a session changes that is worth keeping, relative to the profile.
+MERGED_PATHS = (
+    "Default/Cookies",
+    "Default/Cookies-journal",
+    "Default/Network/Cookies",
+    "Default/Network/Cookies-journal",
+    "Default/Local Storage",
+)
+
+
+class ProfileSnapshotConfig(pydantic.BaseModel):
+    # The logged-in profile every clone starts from, as made by open_browser.py
+    # or login_and_save_cookies.py. Never opened by the clones' browsers.
+    golden_dir: str = "./browser_data"
+    # Where the clones are made. Reflinks need it on the golden profile's filesystem.
+    clones_dir: str = "./browser_profiles"
+    # What happens to a clone when its browser closes. "merge" copies its
+    # cookies and local storage back into the golden profile first.
+    on_release: Literal["discard", "merge"] = "discard"
+
+
+class ProfileSnapshotStats(pydantic.BaseModel):
+    # Clones currently in use.
+    active: int
+    clones: int
+    merges: int
+    # "reflink" while the filesystem shares extents between clones, else "copy".
+    method: str
+    last_clone_s: float
+    clone_s_total: float
+    # Apparent size of the clones made. Reflinked bytes take no extra disk
+    # until written to.
+    bytes_cloned: int
+    # Disk blocks allocated by the clones in use, as `du` would count them.
+    disk_usage_bytes: int
+
+
+class ProfileClone:
+    """A copy of the golden profile, for one browser at a time."""
+
+    def __init__(self, path: str, method: str, clone_s: float, size_bytes: int):
+        self.path = path
+        self.method = method
+        self.clone_s = clone_s
+        self.size_bytes = size_bytes
+
+
+def _ignore(directory: str, names: list[str]) -> set[str]:
+    return {name for name in names if name in CACHE_DIRS or name in SINGLETON_FILES}
+
+
+def disk_usage(path: str) -> int:
+    """Bytes of disk allocated to the files under `path`."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+
+class ProfileSnapshots:
+    """Clones of a golden Chromium profile, so browsers can share one login.
+
+    Chromium locks its profile directory, so only one browser can run on a
+    profile at a time. Each browser instead gets a clone of the golden profile,
+    reflinked where the filesystem supports it and copied otherwise, without
+    caches or locks. Clones are deleted when released, after merging their
+    cookies back into the golden profile if configured to. Concurrent merges
+    overwrite each other, as with Browserbase contexts.
+
+    Thread-safe. Cloning and releasing do blocking file I/O.
+    """
+
+    def __init__(self, config: ProfileSnapshotConfig):
+        self._config = config
+        self._lock = threading.Lock()
+        # Merges and clones don't interleave, so clones never see half a merge.
+        self._golden_lock = threading.Lock()
+        self._reflink = True
+        self._active: dict[str, ProfileClone] = {}
+        self._clones = 0
+        self._merges = 0
+        self._last_clone_s = 0.0
+        self._clone_s_total = 0.0
+        self._bytes_cloned = 0
+
+    @property
+    def config(self) -> ProfileSnapshotConfig:
+        return self._config
+
+    @property
+    def stats(self) -> ProfileSnapshotStats:
+        with self._lock:
+            active = list(self._active)
+            stats = ProfileSnapshotStats(
+                active=len(active),
+                clones=self._clones,
+                merges=self._merges,
+                method="reflink" if self._reflink else "copy",
+                last_clone_s=self._last_clone_s,
+                clone_s_total=self._clone_s_total,
+                bytes_cloned=self._bytes_cloned,
+                disk_usage_bytes=0,
+            )
+        stats.disk_usage_bytes = sum(disk_usage(path) for path in active)
+        return stats
+
+    def remove_stale(self):
+        """Deletes clones left behind by a previous process."""
+        if not os.path.isdir(self._config.clones_dir):
+            return
+        with self._lock:
+            active = set(self._active)
+        for name in os.listdir(self._config.clones_dir):
+            path = os.path.join(self._config.clones_dir, name)
+            if name.startswith("profile-") and path not in active:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _copy_file(self, source: str, destination: str) -> str:
+        if self._reflink:
+            try:
+                with open(source, "rb") as src, open(destination, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                shutil.copystat(source, destination)
+                return destination
+            except OSError as e:
+                if e.errno not in _NO_REFLINK_ERRNOS:
+                    raise
+                logger.info("Reflinks are unsupported in %s, copying profiles", self._config.clones_dir)
+                self._reflink = False
+        return shutil.copy2(source, destination)
+
+    def clone(self) -> ProfileClone:
+        """Makes a clone of the golden profile, empty if there is none yet."""
+        os.makedirs(self._config.clones_dir, exist_ok=True)
+        path = tempfile.mkdtemp(prefix="profile-", dir=self._config.clones_dir)
+        started = time.perf_counter()
+        try:
+            if os.path.isdir(self._config.golden_dir):
+                with self._golden_lock:
+                    shutil.copytree(
+                        self._config.golden_dir,
+                        path,
+                        ignore=_ignore,
+                        copy_function=self._copy_file,
+                        ignore_dangling_symlinks=True,
+                        dirs_exist_ok=True,
+                    )
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        clone_s = time.perf_counter() - started
+        size_bytes = sum(
+            os.lstat(os.path.join(root, name)).st_size
+            for root, _, files in os.walk(path)
+            for name in files
+        )
+        clone = ProfileClone(path, "reflink" if self._reflink else "copy", clone_s, size_bytes)
+        with self._lock:
+            self._active[path] = clone
+            self._clones += 1
+            self._last_clone_s = clone_s
+            self._clone_s_total += clone_s
+            self._bytes_cloned += size_bytes
+        print(f"Cloned profile {self._config.golden_dir} to {path} ({clone.method}, {size_bytes / 1e6:.1f} MB, {clone_s:.2f}s)")
+        return clone
+
+    def release(self, clone: ProfileClone, merge: Optional[bool] = None):
+        """Deletes a clone whose browser has closed, merging it back first if
+        `merge`, which defaults to the configured `on_release`."""
+        if merge is None:
+            merge = self._config.on_release == "merge"
+        try:
+            if merge:
+                self._merge(clone)
+        finally:
+            shutil.rmtree(clone.path, ignore_errors=True)
+            with self._lock:
+                self._active.pop(clone.path, None)
+
+    def _merge(self, clone: ProfileClone):
+        golden = self._config.golden_dir
+        if os.path.lexists(os.path.join(golden, "SingletonLock")):
+            logger.warning("Not merging %s: the golden profile is open in a browser", clone.path)
+            return
+        with self._golden_lock:
+            for relative_path in MERGED_PATHS:
+                source = os.path.join(clone.path, relative_path)
+                if not os.path.exists(source):
+                    continue
+                destination = os.path.join(golden, relative_path)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                # Copied aside and swapped in, so a crash never leaves half a file.
+                temporary_path = f"{destination}.merging"
+                if os.path.isdir(source):
+                    shutil.rmtree(temporary_path, ignore_errors=True)
+                    shutil.copytree(source, temporary_path)
+                    shutil.rmtree(destination, ignore_errors=True)
+                    os.rename(temporary_path, destination)
+                else:
+                    shutil.copy2(source, temporary_path)
+                    os.replace(temporary_path, destination)
+        with self._lock:
+            self._merges += 1
@@ -0,0 +1,190 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import logging
+import re
+import urllib.parse
+from typing import Optional
+
+import playwright.async_api
+import pydantic
+
+logger = logging.getLogger(__name__)
+
+# Ad, analytics and tracking hosts, blocked with their subdomains. Kept to ones
+# that pages don't need to work; login and payment SDKs are left alone.
+DEFAULT_BLOCKED_DOMAINS = [
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "adsrvr.org",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "moatads.com",
+    "rubiconproject.com",
+    "pubmatic.com",
+    "openx.net",
+    "casalemedia.com",
+    "hotjar.com",
+    "clarity.ms",
+    "nr-data.net",
+]
+
+# Rough typical transfer sizes by resource type, for estimating what blocking
+# saves. Blocked responses are never downloaded, so their size is unknown.
+ESTIMATED_BYTES = {
+    "document": 30_000,
+    "script": 25_000,
+    "stylesheet": 15_000,
+    "image": 20_000,
+    "font": 30_000,
+    "media": 500_000,
+    "xhr": 2_000,
+    "fetch": 2_000,
+    "ping": 500,
+    "beacon": 500,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+
+class RoutingConfig(pydantic.BaseModel):
+    # Requests to these hosts or their subdomains are blocked.
+    blocked_domains: list[str] = DEFAULT_BLOCKED_DOMAINS
+    # Requests for these Playwright resource types are blocked, e.g. "media",
+    # "font" or "image". Top-level documents never are. None by default, since
+    # blocking any means routing every request rather than only those to
+    # blocked domains.
+    blocked_resource_types: list[str] = []
+    # Nothing is blocked on pages of these hosts or their subdomains, nor
+    # fetched from them, for sites that break without their third parties.
+    allowed_domains: list[str] = []
+
+
+class RoutingStats(pydantic.BaseModel):
+    # Requests routed: all of them if resource types are blocked, else only
+    # those to blocked domains.
+    requests: int = 0
+    blocked: int = 0
+    # Blocked requests, by "domain" or "resource_type".
+    blocked_by_reason: dict[str, int] = {}
+    # The typical size of the blocked responses. An estimate only.
+    estimated_bytes_saved: int = 0
+
+
+def _matches(host: str, domains: list[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def _host(url: str) -> str:
+    return (urllib.parse.urlsplit(url).hostname or "").lower()
+
+
+def domains_pattern(domains: list[str]) -> re.Pattern:
+    """Matches the URLs on `domains` or their subdomains."""
+    hosts = "|".join(re.escape(domain) for domain in domains)
+    return re.compile(
+        rf"^[a-z][a-z0-9+.-]*://(?:[^/?#@]*@)?(?:[^/?#@]*\.)?(?:{hosts})(?::\d+)?(?:[/?#]|$)",
+        re.IGNORECASE,
+    )
+
+
+class RequestRouter:
+    """Blocks the requests of a browser context that agents don't need.
+
+    Built on `context.route`, which covers the context and its future pages.
+    Only requests to blocked domains are routed, unless resource types are
+    blocked, which are only known once a request is made, so then every
+    request is. Playwright disables the HTTP cache of routed contexts, so
+    this trades cache hits for the ads, trackers and media not loaded.
+
+    Counts what it blocked since the last `reset`, for one session at a time.
+    """
+
+    def __init__(self, config: RoutingConfig):
+        self._config = config
+        self._requests = 0
+        self._blocked: collections.Counter[str] = collections.Counter()
+        self._bytes_saved = 0
+
+    @property
+    def config(self) -> RoutingConfig:
+        return self._config
+
+    @property
+    def stats(self) -> RoutingStats:
+        return RoutingStats(
+            requests=self._requests,
+            blocked=sum(self._blocked.values()),
+            blocked_by_reason=dict(self._blocked),
+            estimated_bytes_saved=self._bytes_saved,
+        )
+
+    def reset(self):
+        self._requests = 0
+        self._blocked.clear()
+        self._bytes_saved = 0
+
+    async def attach(self, context: playwright.async_api.BrowserContext):
+        if self._config.blocked_resource_types:
+            await context.route("**/*", self._route)
+        elif self._config.blocked_domains:
+            await context.route(domains_pattern(self._config.blocked_domains), self._route)
+
+    def block_reason(self, request: playwright.async_api.Request) -> Optional[str]:
+        """Why `request` should be blocked, or None if it should go through."""
+        config = self._config
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return None
+        host = _host(request.url)
+        if config.allowed_domains:
+            if _matches(host, config.allowed_domains):
+                return None
+            try:
+                page_host = _host(request.frame.page.url)
+            except playwright.async_api.Error:
+                # Requests of service workers have no frame.
+                page_host = ""
+            if _matches(page_host, config.allowed_domains):
+                return None
+        if _matches(host, config.blocked_domains):
+            return "domain"
+        if request.resource_type in config.blocked_resource_types:
+            return "resource_type"
+        return None
+
+    async def _route(self, route: playwright.async_api.Route):
+        request = route.request
+        self._requests += 1
+        reason = self.block_reason(request)
+        try:
+            if reason is None:
+                await route.fallback()
+                return
+            self._blocked[reason] += 1
+            self._bytes_saved += ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+            logger.debug("Blocked %s (%s)", request.url, reason)
+            await route.abort("blockedbyclient")
+        except playwright.async_api.Error as e:
+            # The page went away meanwhile.
+            logger.debug("Routing %s failed: %s", request.url, e)
@@ -0,0 +1,151 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import time
+from typing import Optional
+
+import playwright.async_api
+import pydantic
+
+# Installs a MutationObserver on first use and returns the milliseconds elapsed
+# since the last DOM mutation, or since the observer was installed.
+_DOM_IDLE_JS = """
+() => {
+    if (window.__settleLastMutation === undefined) {
+        window.__settleLastMutation = performance.now();
+        new MutationObserver(() => {
+            window.__settleLastMutation = performance.now();
+        }).observe(document, {
+            subtree: true,
+            childList: true,
+            attributes: true,
+            characterData: true,
+        });
+    }
+    return performance.now() - window.__settleLastMutation;
+}
+"""
+
+
+class SettleConfig(pydantic.BaseModel):
+    # The longest we wait for the page to go quiet before giving up.
+    timeout_s: float = 3.0
+    # Always wait at least this long, so the action has a chance to kick off work.
+    min_wait_s: float = 0.05
+    poll_interval_s: float = 0.05
+    # How long the DOM must be free of mutations to count as quiet.
+    dom_quiet_s: float = 0.2
+    # Pages with long-polling or analytics beacons never reach zero requests.
+    max_inflight_requests: int = 0
+    # Requests in flight for longer than this, like long polls and streams,
+    # don't hold up settling. 0 waits for every request.
+    max_request_age_s: float = 1.0
+    # Also require two consecutive identical frames.
+    stable_frames: bool = True
+
+
+class SettleResult(pydantic.BaseModel):
+    # How long we actually waited.
+    waited_s: float
+    # False if the timeout was hit before the page went quiet.
+    settled: bool
+    # The last frame compared, in PNG format. Reusable as the observation.
+    screenshot: Optional[bytes] = None
+
+
+class PageSettler:
+    """Waits until a page is quiet instead of sleeping for a fixed time.
+
+    A page is quiet when in-flight network requests have drained, the DOM has
+    stopped mutating and (optionally) two consecutive frames are identical.
+    Requests that have been in flight for long are assumed never to finish.
+    """
+
+    def __init__(self, config: Optional[SettleConfig] = None):
+        self._config = config or SettleConfig()
+        self._page: Optional[playwright.async_api.Page] = None
+        # In-flight requests and when they started, by monotonic time.
+        self._inflight: dict[playwright.async_api.Request, float] = {}
+
+    @property
+    def config(self) -> SettleConfig:
+        return self._config
+
+    def attach(self, page: playwright.async_api.Page):
+        """Starts tracking the network activity of `page`, instead of the
+        previously attached page's."""
+        if page is self._page:
+            return
+        if self._page is not None:
+            self._page.remove_listener("request", self._on_request)
+            self._page.remove_listener("requestfinished", self._on_request_done)
+            self._page.remove_listener("requestfailed", self._on_request_done)
+        self._page = page
+        self._inflight.clear()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request: playwright.async_api.Request):
+        self._inflight[request] = time.monotonic()
+
+    def _on_request_done(self, request: playwright.async_api.Request):
+        self._inflight.pop(request, None)
+
+    def _pending_requests(self) -> int:
+        max_age_s = self._config.max_request_age_s
+        if not max_age_s:
+            return len(self._inflight)
+        started_after = time.monotonic() - max_age_s
+        return sum(1 for started in self._inflight.values() if started > started_after)
+
+    async def _dom_idle_s(self, page: playwright.async_api.Page) -> float:
+        try:
+            return await page.evaluate(_DOM_IDLE_JS) / 1000
+        except playwright.async_api.Error:
+            # The execution context is being replaced by a navigation.
+            return 0.0
+
+    async def wait(
+        self, page: playwright.async_api.Page, timeout_s: Optional[float] = None
+    ) -> SettleResult:
+        config = self._config
+        start = time.monotonic()
+        deadline = start + (config.timeout_s if timeout_s is None else timeout_s)
+        await asyncio.sleep(config.min_wait_s)
+
+        previous_frame = None
+        while True:
+            quiet = (
+                self._pending_requests() <= config.max_inflight_requests
+                and await self._dom_idle_s(page) >= config.dom_quiet_s
+            )
+            if quiet and not config.stable_frames:
+                return SettleResult(waited_s=time.monotonic() - start, settled=True)
+            if quiet:
+                frame = await page.screenshot(type="png", full_page=False)
+                if frame == previous_frame:
+                    return SettleResult(
+                        waited_s=time.monotonic() - start,
+                        settled=True,
+                        screenshot=frame,
+                    )
+                previous_frame = frame
+            else:
+                previous_frame = None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return SettleResult(waited_s=time.monotonic() - start, settled=False)
+            await asyncio.sleep(min(config.poll_interval_s, remaining))
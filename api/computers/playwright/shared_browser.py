@@ -0,0 +1,127 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+import playwright.async_api
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+]
+
+
+class SharedChromium:
+    """One Chromium process hosting a lightweight context per computer.
+
+    Contexts share nothing but the process, and start from the cookies and
+    local storage saved in `storage_state_path`. If that file doesn't exist yet,
+    it is exported from the persistent profile in `seed_user_data_dir` first,
+    so logins made with open_browser.py carry over. With `persist`, the state of
+    every context is saved back when it closes. Contexts closing concurrently
+    overwrite each other's saves, as with Browserbase contexts.
+
+    Lives on the browser loop. Chromium is launched on first use, and again if
+    it has crashed.
+    """
+
+    def __init__(
+        self,
+        storage_state_path: str,
+        seed_user_data_dir: Optional[str] = None,
+        persist: bool = True,
+    ):
+        self._storage_state_path = storage_state_path
+        self._seed_user_data_dir = seed_user_data_dir
+        self._persist = persist
+        self._headless = bool(os.environ.get("PLAYWRIGHT_HEADLESS", False))
+        self._playwright: Optional[playwright.async_api.Playwright] = None
+        self._browser: Optional[playwright.async_api.Browser] = None
+        self._start_lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def context_count(self) -> int:
+        return len(self._browser.contexts) if self._browser else 0
+
+    async def _export_seed_profile(self):
+        print(f"Exporting cookies of {self._seed_user_data_dir} to {self._storage_state_path}")
+        context = await self._playwright.chromium.launch_persistent_context(
+            user_data_dir=self._seed_user_data_dir, headless=True, args=BROWSER_ARGS
+        )
+        try:
+            await context.storage_state(path=self._storage_state_path)
+        finally:
+            await context.close()
+
+    async def _ensure_started(self) -> playwright.async_api.Browser:
+        async with self._start_lock:
+            if self._browser and self._browser.is_connected():
+                return self._browser
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if (
+                not os.path.exists(self._storage_state_path)
+                and self._seed_user_data_dir
+                and os.path.isdir(self._seed_user_data_dir)
+            ):
+                try:
+                    await self._export_seed_profile()
+                except playwright.async_api.Error as e:
+                    # The profile may be open in another browser.
+                    logger.warning("Exporting the seed profile failed: %s", e)
+            self._browser = await self._playwright.chromium.launch(
+                headless=self._headless, args=BROWSER_ARGS
+            )
+            print("Started shared Chromium")
+            return self._browser
+
+    async def new_context(self, screen_size: tuple[int, int]) -> playwright.async_api.BrowserContext:
+        browser = await self._ensure_started()
+        return await browser.new_context(
+            storage_state=(
+                self._storage_state_path
+                if os.path.exists(self._storage_state_path)
+                else None
+            ),
+            viewport={"width": screen_size[0], "height": screen_size[1]},
+        )
+
+    async def close_context(self, context: playwright.async_api.BrowserContext):
+        """Saves the state of `context` if persisting, then closes it."""
+        try:
+            if self._persist:
+                state = await context.storage_state()
+                async with self._save_lock:
+                    # Readers never see a partially written file.
+                    temporary_path = f"{self._storage_state_path}.tmp"
+                    with open(temporary_path, "w") as f:
+                        json.dump(state, f)
+                    os.replace(temporary_path, self._storage_state_path)
+        finally:
+            await context.close()
+
+    async def close(self):
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
@@ -0,0 +1,269 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Gemini context caching for the stable prefix of an agent conversation.
+
+The query, the tool configuration and the older turns (whose screenshots have
+already been stripped) don't change from one request to the next. They are
+stored as cached content and referenced by name, so later requests only send
+the turns after the cached prefix.
+"""
+import time
+from typing import Literal, Optional
+
+import pydantic
+from google import genai
+from google.genai import errors, types
+
+from compaction import estimate_tokens
+from metrics import AgentMetrics
+
+_Action = Literal["none", "create", "refresh"]
+
+
+class ContextCacheConfig(pydantic.BaseModel):
+    # How long cached content lives after it is created or refreshed.
+    ttl_s: int = 600
+    # Extend the TTL once the cache is this close to expiring.
+    refresh_margin_s: int = 60
+    # Prefixes smaller than this aren't worth caching, and the API rejects them.
+    min_prefix_tokens: int = 4096
+    # Recreate the cache once this many stable tokens have accumulated after it.
+    min_growth_tokens: int = 8192
+    # After a transient failure to create a cache, wait this long before trying
+    # again, doubling with every further failure up to max_retry_delay_s.
+    retry_delay_s: float = 30.0
+    max_retry_delay_s: float = 600.0
+
+
+class ContextCache:
+    """Keeps a cached-content entry for the stable prefix of a conversation.
+
+    If the model or backend doesn't support caching, the first failure disables
+    the cache and requests are sent in full, as before. Other failures, like
+    rate limits, server errors and timeouts, only skip caching until a retry
+    with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        model: str,
+        config: types.GenerateContentConfig,
+        cache_config: ContextCacheConfig,
+        metrics: AgentMetrics,
+    ):
+        self._client = client
+        self._model = model
+        self._config = config
+        self._cache_config = cache_config
+        self._metrics = metrics
+        self._supported = True
+        self._name: Optional[str] = None
+        # The contents stored in the cache. Compared by identity, since any
+        # change to them invalidates the cache.
+        self._prefix: list[types.Content] = []
+        self._prefix_tokens = 0
+        self._expires_at = 0.0
+        self._request_config: Optional[types.GenerateContentConfig] = None
+        # Caches replaced or invalidated since the last request, to be deleted.
+        self._stale: list[str] = []
+        # Consecutive transient failures to create a cache, and when to retry.
+        self._create_failures = 0
+        self._retry_at = 0.0
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._name
+
+    def prepare(
+        self, contents: list[types.Content], stable_length: int
+    ) -> tuple[types.GenerateContentConfig, list[types.Content]]:
+        """Returns the config and contents to send for `contents`.
+
+        `contents[:stable_length]` won't change anymore and may be cached.
+        """
+        action = self._next_action(contents, stable_length)
+        try:
+            if action == "create":
+                self._created(
+                    self._client.caches.create(
+                        model=self._model,
+                        config=self._create_config(contents[:stable_length]),
+                    ),
+                    contents[:stable_length],
+                )
+            elif action == "refresh":
+                self._client.caches.update(
+                    name=self._name, config=self._update_config()
+                )
+                self._refreshed()
+        except Exception as e:
+            self._failed(action, e)
+        for name in self._pop_stale():
+            try:
+                self._client.caches.delete(name=name)
+            except Exception as e:
+                print(f"Deleting context cache {name} failed: {e}")
+        return self._request(contents)
+
+    async def aprepare(
+        self, contents: list[types.Content], stable_length: int
+    ) -> tuple[types.GenerateContentConfig, list[types.Content]]:
+        """The async counterpart of `prepare`."""
+        action = self._next_action(contents, stable_length)
+        try:
+            if action == "create":
+                self._created(
+                    await self._client.aio.caches.create(
+                        model=self._model,
+                        config=self._create_config(contents[:stable_length]),
+                    ),
+                    contents[:stable_length],
+                )
+            elif action == "refresh":
+                await self._client.aio.caches.update(
+                    name=self._name, config=self._update_config()
+                )
+                self._refreshed()
+        except Exception as e:
+            self._failed(action, e)
+        for name in self._pop_stale():
+            try:
+                await self._client.aio.caches.delete(name=name)
+            except Exception as e:
+                print(f"Deleting context cache {name} failed: {e}")
+        return self._request(contents)
+
+    def invalidate(self):
+        """Stops using the current cache, e.g. after the server rejected it."""
+        if self._name:
+            self._metrics.context_cache_invalidations += 1
+            self._stale.append(self._name)
+        self._drop()
+
+    def content_changed(self, content: types.Content):
+        """Invalidates the cache if it holds `content`, which changed in place."""
+        if any(cached is content for cached in self._prefix):
+            self.invalidate()
+
+    def _next_action(self, contents: list[types.Content], stable_length: int) -> _Action:
+        if not self._supported:
+            return "none"
+        if self._name:
+            if not self._is_prefix_of(contents):
+                # The cached turns were compacted away.
+                self.invalidate()
+            elif time.monotonic() >= self._expires_at:
+                self._metrics.context_cache_expirations += 1
+                self._drop()
+
+        # Only the turns after the cached prefix need to be measured.
+        stable_tokens = self._prefix_tokens + sum(
+            estimate_tokens(c) for c in contents[len(self._prefix) : stable_length]
+        )
+        if stable_tokens < self._cache_config.min_prefix_tokens:
+            return "none"
+        if not self._name or stable_tokens - self._prefix_tokens >= self._cache_config.min_growth_tokens:
+            if time.monotonic() < self._retry_at:
+                # Creating failed recently. Send what there is until it's time to retry.
+                return "refresh" if self._name and self._expiring() else "none"
+            return "create"
+        if self._expiring():
+            return "refresh"
+        return "none"
+
+    def _expiring(self) -> bool:
+        return time.monotonic() >= self._expires_at - self._cache_config.refresh_margin_s
+
+    def _is_prefix_of(self, contents: list[types.Content]) -> bool:
+        return len(contents) > len(self._prefix) and all(
+            a is b for a, b in zip(self._prefix, contents)
+        )
+
+    def _create_config(
+        self, prefix: list[types.Content]
+    ) -> types.CreateCachedContentConfig:
+        return types.CreateCachedContentConfig(
+            contents=prefix,
+            system_instruction=self._config.system_instruction,
+            tools=self._config.tools,
+            tool_config=self._config.tool_config,
+            ttl=f"{self._cache_config.ttl_s}s",
+            display_name="browser-agent",
+        )
+
+    def _update_config(self) -> types.UpdateCachedContentConfig:
+        return types.UpdateCachedContentConfig(ttl=f"{self._cache_config.ttl_s}s")
+
+    def _created(self, cached_content: types.CachedContent, prefix: list[types.Content]):
+        if self._name:
+            self._stale.append(self._name)
+        self._name = cached_content.name
+        self._prefix = list(prefix)
+        self._prefix_tokens = sum(estimate_tokens(c) for c in prefix)
+        self._expires_at = time.monotonic() + self._cache_config.ttl_s
+        # The tools and system instruction live in the cache now, and may not be
+        # sent alongside it.
+        self._request_config = self._config.model_copy(
+            update={
+                "cached_content": self._name,
+                "system_instruction": None,
+                "tools": None,
+                "tool_config": None,
+            }
+        )
+        self._metrics.context_caches_created += 1
+        self._create_failures = 0
+        self._retry_at = 0.0
+
+    def _refreshed(self):
+        self._expires_at = time.monotonic() + self._cache_config.ttl_s
+        self._metrics.context_cache_refreshes += 1
+
+    def _failed(self, action: _Action, error: Exception):
+        if action != "create":
+            # Keep using the cache until it expires.
+            print(f"Refreshing the context cache failed: {error}")
+            return
+        if isinstance(error, errors.ClientError) and error.code != 429:
+            # The model or backend doesn't support caching, or rejects this cache.
+            print(f"Context caching unavailable, sending full requests: {error}")
+            self._supported = False
+            return
+        delay_s = min(
+            self._cache_config.retry_delay_s * 2**self._create_failures,
+            self._cache_config.max_retry_delay_s,
+        )
+        self._create_failures += 1
+        self._retry_at = time.monotonic() + delay_s
+        # Keep using the previous cache, if any, until it expires.
+        print(f"Creating a context cache failed, retrying in {delay_s:.0f}s: {error}")
+
+    def _drop(self):
+        self._name = None
+        self._prefix = []
+        self._prefix_tokens = 0
+        self._request_config = None
+
+    def _pop_stale(self) -> list[str]:
+        stale, self._stale = self._stale, []
+        return stale
+
+    def _request(
+        self, contents: list[types.Content]
+    ) -> tuple[types.GenerateContentConfig, list[types.Content]]:
+        if not self._name:
+            return self._config, contents
+        self._metrics.context_cache_hits += 1
+        return self._request_config, contents[len(self._prefix) :]
@@ -0,0 +1,122 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Delivers events from a worker thread to a Server-Sent Events response."""
+import asyncio
+import collections
+import json
+from typing import AsyncIterator, Callable, Optional
+
+# Events that can be merged with the previous one of the same type when the
+# client falls behind, and how to merge them. Events may be shared with other
+# streams, so merging makes a new one. Log lines that can't be merged are
+# dropped; reasoning deltas never are, since the text would have holes.
+_COALESCE: dict[str, Callable[[dict, dict], dict]] = {
+    "log": lambda last, new: {**last, "message": f"{last['message']}\n{new['message']}"},
+    "reasoning_delta": lambda last, new: {**last, "text": last["text"] + new["text"]},
+}
+_CLOSED = object()
+
+
+class EventStream:
+    """A bounded, push-based buffer between a worker thread and the event loop.
+
+    `publish` may be called from any thread; it schedules the event on the loop
+    the stream was created on, which wakes the reader. While the reader keeps
+    up, every event is sent as is. Once more than `max_buffered` events are
+    waiting, log lines are merged into the last buffered event if that is a
+    log line too, and dropped otherwise. Reasoning deltas are merged into the
+    latest buffered delta if only log lines were buffered after it, and
+    buffered beyond the limit otherwise. Other events are never dropped.
+    """
+
+    def __init__(
+        self,
+        heartbeat_s: float = 15.0,
+        max_buffered: int = 256,
+        on_coalesce: Optional[Callable[[], None]] = None,
+    ):
+        self._loop = asyncio.get_running_loop()
+        self._heartbeat_s = heartbeat_s
+        self._max_buffered = max_buffered
+        self._on_coalesce = on_coalesce
+        self._buffer: collections.deque = collections.deque()
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def publish(self, event: dict, event_id: Optional[int] = None):
+        """Queues `event` for the client. Thread-safe.
+
+        `event_id` is sent as the SSE id, for clients to resume from.
+        """
+        self._call_soon(self._put, [event_id, event])
+
+    def close(self):
+        """Ends the stream once the buffered events are sent. Thread-safe."""
+        self._call_soon(self._put, _CLOSED)
+
+    def _call_soon(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The server is shutting down and nobody is listening anymore.
+            pass
+
+    def _put(self, entry):
+        if entry is not _CLOSED and len(self._buffer) >= self._max_buffered:
+            event_id, event = entry
+            merge = _COALESCE.get(event["type"])
+            target = self._coalesce_target(event["type"]) if merge else None
+            if target is not None or event["type"] == "log":
+                if target is not None:
+                    # A client resuming from the merged event has seen both.
+                    target[:] = [event_id, merge(target[1], event)]
+                else:
+                    self.dropped += 1
+                if self._on_coalesce:
+                    self._on_coalesce()
+                return
+        self._buffer.append(entry)
+        self._ready.set()
+
+    def _coalesce_target(self, event_type: str) -> Optional[list]:
+        """The buffered entry an event of `event_type` can be merged into."""
+        for entry in reversed(self._buffer):
+            if entry is _CLOSED:
+                return None
+            if entry[1]["type"] == event_type:
+                return entry
+            # Deltas may pass log lines, which are droppable anyway.
+            if event_type != "reasoning_delta" or entry[1]["type"] != "log":
+                return None
+        return None
+
+    async def sse(self) -> AsyncIterator[str]:
+        """Yields the events as SSE messages, with comment lines as heartbeats."""
+        while True:
+            if not self._buffer:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self._heartbeat_s)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection.
+                    yield ": heartbeat\n\n"
+                    continue
+            entry = self._buffer.popleft()
+            if entry is _CLOSED:
+                return
+            event_id, event = entry
+            if event_id is None:
+                yield f"data: {json.dumps(event)}\n\n"
+            else:
+                yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,299 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Browser tasks that outlive the HTTP connection that started them.
+
+Each job keeps its recent events in a ring buffer, so clients can reconnect
+and resume from the last event they saw. Finished jobs are stored in SQLite,
+so their results survive a restart.
+"""
+import collections
+import contextlib
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, ContextManager, Literal, Optional
+
+import pydantic
+
+from computers import CancellationToken
+from event_stream import EventStream
+
+JobStatus = Literal[
+    "queued", "running", "awaiting_confirmation", "succeeded", "failed", "cancelled"
+]
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobInfo(pydantic.BaseModel):
+    job_id: str
+    status: JobStatus
+    query: str
+    env: str
+    # Unix timestamps.
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # The id of the latest event, 0 before the first one.
+    last_event_id: int = 0
+
+
+class JobResult(pydantic.BaseModel):
+    job_id: str
+    status: JobStatus
+    message: str
+    final_reasoning: Optional[str] = None
+    session_url: Optional[str] = None
+    live_view_url: Optional[str] = None
+    error: Optional[str] = None
+    steps: int = 0
+    queue_wait_s: Optional[float] = None
+    execution_s: Optional[float] = None
+
+
+class Job:
+    """A task and the events it has published so far."""
+
+    def __init__(self, job_id: str, query: str, env: str, max_events: int, owner: Optional[str] = None):
+        self._lock = threading.Lock()
+        # The user the job runs for, if any; only they may answer its confirmations.
+        self._owner = owner
+        self._info = JobInfo(job_id=job_id, status="queued", query=query, env=env, created_at=time.time())
+        self._result: Optional[JobResult] = None
+        self._events: collections.deque[tuple[int, dict]] = collections.deque(maxlen=max_events)
+        self._subscribers: set[EventStream] = set()
+        # Cancelled on request, on deadline or when the client goes away.
+        self.cancellation = CancellationToken()
+        # Safety confirmations being waited for, by id: (answered, confirmed).
+        self._confirmations: dict[str, tuple[threading.Event, list[bool]]] = {}
+
+    @property
+    def id(self) -> str:
+        return self._info.job_id
+
+    @property
+    def info(self) -> JobInfo:
+        with self._lock:
+            return self._info.model_copy()
+
+    @property
+    def result(self) -> Optional[JobResult]:
+        return self._result
+
+    @property
+    def finished(self) -> bool:
+        return self._info.status in FINISHED_STATUSES
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def start(self):
+        with self._lock:
+            self._info.status = "running"
+            self._info.started_at = time.time()
+
+    def publish(self, event: dict):
+        """Records `event` and sends it to the subscribed streams. Thread-safe."""
+        with self._lock:
+            self._info.last_event_id += 1
+            event_id = self._info.last_event_id
+            self._events.append((event_id, event))
+            # Under the lock, so every stream sees the events in order.
+            for stream in self._subscribers:
+                stream.publish(event, event_id)
+
+    def subscribe(self, stream: EventStream, last_event_id: int = 0):
+        """Sends the buffered events after `last_event_id`, then the new ones.
+
+        The stream is closed once the job has finished.
+        """
+        with self._lock:
+            first_buffered = self._events[0][0] if self._events else 1
+            if last_event_id < first_buffered - 1:
+                missed = first_buffered - 1 - last_event_id
+                stream.publish({"type": "log", "message": f"{missed} earlier events are no longer available"})
+            for event_id, event in self._events:
+                if event_id > last_event_id:
+                    stream.publish(event, event_id)
+            if self.finished:
+                stream.close()
+            else:
+                self._subscribers.add(stream)
+
+    def request_confirmation(
+        self,
+        safety: dict,
+        timeout_s: float,
+        park: Callable[[], ContextManager] = contextlib.nullcontext,
+    ) -> Literal["CONTINUE", "TERMINATE"]:
+        """Asks the job's clients to confirm a risky action; usable as the
+        agent's safety_confirmation.
+
+        Publishes a `safety_confirmation` event and waits, inside `park`, until
+        `answer_confirmation` is called. Without an answer within `timeout_s`,
+        the action is denied.
+        """
+        confirmation_id = uuid.uuid4().hex
+        answered = threading.Event()
+        confirmed = [False]
+        with self._lock:
+            self._confirmations[confirmation_id] = (answered, confirmed)
+            self._info.status = "awaiting_confirmation"
+        self.publish({
+            "type": "safety_confirmation",
+            "confirmation_id": confirmation_id,
+            "explanation": safety.get("explanation"),
+            "timeout_s": timeout_s,
+        })
+        unregister = self.cancellation.on_cancel(answered.set)
+        try:
+            with park():
+                answered.wait(timeout_s)
+        finally:
+            unregister()
+            with self._lock:
+                del self._confirmations[confirmation_id]
+                self._info.status = "running"
+        self.cancellation.raise_if_cancelled()
+        decision = "CONTINUE" if confirmed[0] else "TERMINATE"
+        self.publish({
+            "type": "safety_decision",
+            "confirmation_id": confirmation_id,
+            "decision": decision,
+            "timed_out": not answered.is_set(),
+        })
+        return decision
+
+    def answer_confirmation(self, confirmation_id: str, confirm: bool, owner: Optional[str] = None) -> bool:
+        """Returns False if no such confirmation is being waited for, or the
+        job has an owner other than `owner`."""
+        if self._owner is not None and owner != self._owner:
+            return False
+        with self._lock:
+            pending = self._confirmations.get(confirmation_id)
+            if pending is None:
+                return False
+            answered, confirmed = pending
+            confirmed[0] = confirm
+            answered.set()
+            return True
+
+    def unsubscribe(self, stream: EventStream):
+        with self._lock:
+            self._subscribers.discard(stream)
+
+    def finish(self, result: JobResult):
+        with self._lock:
+            self._result = result
+            self._info.status = result.status
+            self._info.finished_at = time.time()
+            subscribers, self._subscribers = self._subscribers, set()
+        self.cancellation.dispose()
+        for stream in subscribers:
+            stream.close()
+
+
+class JobStore:
+    """Finished jobs, persisted in SQLite."""
+
+    def __init__(self, path: str):
+        # Used from worker threads and the event loop, serialized by the lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " info TEXT NOT NULL,"
+                " result TEXT NOT NULL)"
+            )
+
+    def save(self, info: JobInfo, result: JobResult):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, info, result) VALUES (?, ?, ?)",
+                (info.job_id, info.model_dump_json(), result.model_dump_json()),
+            )
+
+    def load(self, job_id: str) -> Optional[tuple[JobInfo, JobResult]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info, result FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return JobInfo.model_validate_json(row[0]), JobResult.model_validate_json(row[1])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """The jobs of this process, plus the finished ones in the store.
+
+    Finished jobs stay in memory, with their events, until more than
+    `max_retained` have accumulated. After that only their info and result
+    are available, from the store.
+    """
+
+    def __init__(self, store: JobStore, max_events: int = 1000, max_retained: int = 100):
+        self._store = store
+        self._max_events = max_events
+        self._max_retained = max_retained
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._finished: collections.deque[str] = collections.deque()
+
+    def create(self, query: str, env: str, owner: Optional[str] = None) -> Job:
+        job = Job(uuid.uuid4().hex, query, env, self._max_events, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def info(self, job_id: str) -> Optional[JobInfo]:
+        job = self.get(job_id)
+        if job:
+            return job.info
+        stored = self._store.load(job_id)
+        return stored[0] if stored else None
+
+    def result(self, job_id: str) -> Optional[JobResult]:
+        job = self.get(job_id)
+        if job:
+            return job.result
+        stored = self._store.load(job_id)
+        return stored[1] if stored else None
+
+    def discard(self, job: Job):
+        """Forgets a job that never ran."""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def finish(self, job: Job, result: JobResult):
+        job.finish(result)
+        try:
+            self._store.save(job.info, result)
+        except sqlite3.Error as e:
+            print(f"Saving job {job.id} failed: {e}")
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self._max_retained:
+                self._jobs.pop(self._finished.popleft(), None)
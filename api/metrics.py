@@ -0,0 +1,150 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Counters and timings describing the work done by agent runs."""
+import bisect
+import threading
+from typing import Optional, Sequence
+
+import pydantic
+
+LATENCY_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(2**i * 1024 for i in range(4, 15, 2))
+TOKEN_BUCKETS = tuple(2**i * 1000 for i in range(0, 8))
+
+
+class ActionTiming(pydantic.BaseModel):
+    name: str
+    duration_s: float
+
+
+class TurnMetrics(pydantic.BaseModel):
+    """Where the time and bytes of one agent turn went."""
+
+    turn: int
+    duration_s: float = 0.0
+    # Time spent waiting for the model, excluding actions run while streaming.
+    model_s: float = 0.0
+    # Time until the first chunk arrived, when streaming.
+    first_chunk_s: Optional[float] = None
+    model_retries: int = 0
+    actions: list[ActionTiming] = []
+    # Capturing the observation includes waiting for the page to settle.
+    screenshot_capture_s: Optional[float] = None
+    settle_s: Optional[float] = None
+    screenshot_encode_s: Optional[float] = None
+    screenshot_bytes: int = 0
+    # Size of the request body, when it is encoded incrementally.
+    request_bytes: Optional[int] = None
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+
+class AgentMetrics(pydantic.BaseModel):
+    # Observations (screenshots) the agent could have sent to the model.
+    observations: int = 0
+    # Observations replaced by a "screen unchanged" response.
+    observations_elided: int = 0
+    # Token usage reported by the model, in total and per turn.
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    prompt_tokens_per_turn: list[int] = []
+    # Times the conversation was compacted, and the tokens that saved.
+    compactions: int = 0
+    compaction_tokens_saved: int = 0
+    # Context caching of the stable prefix of the conversation: caches created,
+    # requests that referenced one, TTL extensions, caches that expired before
+    # they could be refreshed and caches dropped because their turns changed.
+    context_caches_created: int = 0
+    context_cache_hits: int = 0
+    context_cache_refreshes: int = 0
+    context_cache_expirations: int = 0
+    context_cache_invalidations: int = 0
+    # Prompt tokens the model reported as served from a cache.
+    cached_prompt_tokens: int = 0
+    turns: list[TurnMetrics] = []
+
+    @property
+    def elision_rate(self) -> float:
+        if not self.observations:
+            return 0.0
+        return self.observations_elided / self.observations
+
+
+class Histogram:
+    """A thread-safe histogram with cumulative buckets, as Prometheus exports them."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        # The last count is for values above the largest bucket.
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> tuple[list[tuple[float, int]], float, int]:
+        """Returns the cumulative count of each bucket, the sum and the count."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, total, running
+
+
+class TurnStats:
+    """Aggregates the TurnMetrics of every agent in the process."""
+
+    def __init__(self):
+        self.turn_duration_s = Histogram(LATENCY_BUCKETS_S)
+        self.model_latency_s = Histogram(LATENCY_BUCKETS_S)
+        self.first_chunk_s = Histogram(LATENCY_BUCKETS_S)
+        self.action_duration_s = Histogram(LATENCY_BUCKETS_S)
+        self.screenshot_capture_s = Histogram(LATENCY_BUCKETS_S)
+        self.settle_s = Histogram(LATENCY_BUCKETS_S)
+        self.screenshot_encode_s = Histogram(LATENCY_BUCKETS_S)
+        self.screenshot_bytes = Histogram(BYTES_BUCKETS)
+        self.request_bytes = Histogram(BYTES_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.model_retries = 0
+        self._lock = threading.Lock()
+
+    def observe(self, turn: TurnMetrics):
+        self.turn_duration_s.observe(turn.duration_s)
+        self.model_latency_s.observe(turn.model_s)
+        for action in turn.actions:
+            self.action_duration_s.observe(action.duration_s)
+        optional = [
+            (self.first_chunk_s, turn.first_chunk_s),
+            (self.screenshot_capture_s, turn.screenshot_capture_s),
+            (self.settle_s, turn.settle_s),
+            (self.screenshot_encode_s, turn.screenshot_encode_s),
+            (self.request_bytes, turn.request_bytes),
+        ]
+        for histogram, value in optional:
+            if value is not None:
+                histogram.observe(value)
+        if turn.screenshot_bytes:
+            self.screenshot_bytes.observe(turn.screenshot_bytes)
+        if turn.prompt_tokens:
+            self.prompt_tokens.observe(turn.prompt_tokens)
+        with self._lock:
+            self.model_retries += turn.model_retries
@@ -0,0 +1,200 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Incremental wire encoding of generate_content requests.
+
+`Models.generate_content` validates, converts and base64-encodes every content of
+the conversation on every call, so a long run does quadratic serialization work.
+`IncrementalRequestEncoder` encodes each content once, reuses the encoding on
+later turns and only re-encodes the contents it is told have changed.
+
+This goes through the same converters as the SDK, some of which are private,
+so `create` returns None if this version of the SDK doesn't provide them, and
+requests raise RequestEncodingError if they fail, for the caller to fall back
+to the SDK.
+"""
+import json
+from typing import AsyncIterator, Iterator, Optional
+
+from google import genai
+from google.genai import _common, models
+from google.genai import types
+
+
+class RequestEncodingError(Exception):
+    """Raised when encoding a request or decoding its response fails."""
+
+
+class IncrementalRequestEncoder:
+    def __init__(
+        self,
+        client: genai.Client,
+        model: str,
+        config: types.GenerateContentConfig,
+    ):
+        self._api_client = client._api_client
+        if self._api_client.vertexai:
+            self._to_wire = models._GenerateContentParameters_to_vertex
+            self._from_wire = models._GenerateContentResponse_from_vertex
+        else:
+            self._to_wire = models._GenerateContentParameters_to_mldev
+            self._from_wire = models._GenerateContentResponse_from_mldev
+        self._model = model
+        self._set_config(config)
+        # id(content) -> (content, encoding, encoded size). The content is kept
+        # to guard against ids being reused by new objects.
+        self._encoded: dict[int, tuple[types.Content, dict, int]] = {}
+        # The approximate size of the last request body.
+        self.last_request_bytes = 0
+
+    def _set_config(self, config: types.GenerateContentConfig):
+        self._config = config
+        self._http_options = config.http_options
+        # Encode everything but the contents once. The placeholder content is
+        # replaced by the cached encodings on every request.
+        self._parameters = types._GenerateContentParameters(
+            model=self._model,
+            contents=[types.Content(role="user", parts=[])],
+            config=config,
+        )
+        template = self._encode(self._parameters)
+        url = template.pop("_url")
+        self._path = "{model}:generateContent".format_map(url)
+        self._stream_path = "{model}:streamGenerateContent?alt=sse".format_map(url)
+        template.pop("contents")
+        self._template = template
+        self._template_bytes = len(json.dumps(template))
+
+    @classmethod
+    def create(
+        cls,
+        client: genai.Client,
+        model: str,
+        config: types.GenerateContentConfig,
+    ) -> Optional["IncrementalRequestEncoder"]:
+        """Returns an encoder, or None if the SDK doesn't support it."""
+        try:
+            return cls(client, model, config)
+        except Exception as e:
+            print(f"Incremental request encoding unavailable, using the SDK: {e}")
+            return None
+
+    def _encode(self, parameters: types._GenerateContentParameters) -> dict:
+        request_dict = self._to_wire(self._api_client, parameters, None, parameters)
+        # The SDK drops the config from the request body as well.
+        request_dict.pop("config", None)
+        request_dict = _common.convert_to_dict(request_dict)
+        return _common.encode_unserializable_types(request_dict)
+
+    def encode_contents(self, contents: list[types.Content]) -> list[dict]:
+        """Returns the wire encoding of `contents`, encoding only new contents."""
+        encoded = {}
+        result = []
+        request_bytes = self._template_bytes
+        for content in contents:
+            entry = self._encoded.get(id(content))
+            if entry is None or entry[0] is not content:
+                parameters = types._GenerateContentParameters(
+                    model=self._model, contents=[content]
+                )
+                encoding = self._encode(parameters)["contents"][0]
+                entry = (content, encoding, len(json.dumps(encoding)))
+            encoded[id(content)] = entry
+            result.append(entry[1])
+            request_bytes += entry[2]
+        # Forget the contents that are no longer part of the conversation.
+        self._encoded = encoded
+        self.last_request_bytes = request_bytes
+        return result
+
+    def invalidate(self, content: types.Content):
+        """Marks a content as changed since it was last encoded."""
+        self._encoded.pop(id(content), None)
+
+    def generate_content(
+        self,
+        contents: list[types.Content],
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> types.GenerateContentResponse:
+        request_dict = self._request_dict(contents, config)
+        response = self._api_client.request(
+            "post", self._path, request_dict, self._http_options
+        )
+        return self._decode(response)
+
+    async def agenerate_content(
+        self,
+        contents: list[types.Content],
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> types.GenerateContentResponse:
+        request_dict = self._request_dict(contents, config)
+        response = await self._api_client.async_request(
+            "post", self._path, request_dict, self._http_options
+        )
+        return self._decode(response)
+
+    def generate_content_stream(
+        self,
+        contents: list[types.Content],
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> Iterator[types.GenerateContentResponse]:
+        # Encoded before returning, so encoding failures are raised right away.
+        request_dict = self._request_dict(contents, config)
+        return self._stream(request_dict)
+
+    def _stream(self, request_dict: dict) -> Iterator[types.GenerateContentResponse]:
+        for response in self._api_client.request_streamed(
+            "post", self._stream_path, request_dict, self._http_options
+        ):
+            yield self._decode(response)
+
+    def agenerate_content_stream(
+        self,
+        contents: list[types.Content],
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        request_dict = self._request_dict(contents, config)
+        return self._astream(request_dict)
+
+    async def _astream(self, request_dict: dict) -> AsyncIterator[types.GenerateContentResponse]:
+        responses = await self._api_client.async_request_streamed(
+            "post", self._stream_path, request_dict, self._http_options
+        )
+        async for response in responses:
+            yield self._decode(response)
+
+    def _request_dict(
+        self,
+        contents: list[types.Content],
+        config: Optional[types.GenerateContentConfig],
+    ) -> dict:
+        """Builds the request body. `config` replaces the config the encoder was
+        created with, e.g. to reference a context cache."""
+        try:
+            if config is not None and config is not self._config:
+                self._set_config(config)
+            return {**self._template, "contents": self.encode_contents(contents)}
+        except Exception as e:
+            raise RequestEncodingError(f"Encoding the request failed: {e!r}") from e
+
+    def _decode(self, response: types.HttpResponse) -> types.GenerateContentResponse:
+        try:
+            response_dict = {} if not response.body else json.loads(response.body)
+            response_dict = self._from_wire(response_dict, None, self._parameters)
+            return_value = types.GenerateContentResponse._from_response(
+                response=response_dict, kwargs={}
+            )
+        except Exception as e:
+            raise RequestEncodingError(f"Decoding the response failed: {e!r}") from e
+        return_value.sdk_http_response = types.HttpResponse(headers=response.headers)
+        return return_value
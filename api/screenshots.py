@@ -0,0 +1,248 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Encoding and comparison of screenshots before they are sent to the model."""
+import collections
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Literal, Optional
+
+import pydantic
+from google.genai import types
+from PIL import Image
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+# Side of the grayscale thumbnail used to compare screenshots visually.
+FINGERPRINT_SIZE = 32
+
+# Encoding is CPU-bound, so it runs on a shared pool instead of the thread
+# driving the browser.
+_encoder_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_encoder_pool() -> ThreadPoolExecutor:
+    global _encoder_pool
+    if _encoder_pool is None:
+        _encoder_pool = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1),
+            thread_name_prefix="screenshot-encoder",
+        )
+    return _encoder_pool
+
+
+class ScreenshotEncoding(pydantic.BaseModel):
+    format: Literal["png", "jpeg", "webp"] = "png"
+    # Only used by the lossy formats.
+    quality: int = pydantic.Field(default=80, ge=1, le=100)
+    # Screenshots are downscaled to fit within these bounds, keeping the aspect
+    # ratio. The model works on a normalized 0-1000 grid, so coordinates stay valid.
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, prefix: str = "SCREENSHOT_", **defaults) -> "ScreenshotEncoding":
+        """Reads e.g. SCREENSHOT_FORMAT and SCREENSHOT_MAX_WIDTH from the environment."""
+        values = dict(defaults)
+        for field in cls.model_fields:
+            value = os.environ.get(prefix + field.upper())
+            if value is not None:
+                values[field] = value
+        return cls(**values)
+
+
+class EncodedScreenshot(pydantic.BaseModel):
+    data: bytes
+    mime_type: str
+    # Time spent re-encoding, zero for passthrough.
+    encode_s: float = 0.0
+
+
+class ScreenshotEncoder:
+    """Re-encodes PNG screenshots to the configured resolution and format."""
+
+    def __init__(self, encoding: Optional[ScreenshotEncoding] = None):
+        self._encoding = encoding or ScreenshotEncoding()
+
+    @property
+    def encoding(self) -> ScreenshotEncoding:
+        return self._encoding
+
+    def is_passthrough(self) -> bool:
+        encoding = self._encoding
+        return (
+            encoding.format == "png"
+            and encoding.max_width is None
+            and encoding.max_height is None
+        )
+
+    def encode(self, png: bytes) -> EncodedScreenshot:
+        if self.is_passthrough():
+            return EncodedScreenshot(data=png, mime_type=MIME_TYPES["png"])
+        start = time.perf_counter()
+        encoding = self._encoding
+        image = Image.open(io.BytesIO(png))
+        image.thumbnail(
+            (encoding.max_width or image.width, encoding.max_height or image.height),
+            Image.Resampling.LANCZOS,
+        )
+        output = io.BytesIO()
+        if encoding.format == "png":
+            image.save(output, format="PNG", optimize=False)
+        elif encoding.format == "jpeg":
+            image.convert("RGB").save(output, format="JPEG", quality=encoding.quality)
+        else:
+            image.save(output, format="WEBP", quality=encoding.quality)
+        return EncodedScreenshot(
+            data=output.getvalue(),
+            mime_type=MIME_TYPES[encoding.format],
+            encode_s=time.perf_counter() - start,
+        )
+
+    def submit(self, png: bytes) -> "Future[EncodedScreenshot]":
+        """Encodes the screenshot on the shared encoder pool."""
+        if self.is_passthrough():
+            future: Future[EncodedScreenshot] = Future()
+            future.set_result(self.encode(png))
+            return future
+        return _get_encoder_pool().submit(self.encode, png)
+
+
+class ScreenshotFingerprint:
+    """Identifies a screenshot, to tell whether the screen changed between turns.
+
+    The digest detects byte-identical screenshots. The small grayscale thumbnail
+    is only computed when needed, to detect near-identical ones.
+    """
+
+    def __init__(self, png: bytes):
+        self._png = png
+        self.digest = hashlib.sha256(png).hexdigest()
+        self._thumbnail: Optional[bytes] = None
+
+    @property
+    def thumbnail(self) -> bytes:
+        if self._thumbnail is None:
+            image = Image.open(io.BytesIO(self._png)).convert("L")
+            image = image.resize((FINGERPRINT_SIZE, FINGERPRINT_SIZE), Image.Resampling.BOX)
+            self._thumbnail = image.tobytes()
+            # The screenshot itself is no longer needed.
+            self._png = b""
+        return self._thumbnail
+
+    def difference(self, other: "ScreenshotFingerprint") -> float:
+        """Returns how different the screenshots are, from 0 (identical) to 1."""
+        if self.digest == other.digest:
+            return 0.0
+        total = sum(abs(a - b) for a, b in zip(self.thumbnail, other.thumbnail))
+        return total / (255 * FINGERPRINT_SIZE * FINGERPRINT_SIZE)
+
+
+# Screenshots older than the full-quality tier are kept as small thumbnails.
+THUMBNAIL_ENCODING = ScreenshotEncoding(format="jpeg", quality=60, max_width=320)
+
+# A turn's content, its screenshot-bearing function responses and its index in
+# the conversation.
+_Turn = tuple[types.Content, list[types.FunctionResponse], int]
+
+
+class ScreenshotHistory:
+    """Tracks the turns that carry screenshots and degrades older ones in tiers.
+
+    The most recent `full_turns` keep their screenshots as sent, the next
+    `thumbnail_turns` are downscaled to thumbnails and older turns lose their
+    screenshots entirely. Adding a turn only touches the turns that cross a tier
+    boundary, so the cost doesn't grow with the length of the conversation.
+    `on_degrade` is called with each turn whose screenshots were changed.
+    """
+
+    def __init__(
+        self,
+        full_turns: int,
+        thumbnail_turns: int = 0,
+        thumbnail_encoding: ScreenshotEncoding = THUMBNAIL_ENCODING,
+        on_degrade: Optional[Callable[[types.Content], None]] = None,
+    ):
+        self._full_turns = full_turns
+        self._thumbnail_turns = thumbnail_turns
+        self._thumbnail_encoder = ScreenshotEncoder(thumbnail_encoding)
+        self._on_degrade = on_degrade
+        self._full: collections.deque[_Turn] = collections.deque()
+        self._thumbnails: collections.deque[_Turn] = collections.deque()
+
+    def add(
+        self,
+        content: types.Content,
+        function_responses: list[types.FunctionResponse],
+        index: int,
+    ):
+        """Registers a new turn at `index` of the conversation and the
+        screenshot-bearing responses in it."""
+        self._full.append((content, function_responses, index))
+        if len(self._full) > self._full_turns:
+            demoted = self._full.popleft()
+            if self._thumbnail_turns > 0:
+                for function_response in demoted[1]:
+                    self._to_thumbnail(function_response)
+                self._thumbnails.append(demoted)
+                self._degraded(demoted)
+            else:
+                self._strip(demoted)
+        if len(self._thumbnails) > self._thumbnail_turns:
+            self._strip(self._thumbnails.popleft())
+
+    def oldest_pending(self) -> Optional[tuple[int, types.Content]]:
+        """Returns the index and content of the oldest turn whose screenshots
+        may still be degraded."""
+        for turns in (self._thumbnails, self._full):
+            if turns:
+                content, _, index = turns[0]
+                return index, content
+        return None
+
+    def rebase(self, contents: list[types.Content]):
+        """Forgets the turns no longer in `contents` and reindexes the others,
+        after the conversation was compacted."""
+        indices = {id(content): i for i, content in enumerate(contents)}
+        for turns in (self._full, self._thumbnails):
+            kept = [
+                (content, function_responses, indices[id(content)])
+                for content, function_responses, _ in turns
+                if id(content) in indices
+            ]
+            turns.clear()
+            turns.extend(kept)
+
+    def _to_thumbnail(self, function_response: types.FunctionResponse):
+        for part in function_response.parts or []:
+            if part.inline_data and part.inline_data.data:
+                thumbnail = self._thumbnail_encoder.encode(part.inline_data.data)
+                part.inline_data = types.FunctionResponseBlob(
+                    mime_type=thumbnail.mime_type, data=thumbnail.data
+                )
+
+    def _strip(self, turn: _Turn):
+        for function_response in turn[1]:
+            function_response.parts = None
+        self._degraded(turn)
+
+    def _degraded(self, turn: _Turn):
+        if self._on_degrade:
+            self._on_degrade(turn[0])
@@ -0,0 +1,412 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Metrics of the API server, rendered in the Prometheus text format."""
+import contextlib
+import threading
+from typing import Iterator, Optional, Sequence, Union
+
+from computers import (
+    BrowserbasePoolStats,
+    MemoryGovernorStats,
+    PlaywrightPoolStats,
+    ProfileSnapshotStats,
+    RoutingStats,
+    TaskCancelled,
+)
+from metrics import LATENCY_BUCKETS_S, Histogram, TurnMetrics, TurnStats
+
+STEP_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SESSION_SETUP_BUCKETS_S = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+TASK_DURATION_BUCKETS_S = (5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0)
+
+_Labels = tuple[tuple[str, str], ...]
+
+# The fields of the browser pool stats that are exported, and as what.
+_BROWSER_POOL_METRICS = {
+    "size": ("browser_pool_size", "gauge", "Browsers the pool keeps launched."),
+    "keys": ("browser_pool_keys", "gauge", "Context and proxy combinations the pool keeps sessions for."),
+    "launched": ("browser_pool_launched", "gauge", "Pooled browsers currently launched."),
+    "creating": ("browser_pool_creating", "gauge", "Pooled sessions being created."),
+    "idle": ("browser_pool_idle", "gauge", "Pooled browsers waiting for a task."),
+    "leased": ("browser_pool_leased", "gauge", "Pooled browsers running a task."),
+    "health_check_failures": ("browser_pool_health_check_failures_total", "counter", "Failed health checks of idle pooled browsers."),
+    "creation_failures": ("browser_pool_creation_failures_total", "counter", "Pooled sessions that failed to start."),
+}
+
+
+def _format_labels(labels: _Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family:
+    """Labelled values of one metric."""
+
+    def __init__(self, name: str, help: str, kind: str):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    def __init__(self, name: str, help: str, kind: str = "counter"):
+        super().__init__(name, help, kind)
+        self._values: dict[_Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def sum(self, **labels: str) -> float:
+        """Total of the values that have at least `labels`."""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(v for k, v in self._values.items() if wanted <= set(k))
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(k)} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help, "gauge")
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+class HistogramFamily(_Family):
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        super().__init__(name, help, "histogram")
+        self._buckets = buckets
+        self._histograms: dict[_Labels, Histogram] = {}
+
+    def labels(self, **labels: str) -> Histogram:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            return histogram
+
+    def observe(self, value: float, **labels: str):
+        self.labels(**labels).observe(value)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        lines = self.header()
+        for key, histogram in sorted(histograms.items()):
+            lines += render_histogram(self.name, histogram, key)
+        return lines
+
+
+def render_histogram(name: str, histogram: Histogram, labels: _Labels = ()) -> list[str]:
+    buckets, total, count = histogram.snapshot()
+    lines = [
+        f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {n}"
+        for bound, n in buckets
+    ]
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return lines
+
+
+class ServerMetrics:
+    """Everything the server exports on /metrics."""
+
+    def __init__(self):
+        self.tasks_active = Gauge("browser_tasks_active", "Tasks currently running.")
+        self.tasks_queued = Gauge(
+            "browser_tasks_queued", "Tasks accepted but waiting for a worker."
+        )
+        self.tasks_total = Counter(
+            "browser_tasks_total", "Tasks finished, by environment and outcome."
+        )
+        self.tasks_rejected = Counter(
+            "browser_tasks_rejected_total", "Tasks turned away because every worker was busy."
+        )
+        self.tasks_parked = Gauge(
+            "browser_tasks_parked", "Tasks waiting for a user without holding a worker."
+        )
+        self.workers_busy = Gauge("task_workers_busy", "Workers running a task.")
+        self.workers_total = Gauge("task_workers", "Size of the task worker pool.")
+        self.queue_wait_s = HistogramFamily(
+            "task_queue_wait_seconds",
+            "Time a task waited for a worker.",
+            LATENCY_BUCKETS_S,
+        )
+        self.execution_s = HistogramFamily(
+            "task_execution_seconds",
+            "Time a worker spent running a task.",
+            TASK_DURATION_BUCKETS_S,
+        )
+        self.request_duration_s = HistogramFamily(
+            "http_request_duration_seconds",
+            "Time until the response headers are sent, by endpoint.",
+            LATENCY_BUCKETS_S,
+        )
+        self.agent_steps = HistogramFamily(
+            "agent_steps_per_task", "Agent turns taken per task.", STEP_BUCKETS
+        )
+        self.session_setup_s = HistogramFamily(
+            "browser_session_setup_seconds",
+            "Time to start a browser session, by environment.",
+            SESSION_SETUP_BUCKETS_S,
+        )
+        self.session_phase_s = HistogramFamily(
+            "browser_session_phase_seconds",
+            "Duration of each phase of starting a browser session, by environment. Phases may overlap.",
+            SESSION_SETUP_BUCKETS_S,
+        )
+        self.model_requests = Counter(
+            "model_requests_total",
+            "Model requests made, retries included, by outcome and error type.",
+        )
+        self.requests_routed = Counter(
+            "browser_requests_routed_total", "Requests seen by request routing, by environment."
+        )
+        self.requests_blocked = Counter(
+            "browser_requests_blocked_total",
+            "Requests blocked by request routing, by environment and reason.",
+        )
+        self.request_bytes_saved = Counter(
+            "browser_request_bytes_saved_total",
+            "Estimated bytes not downloaded thanks to blocked requests, by environment.",
+        )
+        self.sse_events_coalesced = Counter(
+            "sse_events_coalesced_total",
+            "Log events merged or dropped because a client read too slowly.",
+        )
+        for env in ("playwright", "browserbase"):
+            self.tasks_active.set(0, env=env)
+        self.tasks_queued.set(0)
+        self.tasks_rejected.inc(0)
+        self.tasks_parked.set(0)
+        self.workers_busy.set(0)
+        self.sse_events_coalesced.inc(0)
+        self.model_requests.inc(0, outcome="success")
+        # The latest stats of the browser pools, by environment.
+        self.browser_pools: dict[str, Union[PlaywrightPoolStats, BrowserbasePoolStats]] = {}
+        # The latest stats of the browser memory governor, if any.
+        self.memory_governor: Optional[MemoryGovernorStats] = None
+        # The latest stats of the Playwright profile clones, if cloning.
+        self.profile_snapshots: Optional[ProfileSnapshotStats] = None
+        # The per-turn timings reported by the agents.
+        self.turns = TurnStats()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track_task(self, env: str) -> Iterator[None]:
+        self.tasks_active.inc(env=env)
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        except TaskCancelled:
+            outcome = "cancelled"
+            raise
+        finally:
+            self.tasks_active.dec(env=env)
+            self.tasks_total.inc(env=env, outcome=outcome)
+
+    def observe_session_setup(self, env: str, seconds: float, phases: dict[str, float]):
+        self.session_setup_s.observe(seconds, env=env)
+        for phase, phase_seconds in phases.items():
+            self.session_phase_s.observe(phase_seconds, env=env, phase=phase)
+
+    def observe_routing(self, env: str, stats: RoutingStats):
+        self.requests_routed.inc(stats.requests, env=env)
+        for reason, count in stats.blocked_by_reason.items():
+            self.requests_blocked.inc(count, env=env, reason=reason)
+        self.request_bytes_saved.inc(stats.estimated_bytes_saved, env=env)
+
+    def observe_agent_event(self, data: dict):
+        """Records the agent events that are aggregated; usable as log_callback."""
+        if data["type"] == "turn":
+            self.turns.observe(TurnMetrics(**data))
+        elif data["type"] == "model_request":
+            if data["outcome"] == "success":
+                self.model_requests.inc(outcome="success")
+            else:
+                self.model_requests.inc(outcome="error", error_type=data["error_type"])
+
+    def observe_browser_pool(
+        self, env: str, stats: Union[PlaywrightPoolStats, BrowserbasePoolStats]
+    ):
+        with self._lock:
+            self.browser_pools[env] = stats
+
+    def observe_memory_governor(self, stats: MemoryGovernorStats):
+        with self._lock:
+            self.memory_governor = stats
+
+    def observe_profile_snapshots(self, stats: ProfileSnapshotStats):
+        with self._lock:
+            self.profile_snapshots = stats
+
+    def render(self) -> str:
+        lines = []
+        for family in (
+            self.tasks_active,
+            self.tasks_queued,
+            self.tasks_total,
+            self.tasks_rejected,
+            self.tasks_parked,
+            self.workers_busy,
+            self.workers_total,
+            self.queue_wait_s,
+            self.execution_s,
+            self.request_duration_s,
+            self.agent_steps,
+            self.session_setup_s,
+            self.session_phase_s,
+            self.model_requests,
+            self.requests_routed,
+            self.requests_blocked,
+            self.request_bytes_saved,
+            self.sse_events_coalesced,
+        ):
+            lines += family.render()
+
+        requests = self.model_requests.sum()
+        errors = self.model_requests.sum(outcome="error")
+        lines += [
+            "# HELP model_request_error_ratio Share of the model requests made that failed.",
+            "# TYPE model_request_error_ratio gauge",
+            f"model_request_error_ratio {_format_value(errors / requests if requests else 0.0)}",
+        ]
+        for name, help, histogram in (
+            ("agent_turn_duration_seconds", "Duration of an agent turn.", self.turns.turn_duration_s),
+            ("model_latency_seconds", "Time spent waiting for the model per turn.", self.turns.model_latency_s),
+            ("model_first_chunk_seconds", "Time to the first streamed chunk.", self.turns.first_chunk_s),
+            ("browser_action_duration_seconds", "Duration of a browser action.", self.turns.action_duration_s),
+            ("screenshot_capture_seconds", "Time to capture an observation, including settling.", self.turns.screenshot_capture_s),
+            ("page_settle_seconds", "Time waiting for the page to settle.", self.turns.settle_s),
+            ("screenshot_encode_seconds", "Time re-encoding a screenshot.", self.turns.screenshot_encode_s),
+            ("screenshot_bytes", "Size of the screenshot sent per turn.", self.turns.screenshot_bytes),
+            ("model_request_bytes", "Size of the model request body.", self.turns.request_bytes),
+            ("model_prompt_tokens", "Prompt tokens per model request.", self.turns.prompt_tokens),
+        ):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+            lines += render_histogram(name, histogram)
+
+        with self._lock:
+            pools = dict(self.browser_pools)
+        for field, (name, kind, help) in _BROWSER_POOL_METRICS.items():
+            values = [
+                (env, getattr(stats, field))
+                for env, stats in sorted(pools.items())
+                if hasattr(stats, field)
+            ]
+            if values:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f'{name}{{env="{env}"}} {value}' for env, value in values]
+        if pools:
+            lines += [
+                "# HELP browser_pool_leases_total Pooled browsers leased, by whether they were started ahead of time.",
+                "# TYPE browser_pool_leases_total counter",
+            ]
+            for env, stats in sorted(pools.items()):
+                lines += [
+                    f'browser_pool_leases_total{{env="{env}",warm="true"}} {stats.warm_leases}',
+                    f'browser_pool_leases_total{{env="{env}",warm="false"}} {stats.cold_leases}',
+                ]
+        recycles = [
+            (env, reason, count)
+            for env, stats in sorted(pools.items())
+            for reason, count in sorted(stats.recycled_by_reason.items())
+        ]
+        if recycles:
+            lines += [
+                "# HELP browser_pool_recycled_total Pooled browsers closed before their time, by reason.",
+                "# TYPE browser_pool_recycled_total counter",
+            ]
+            lines += [
+                f'browser_pool_recycled_total{{env="{env}",reason="{reason}"}} {count}'
+                for env, reason, count in recycles
+            ]
+
+        with self._lock:
+            memory = self.memory_governor
+        if memory:
+            for name, kind, help, value in (
+                ("browser_memory_rss_high_water_bytes", "gauge", "Largest resident memory sampled from a browser and its processes.", memory.rss_high_water_bytes),
+                ("browser_memory_js_heap_high_water_bytes", "gauge", "Largest JS heap sampled from a browser page.", memory.js_heap_high_water_bytes),
+                ("browser_leases_refused_total", "counter", "Browser leases refused because the host was short of memory.", memory.leases_refused),
+            ):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines.append(f"{name} {_format_value(value)}")
+            if memory.host_available_bytes is not None:
+                lines += [
+                    "# HELP host_memory_available_bytes Memory available on the host for new processes.",
+                    "# TYPE host_memory_available_bytes gauge",
+                    f"host_memory_available_bytes {memory.host_available_bytes}",
+                ]
+
+        with self._lock:
+            profiles = self.profile_snapshots
+        if profiles:
+            for name, kind, help, value in (
+                ("browser_profile_clones_active", "gauge", "Profile clones in use by a browser.", profiles.active),
+                ("browser_profile_clones_total", "counter", "Profile clones made.", profiles.clones),
+                ("browser_profile_merges_total", "counter", "Profile clones merged back into the golden profile.", profiles.merges),
+                ("browser_profile_clone_seconds_total", "counter", "Time spent cloning profiles.", profiles.clone_s_total),
+                ("browser_profile_clone_last_seconds", "gauge", "Duration of the latest profile clone.", profiles.last_clone_s),
+                ("browser_profile_cloned_bytes_total", "counter", "Apparent size of the profile clones made.", profiles.bytes_cloned),
+                ("browser_profile_disk_usage_bytes", "gauge", "Disk allocated to the profile clones in use.", profiles.disk_usage_bytes),
+            ):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines.append(f"{name} {_format_value(value)}")
+            lines += [
+                "# HELP browser_profile_clone_method How profiles are cloned: reflink or copy.",
+                "# TYPE browser_profile_clone_method gauge",
+                f'browser_profile_clone_method{{method="{profiles.method}"}} 1',
+            ]
+
+        lines += [
+            "# HELP process_threads Threads in the server process.",
+            "# TYPE process_threads gauge",
+            f"process_threads {threading.active_count()}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,219 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A bounded pool of worker threads for blocking browser tasks."""
+import collections
+import concurrent.futures
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Generic, Iterator, Optional, TypeVar
+
+from server_metrics import ServerMetrics
+
+T = TypeVar("T")
+
+# Assumed duration of a task until one has finished, for Retry-After estimates.
+DEFAULT_TASK_DURATION_S = 30.0
+# Weight of the latest task in the running average of task durations.
+DURATION_SMOOTHING = 0.2
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"All workers are busy; retry in {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class TaskTicket(Generic[T]):
+    """A submitted task, with its timings."""
+
+    def __init__(self):
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: "concurrent.futures.Future[T]" = concurrent.futures.Future()
+
+    @property
+    def queue_wait_s(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    @property
+    def execution_s(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class TaskExecutor:
+    """Runs at most `max_workers` tasks at once and queues up to `max_queued` more.
+
+    Submitting beyond that raises ExecutorSaturated instead of queueing without
+    bound, so the caller can turn clients away with a retry hint. Cancelling the
+    future of a queued task takes it off the queue right away.
+
+    A running task waiting on something other than its browser or the model,
+    such as a user's confirmation, can `park` to hand its worker slot to the
+    next task. Up to `max_parked` tasks can be parked at once. Parking doesn't
+    suspend the task: it keeps its thread and whatever it holds, such as its
+    browser, until it resumes. So the pool runs up to `max_workers +
+    max_parked` threads, and parked tasks should wait with a timeout.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queued: int,
+        max_parked: int = 0,
+        metrics: Optional[ServerMetrics] = None,
+    ):
+        self._max_workers = max_workers
+        self._max_queued = max_queued
+        self._max_parked = max_parked
+        self._metrics = metrics
+        # Parked tasks keep their thread, so the pool has a spare one for each.
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers + max_parked, thread_name_prefix="browser-task"
+        )
+        self._lock = threading.Lock()
+        self._pending: collections.deque[tuple[Callable, TaskTicket]] = collections.deque()
+        # Parked tasks waiting for a slot again. They go before pending tasks.
+        self._resuming: collections.deque[threading.Event] = collections.deque()
+        self._running = 0
+        # Including the tasks waiting to resume.
+        self._parked = 0
+        self._average_duration_s = DEFAULT_TASK_DURATION_S
+        if metrics:
+            metrics.workers_total.set(max_workers)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def parked(self) -> int:
+        return self._parked
+
+    def submit(self, task: Callable[[], T]) -> TaskTicket[T]:
+        ticket: TaskTicket[T] = TaskTicket()
+        ticket.future.add_done_callback(lambda _: self._discard_if_cancelled(ticket))
+        with self._lock:
+            saturated = (
+                len(self._pending) + self._running
+                >= self._max_workers + self._max_queued
+            )
+            if saturated:
+                retry_after_s = self._retry_after_s()
+            else:
+                self._pending.append((task, ticket))
+                self._dispatch()
+        if saturated:
+            if self._metrics:
+                self._metrics.tasks_rejected.inc()
+            raise ExecutorSaturated(retry_after_s)
+        return ticket
+
+    @contextlib.contextmanager
+    def park(self) -> Iterator[None]:
+        """Frees the worker slot of the calling task for the duration of the block.
+
+        If `max_parked` tasks are parked already, the task keeps its slot.
+        """
+        with self._lock:
+            parked = self._parked < self._max_parked
+            if parked:
+                self._parked += 1
+                self._running -= 1
+                self._dispatch()
+        try:
+            yield
+        finally:
+            if parked:
+                resumed = threading.Event()
+                with self._lock:
+                    self._resuming.append(resumed)
+                    self._dispatch()
+                resumed.wait()
+
+    def _dispatch(self):
+        """Fills the free worker slots. Called with the lock held."""
+        while self._running < self._max_workers:
+            if self._resuming:
+                self._parked -= 1
+                self._resuming.popleft().set()
+            elif self._pending:
+                self._pool.submit(self._run, *self._pending.popleft())
+            else:
+                break
+            self._running += 1
+        if self._metrics:
+            self._metrics.tasks_queued.set(len(self._pending))
+            self._metrics.tasks_parked.set(self._parked)
+            self._metrics.workers_busy.set(self._running)
+
+    def _discard_if_cancelled(self, ticket: TaskTicket):
+        """Frees the place in the queue of a task cancelled before it started."""
+        if not ticket.future.cancelled():
+            return
+        with self._lock:
+            for entry in self._pending:
+                if entry[1] is ticket:
+                    self._pending.remove(entry)
+                    self._dispatch()
+                    break
+
+    def _retry_after_s(self) -> int:
+        # Roughly when a slot frees up for a task at the back of the queue.
+        waves = (len(self._pending) + 1) / self._max_workers
+        return max(1, math.ceil(self._average_duration_s * waves))
+
+    def _run(self, task: Callable[[], T], ticket: TaskTicket[T]):
+        if not ticket.future.set_running_or_notify_cancel():
+            # Cancelled between leaving the queue and starting.
+            with self._lock:
+                self._running -= 1
+                self._dispatch()
+            return
+        ticket.started_at = time.monotonic()
+        if self._metrics:
+            self._metrics.queue_wait_s.observe(ticket.queue_wait_s)
+        try:
+            ticket.future.set_result(task())
+        except BaseException as e:
+            ticket.future.set_exception(e)
+        finally:
+            ticket.finished_at = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                self._average_duration_s += DURATION_SMOOTHING * (
+                    ticket.execution_s - self._average_duration_s
+                )
+                self._dispatch()
+            if self._metrics:
+                self._metrics.execution_s.observe(ticket.execution_s)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
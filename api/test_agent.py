@@ -12,12 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import os
 import unittest
-from unittest.mock import MagicMock, patch
-from google.genai import types
-from agent import BrowserAgent, multiply_numbers
-from computers import EnvState
+from unittest.mock import AsyncMock, MagicMock, patch
+from google.genai import errors, types
+from agent import AsyncBrowserAgent, BrowserAgent, multiply_numbers
+from compaction import CompactionConfig
+from computers import (
+    AsyncDeferredEnvState,
+    CancellationToken,
+    DeferredEnvState,
+    EnvState,
+    SettleResult,
+    TaskCancelled,
+)
+from screenshots import ScreenshotHistory
 
 class TestBrowserAgent(unittest.TestCase):
     def setUp(self):
@@ -106,6 +116,394 @@ class TestBrowserAgent(unittest.TestCase):
         mock_handle_action.assert_called_once_with(function_call)
         self.assertEqual(len(self.agent._contents), 3)
 
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_captures_one_screenshot_per_turn(self, mock_handle_action, mock_get_model_response):
+        mock_response = MagicMock()
+        mock_candidate = MagicMock()
+        function_calls = [
+            types.FunctionCall(name="click_at", args={"x": 1, "y": 2}),
+            types.FunctionCall(name="navigate", args={"url": "https://example.com"}),
+        ]
+        mock_candidate.content.parts = [types.Part(function_call=fc) for fc in function_calls]
+        mock_response.candidates = [mock_candidate]
+        mock_get_model_response.return_value = mock_response
+
+        captures = [MagicMock(), MagicMock()]
+        captures[1].return_value = EnvState(screenshot=b"screenshot", url="https://example.com")
+        mock_handle_action.side_effect = [
+            DeferredEnvState(url="https://first.com", capture=captures[0]),
+            DeferredEnvState(url="https://example.com", capture=captures[1]),
+        ]
+
+        result = self.agent.run_one_iteration()
+
+        self.assertEqual(result, "CONTINUE")
+        captures[0].assert_not_called()
+        captures[1].assert_called_once()
+        first, second = [p.function_response for p in self.agent._contents[-1].parts]
+        self.assertEqual(first.response["url"], "https://first.com")
+        self.assertIsNone(first.parts)
+        self.assertEqual(second.parts[0].inline_data.data, b"screenshot")
+
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_elides_unchanged_screenshot(self, mock_handle_action, mock_get_model_response):
+        function_call = types.FunctionCall(name="wait_5_seconds", args={})
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(function_call=function_call)]
+        mock_get_model_response.return_value = mock_response
+        mock_handle_action.return_value = EnvState(screenshot=b"screenshot", url="https://example.com")
+
+        self.agent.run_one_iteration()
+        self.agent.run_one_iteration()
+
+        sent, elided = [c.parts[0].function_response for c in self.agent._contents[2::2]]
+        self.assertIsNotNone(sent.parts)
+        self.assertIsNone(elided.parts)
+        self.assertTrue(elided.response["screen_unchanged"])
+        self.assertEqual(self.agent.metrics.observations, 2)
+        self.assertEqual(self.agent.metrics.elision_rate, 0.5)
+
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_sends_changed_screenshot_after_input(self, mock_handle_action, mock_get_model_response):
+        function_call = types.FunctionCall(name="type_text_at", args={"x": 1, "y": 2, "text": "a"})
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(function_call=function_call)]
+        mock_get_model_response.return_value = mock_response
+        mock_handle_action.side_effect = [
+            EnvState(screenshot=b"screenshot", url="https://example.com"),
+            EnvState(screenshot=b"screenshot with a", url="https://example.com"),
+        ]
+        # Any two screenshots would count as unchanged by the fuzzy comparison.
+        self.agent._screen_change_threshold = 1.0
+
+        self.agent.run_one_iteration()
+        self.agent.run_one_iteration()
+
+        responses = [c.parts[0].function_response for c in self.agent._contents[2::2]]
+        self.assertEqual([r.parts is not None for r in responses], [True, True])
+
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_strips_old_screenshots(self, mock_handle_action, mock_get_model_response):
+        function_call = types.FunctionCall(name="click_at", args={"x": 1, "y": 2})
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(function_call=function_call)]
+        mock_get_model_response.return_value = mock_response
+        mock_handle_action.side_effect = [
+            EnvState(screenshot=f"screenshot {i}".encode(), url="https://example.com")
+            for i in range(5)
+        ]
+        self.agent._screenshot_history = ScreenshotHistory(full_turns=3)
+
+        for _ in range(5):
+            self.agent.run_one_iteration()
+
+        responses = [c.parts[0].function_response for c in self.agent._contents[2::2]]
+        self.assertEqual([r.parts is not None for r in responses], [False, False, True, True, True])
+
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_compacts_over_budget(self, mock_handle_action, mock_get_model_response):
+        log_callback = MagicMock()
+        agent = BrowserAgent(
+            browser_computer=self.mock_browser_computer,
+            query="test query",
+            model_name="test_model",
+            verbose=False,
+            log_callback=log_callback,
+            compaction_config=CompactionConfig(token_budget=1000, keep_recent_turns=1),
+        )
+        function_call = types.FunctionCall(name="click_at", args={"x": 1, "y": 2})
+        responses = []
+        for prompt_tokens in (500, 2000):
+            response = MagicMock()
+            response.candidates[0].content = types.Content(
+                role="model", parts=[types.Part(function_call=function_call)]
+            )
+            response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens, candidates_token_count=10
+            )
+            responses.append(response)
+        mock_get_model_response.side_effect = responses
+        mock_handle_action.return_value = {"result": "ok"}
+
+        agent.run_one_iteration()
+        self.assertEqual(len(agent._contents), 3)
+        agent.run_one_iteration()
+
+        self.assertEqual(len(agent._contents), 3)
+        self.assertEqual(agent.metrics.prompt_tokens_per_turn, [500, 2000])
+        self.assertEqual(agent.metrics.compactions, 1)
+        event = next(c.args[0] for c in log_callback.call_args_list if c.args[0]["type"] == "compaction")
+        self.assertEqual(event["turns_folded"], 1)
+
+    @patch('agent.BrowserAgent.get_model_response')
+    @patch('agent.BrowserAgent.handle_action')
+    def test_run_one_iteration_reports_turn_metrics(self, mock_handle_action, mock_get_model_response):
+        log_callback = MagicMock()
+        self.agent._log_callback = log_callback
+        self.mock_browser_computer.last_settle = SettleResult(waited_s=0.5, settled=True)
+        function_call = types.FunctionCall(name="wait_5_seconds", args={})
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(function_call=function_call)]
+        mock_response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=1200, candidates_token_count=30, cached_content_token_count=1000
+        )
+        mock_get_model_response.return_value = mock_response
+        mock_handle_action.return_value = EnvState(screenshot=b"screenshot", url="https://example.com")
+
+        self.agent.run_one_iteration()
+
+        event = log_callback.call_args.args[0]
+        self.assertEqual(event["type"], "turn")
+        self.assertEqual(event["turn"], 1)
+        self.assertEqual([a["name"] for a in event["actions"]], ["wait_5_seconds"])
+        self.assertEqual(event["settle_s"], 0.5)
+        self.assertEqual(event["screenshot_bytes"], len(b"screenshot"))
+        self.assertEqual(event["prompt_tokens"], 1200)
+        self.assertEqual(event["cached_prompt_tokens"], 1000)
+        self.assertIsNotNone(event["screenshot_capture_s"])
+        self.assertGreaterEqual(event["duration_s"], event["model_s"])
+        self.assertEqual(len(self.agent.metrics.turns), 1)
+
+    def test_stable_prefix_excludes_turns_with_screenshots(self):
+        history = ScreenshotHistory(full_turns=1, thumbnail_turns=1)
+        self.agent._screenshot_history = history
+        for i in range(4):
+            self.agent._contents.append(types.Content(role="model", parts=[types.Part(text=str(i))]))
+            response = types.FunctionResponse(name="click_at", response={}, parts=[])
+            content = types.Content(role="user", parts=[types.Part(function_response=response)])
+            self.agent._contents.append(content)
+            history.add(content, [response], len(self.agent._contents) - 1)
+
+        # The last two turns keep screenshots that may still be degraded.
+        self.assertEqual(self.agent._stable_prefix_length(), 6)
+        self.assertEqual(history.oldest_pending(), (6, self.agent._contents[6]))
+
+        # Turns the history doesn't match, e.g. after an unnoticed compaction.
+        self.agent._contents[6] = types.Content(role="user", parts=[])
+        self.assertEqual(self.agent._stable_prefix_length(), 0)
+
+    def test_degraded_screenshot_invalidates_context_cache(self):
+        self.agent._context_cache = MagicMock()
+        content = types.Content(role="user", parts=[])
+
+        self.agent._on_content_changed(content)
+
+        self.agent._context_cache.content_changed.assert_called_once_with(content)
+
+
+    @patch('agent.BrowserAgent.get_model_response')
+    def test_cancellation_stops_before_next_action(self, mock_get_model_response):
+        cancellation = CancellationToken()
+        self.agent._cancellation = cancellation
+        mock_response = MagicMock()
+        mock_candidate = MagicMock()
+        mock_candidate.content.parts = [
+            types.Part(function_call=types.FunctionCall(name="click_at", args={"x": 1, "y": 2})),
+            types.Part(function_call=types.FunctionCall(name="go_back", args={})),
+        ]
+        mock_response.candidates = [mock_candidate]
+        mock_get_model_response.return_value = mock_response
+        self.mock_browser_computer.click_at.side_effect = lambda **kwargs: cancellation.cancel("stop")
+
+        with self.assertRaises(TaskCancelled):
+            self.agent.agent_loop()
+
+        self.mock_browser_computer.go_back.assert_not_called()
+        self.assertEqual(len(self.agent.metrics.turns), 1)
+
+    def test_cancellation_interrupts_retry_delay(self):
+        cancellation = CancellationToken()
+        self.agent._cancellation = cancellation
+        self.agent._incremental_requests = False
+
+        def generate_content(**kwargs):
+            cancellation.cancel("stop")
+            raise errors.ServerError(503, {"error": {"message": "unavailable"}})
+
+        self.agent._client.models.generate_content.side_effect = generate_content
+
+        with self.assertRaises(TaskCancelled):
+            self.agent.get_model_response(base_delay_s=30)
+        self.agent._client.models.generate_content.assert_called_once()
+
+
+class TestStreamedResponses(unittest.TestCase):
+    def setUp(self):
+        os.environ["GEMINI_API_KEY"] = "test_api_key"
+        self.log_callback = MagicMock()
+        self.agent = BrowserAgent(
+            browser_computer=MagicMock(),
+            query="test query",
+            model_name="test_model",
+            verbose=False,
+            log_callback=self.log_callback,
+            stream_responses=True,
+        )
+        self.agent._client = MagicMock()
+        self.events = []
+
+    def chunk(self, *parts, finish_reason=None):
+        self.events.append(("chunk", parts))
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=list(parts)),
+                    finish_reason=finish_reason,
+                )
+            ]
+        )
+
+    def stream(self, fail=False):
+        yield self.chunk(types.Part(text="I will "))
+        yield self.chunk(types.Part(text="click."))
+        yield self.chunk(types.Part(function_call=types.FunctionCall(name="multiply_numbers", args={"x": 2, "y": 3})))
+        if fail:
+            raise ConnectionError("stream broke")
+        yield self.chunk(finish_reason=types.FinishReason.STOP)
+
+    def handle_action(self, action):
+        self.events.append(("action", action.name))
+        return {"result": 6}
+
+    @patch('agent.BrowserAgent.handle_action')
+    @patch('agent.BrowserAgent._generate_content_stream')
+    def test_dispatches_function_calls_before_stream_ends(self, mock_stream, mock_handle_action):
+        mock_stream.return_value = self.stream()
+        mock_handle_action.side_effect = self.handle_action
+
+        self.assertEqual(self.agent.run_one_iteration(), "CONTINUE")
+
+        self.assertEqual([e[0] for e in self.events], ["chunk", "chunk", "chunk", "action", "chunk"])
+        mock_handle_action.assert_called_once()
+        model_turn = self.agent._contents[1]
+        self.assertEqual(model_turn.parts[0].text, "I will click.")
+        self.assertEqual(self.agent._contents[2].parts[0].function_response.response, {"result": 6})
+        deltas = [c.args[0]["text"] for c in self.log_callback.call_args_list if c.args[0]["type"] == "reasoning_delta"]
+        self.assertEqual(deltas, ["I will ", "click."])
+
+    @patch('agent.time.sleep')
+    @patch('agent.BrowserAgent.handle_action')
+    @patch('agent.BrowserAgent._generate_content_stream')
+    def test_does_not_retry_after_dispatch(self, mock_stream, mock_handle_action, mock_sleep):
+        mock_stream.return_value = self.stream(fail=True)
+        mock_handle_action.side_effect = self.handle_action
+
+        self.assertEqual(self.agent.run_one_iteration(), "CONTINUE")
+
+        mock_stream.assert_called_once()
+        mock_handle_action.assert_called_once()
+        self.assertEqual(len(self.agent._contents), 3)
+
+    @patch('agent.time.sleep')
+    @patch('agent.BrowserAgent._generate_content_stream')
+    def test_retries_before_dispatch(self, mock_stream, mock_sleep):
+        def failing_stream():
+            yield self.chunk(types.Part(text="Thinking"))
+            raise ConnectionError("stream broke")
+
+        mock_stream.side_effect = [failing_stream(), iter([self.chunk(types.Part(text="Done."))])]
+
+        self.assertEqual(self.agent.run_one_iteration(), "COMPLETE")
+
+        self.assertEqual(mock_stream.call_count, 2)
+        self.assertEqual(self.agent.final_reasoning, "Done.")
+        requests = [c.args[0] for c in self.log_callback.call_args_list if c.args[0]["type"] == "model_request"]
+        self.assertEqual(
+            requests,
+            [
+                {"type": "model_request", "outcome": "error", "error_type": "ConnectionError", "code": None},
+                {"type": "model_request", "outcome": "success"},
+            ],
+        )
+
+
+class TestAsyncBrowserAgent(unittest.TestCase):
+    def setUp(self):
+        os.environ["GEMINI_API_KEY"] = "test_api_key"
+        self.mock_browser_computer = MagicMock()
+        self.mock_browser_computer.screen_size.return_value = (1000, 1000)
+        self.agent = AsyncBrowserAgent(
+            browser_computer=self.mock_browser_computer,
+            query="test query",
+            model_name="test_model"
+        )
+        self.agent._client = MagicMock()
+
+    def test_handle_action_awaits_computer(self):
+        self.mock_browser_computer.click_at = AsyncMock(return_value="state")
+        action = types.FunctionCall(name="click_at", args={"x": 100, "y": 200})
+        result = asyncio.run(self.agent.handle_action(action))
+        self.assertEqual(result, "state")
+        self.mock_browser_computer.click_at.assert_awaited_once_with(x=100, y=200)
+
+    def test_handle_action_custom_function(self):
+        action = types.FunctionCall(name="multiply_numbers", args={"x": 2, "y": 3})
+        result = asyncio.run(self.agent.handle_action(action))
+        self.assertEqual(result, {"result": 6})
+
+    @patch('agent.AsyncBrowserAgent.get_model_response', new_callable=AsyncMock)
+    @patch('agent.AsyncBrowserAgent.handle_action', new_callable=AsyncMock)
+    def test_run_one_iteration_materializes_last_observation(self, mock_handle_action, mock_get_model_response):
+        function_calls = [
+            types.FunctionCall(name="click_at", args={"x": 1, "y": 2}),
+            types.FunctionCall(name="navigate", args={"url": "https://example.com"}),
+        ]
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(function_call=fc) for fc in function_calls]
+        mock_get_model_response.return_value = mock_response
+        captures = [AsyncMock(), AsyncMock()]
+        captures[1].return_value = EnvState(screenshot=b"screenshot", url="https://example.com")
+        mock_handle_action.side_effect = [
+            AsyncDeferredEnvState(url="https://first.com", capture=captures[0]),
+            AsyncDeferredEnvState(url="https://example.com", capture=captures[1]),
+        ]
+
+        result = asyncio.run(self.agent.run_one_iteration())
+
+        self.assertEqual(result, "CONTINUE")
+        captures[0].assert_not_awaited()
+        captures[1].assert_awaited_once()
+        first, second = [p.function_response for p in self.agent._contents[-1].parts]
+        self.assertIsNone(first.parts)
+        self.assertEqual(second.parts[0].inline_data.data, b"screenshot")
+
+    @patch('agent.AsyncBrowserAgent._generate_content_stream', new_callable=AsyncMock)
+    def test_run_one_iteration_streamed(self, mock_stream):
+        self.agent._stream_responses = True
+        self.mock_browser_computer.navigate = AsyncMock(
+            return_value=EnvState(screenshot=b"screenshot", url="https://example.com")
+        )
+        function_call = types.FunctionCall(name="navigate", args={"url": "https://example.com"})
+
+        async def stream():
+            yield types.GenerateContentResponse(candidates=[types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(function_call=function_call)])
+            )])
+
+        mock_stream.return_value = stream()
+
+        result = asyncio.run(self.agent.run_one_iteration())
+
+        self.assertEqual(result, "CONTINUE")
+        self.mock_browser_computer.navigate.assert_awaited_once_with("https://example.com")
+        response = self.agent._contents[-1].parts[0].function_response
+        self.assertEqual(response.parts[0].inline_data.data, b"screenshot")
+
+    @patch('agent.AsyncBrowserAgent.get_model_response', new_callable=AsyncMock)
+    def test_agent_loop_completes(self, mock_get_model_response):
+        mock_response = MagicMock()
+        mock_response.candidates[0].content.parts = [types.Part(text="done")]
+        mock_get_model_response.return_value = mock_response
+
+        asyncio.run(self.agent.agent_loop())
+
+        self.assertEqual(self.agent.final_reasoning, "done")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import MagicMock
+from google.genai.types import Content, FunctionCall, FunctionResponse, Part
+from compaction import CompactionConfig, ConversationCompactor, OMITTED_LINE, SUMMARY_HEADER, estimate_tokens
+
+
+def make_conversation(turns: int) -> list[Content]:
+    contents = [Content(role="user", parts=[Part(text="the query")])]
+    for i in range(turns):
+        contents.append(
+            Content(
+                role="model",
+                parts=[
+                    Part(text=f"reasoning {i}. " + "Looking at the page. " * 50),
+                    Part(function_call=FunctionCall(name="click_at", args={"x": i, "y": i})),
+                ],
+            )
+        )
+        contents.append(
+            Content(
+                role="user",
+                parts=[
+                    Part(
+                        function_response=FunctionResponse(
+                            name="click_at", response={"url": f"https://example.com/{i}"}
+                        )
+                    )
+                ],
+            )
+        )
+    return contents
+
+
+class TestConversationCompactor(unittest.TestCase):
+    def test_should_compact(self):
+        compactor = ConversationCompactor(CompactionConfig(token_budget=100))
+        self.assertFalse(compactor.should_compact(None))
+        self.assertFalse(compactor.should_compact(100))
+        self.assertTrue(compactor.should_compact(101))
+
+    def test_keeps_query_and_recent_turns(self):
+        compactor = ConversationCompactor(CompactionConfig(keep_recent_turns=2))
+        contents = make_conversation(5)
+
+        compacted, event = compactor.compact(contents, prompt_tokens=1000)
+
+        self.assertEqual(len(compacted), 5)
+        self.assertEqual(compacted[0].parts[0].text, "the query")
+        summary = compacted[0].parts[1].text
+        self.assertTrue(summary.startswith(SUMMARY_HEADER))
+        self.assertIn("reasoning 2.", summary)
+        self.assertIn("... -> click_at(x=2, y=2) [now at https://example.com/2]", summary)
+        self.assertNotIn("reasoning 3", summary)
+        self.assertEqual(compacted[1:], contents[7:])
+        self.assertEqual(event.turns_folded, 3)
+        self.assertEqual(event.tokens_before, 1000)
+        self.assertGreater(event.estimated_tokens_saved, 0)
+
+    def test_merges_previous_summary(self):
+        compactor = ConversationCompactor(CompactionConfig(keep_recent_turns=2))
+        compacted, _ = compactor.compact(make_conversation(3), prompt_tokens=1000)
+        compacted += make_conversation(2)[1:]
+
+        compacted, _ = compactor.compact(compacted, prompt_tokens=1000)
+
+        summary = compacted[0].parts[1].text
+        self.assertEqual(summary.count(SUMMARY_HEADER), 1)
+        self.assertIn("reasoning 0", summary)
+        self.assertEqual(len(compacted[0].parts), 2)
+
+    def test_compacts_well_below_the_budget(self):
+        compactor = ConversationCompactor(
+            CompactionConfig(token_budget=2000, keep_recent_turns=8, max_summary_tokens=200)
+        )
+        contents = make_conversation(10)
+        prompt_tokens = sum(estimate_tokens(c) for c in contents)
+
+        compacted, _ = compactor.compact(contents, prompt_tokens)
+
+        self.assertLessEqual(sum(estimate_tokens(c) for c in compacted), 1000)
+        self.assertGreaterEqual(sum(c.role == "model" for c in compacted), 1)
+        self.assertFalse(compactor.should_compact(sum(estimate_tokens(c) for c in compacted) + 300))
+
+    def test_caps_the_summary(self):
+        compactor = ConversationCompactor(
+            CompactionConfig(keep_recent_turns=1, max_summary_tokens=100)
+        )
+        compacted = make_conversation(5)
+        for _ in range(3):
+            compacted, _ = compactor.compact(compacted, prompt_tokens=1000)
+            compacted += make_conversation(3)[1:]
+
+        lines = compacted[0].parts[1].text.splitlines()
+        self.assertEqual(lines[:2], [SUMMARY_HEADER, OMITTED_LINE])
+        self.assertEqual(lines.count(OMITTED_LINE), 1)
+        # Only the newest step is kept, since each is longer than the cap.
+        self.assertEqual(len(lines), 3)
+        self.assertIn("reasoning 1", lines[2])
+
+    def test_nothing_to_fold(self):
+        compactor = ConversationCompactor(CompactionConfig(keep_recent_turns=3))
+        self.assertIsNone(compactor.compact(make_conversation(3), prompt_tokens=1000))
+
+    def test_model_summary_falls_back_to_rules(self):
+        summarize = MagicMock(side_effect=RuntimeError("unavailable"))
+        compactor = ConversationCompactor(
+            CompactionConfig(keep_recent_turns=1, summarizer="model"),
+            summarize_with_model=summarize,
+        )
+
+        compacted, _ = compactor.compact(make_conversation(2), prompt_tokens=1000)
+
+        summarize.assert_called_once()
+        self.assertIn("reasoning 0", compacted[0].parts[1].text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,700 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import threading
+import time
+from computers import (
+    AsyncBrowserbaseComputer,
+    AsyncDeferredEnvState,
+    AsyncPlaywrightComputer,
+    BrowserbasePool,
+    BrowserbasePoolConfig,
+    CancellationToken,
+    DeferredEnvState,
+    EnvState,
+    HostMemoryLow,
+    MemoryGovernor,
+    MemoryGovernorConfig,
+    MemorySample,
+    PlaywrightComputer,
+    PlaywrightPool,
+    PlaywrightPoolConfig,
+    ProfileSnapshotConfig,
+    ProfileSnapshots,
+    RequestRouter,
+    RoutingConfig,
+    SettleConfig,
+    SharedChromium,
+    TaskCancelled,
+)
+from computers.playwright.memory import process_tree_rss
+from computers.playwright.settle import PageSettler
+
+
+class TestDeferredEnvState(unittest.TestCase):
+    def test_captures_once_on_first_access(self):
+        capture = MagicMock(return_value=EnvState(screenshot=b"png", url="https://b.com"))
+        state = DeferredEnvState(url="https://a.com", capture=capture)
+
+        self.assertFalse(state.materialized)
+        self.assertEqual(state.url, "https://a.com")
+        self.assertEqual(state.screenshot, b"png")
+        self.assertEqual(state.screenshot, b"png")
+        capture.assert_called_once()
+        self.assertEqual(state.url, "https://b.com")
+
+
+class TestPlaywrightComputer(unittest.TestCase):
+    def test_runs_actions_on_browser_loop(self):
+        computer = PlaywrightComputer(screen_size=(1000, 1000))
+        threads = []
+
+        async def capture():
+            threads.append(threading.current_thread().name)
+            return EnvState(screenshot=b"png", url="https://b.com")
+
+        async def click_at(x, y):
+            threads.append(threading.current_thread().name)
+            return AsyncDeferredEnvState(url="https://a.com", capture=capture)
+
+        computer._computer = MagicMock()
+        computer._computer.click_at = click_at
+
+        state = computer.click_at(1, 2)
+
+        self.assertIsInstance(state, DeferredEnvState)
+        self.assertEqual(state.url, "https://a.com")
+        self.assertEqual(state.screenshot, b"png")
+        self.assertEqual(threads, ["browser-loop", "browser-loop"])
+
+    def test_cancellation_interrupts_running_action(self):
+        cancellation = CancellationToken()
+        computer = PlaywrightComputer(screen_size=(1000, 1000), cancellation=cancellation)
+        interrupted = threading.Event()
+
+        async def wait_5_seconds():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                interrupted.set()
+                raise
+
+        computer._computer = MagicMock()
+        computer._computer.wait_5_seconds = wait_5_seconds
+        threading.Timer(0.05, cancellation.cancel, args=("stop",)).start()
+
+        started = time.monotonic()
+        with self.assertRaises(TaskCancelled):
+            computer.wait_5_seconds()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(interrupted.wait(timeout=1))
+        # Later actions fail right away.
+        with self.assertRaises(TaskCancelled):
+            computer.go_back()
+
+    def test_close_is_bounded(self):
+        computer = PlaywrightComputer(screen_size=(1000, 1000), close_timeout_s=0.05)
+
+        async def hang(*args):
+            await asyncio.sleep(5)
+
+        computer._computer = MagicMock()
+        computer._computer.__aexit__ = hang
+        computer._computer.abort = AsyncMock()
+
+        started = time.monotonic()
+        computer.__exit__(None, None, None)
+        self.assertLess(time.monotonic() - started, 1)
+        computer._computer.abort.assert_awaited_once()
+
+
+def delayed(seconds: float, result=None):
+    async def call(*args, **kwargs):
+        await asyncio.sleep(seconds)
+        return result
+
+    return call
+
+
+class FakePage:
+    """Stands in for a Playwright page, tracking tabs in `pages`."""
+
+    def __init__(self, pages: list, url: str, viewport_size=None, opener=None):
+        self.url = url
+        self.viewport_size = viewport_size
+        self._opener = opener
+        self._pages = pages
+        self._close_handlers = []
+        pages.append(self)
+
+    def on(self, event, handler):
+        if event == "close":
+            self._close_handlers.append(handler)
+
+    def remove_listener(self, event, handler):
+        pass
+
+    def is_closed(self):
+        return self not in self._pages
+
+    async def close(self):
+        self._pages.remove(self)
+        for handler in self._close_handlers:
+            handler(self)
+
+    async def opener(self):
+        return self._opener
+
+    async def set_viewport_size(self, viewport_size):
+        self.viewport_size = viewport_size
+
+
+class TestPopupPages(unittest.TestCase):
+    def setUp(self):
+        self.computer = AsyncPlaywrightComputer(screen_size=(1000, 1000))
+        self.computer._context = MagicMock()
+        self.computer._context.pages = self.pages = []
+        self.main = FakePage(self.pages, "https://a.example", {"width": 1000, "height": 1000})
+        self.computer._adopt_page(self.main)
+
+    def test_adopts_new_tabs_without_reloading_them(self):
+        tab = FakePage(self.pages, "https://b.example/result", {"width": 800, "height": 600})
+        asyncio.run(self.computer._handle_new_page(tab))
+
+        self.assertIs(self.computer._page, tab)
+        self.assertEqual(self.pages, [tab])
+        self.assertEqual(tab.url, "https://b.example/result")
+        self.assertEqual(tab.viewport_size, {"width": 1000, "height": 1000})
+
+    def test_keeps_the_opener_of_scripted_popups(self):
+        popup = FakePage(self.pages, "about:blank", {"width": 1000, "height": 1000}, opener=self.main)
+        asyncio.run(self.computer._handle_new_page(popup))
+        self.assertIs(self.computer._page, popup)
+        self.assertEqual(self.pages, [self.main, popup])
+
+        # The popup closes itself once the login is done.
+        asyncio.run(popup.close())
+        self.assertIs(self.computer._page, self.main)
+
+        asyncio.run(self.computer._handle_new_page(FakePage(self.pages, "about:blank", opener=self.main)))
+        asyncio.run(self.computer._close_other_pages())
+        self.assertEqual(len(self.pages), 1)
+
+    def test_reset_replaces_the_tab(self):
+        async def new_page():
+            page = FakePage(self.pages, "about:blank")
+            page.goto = AsyncMock()
+            return page
+
+        self.computer._context.new_page = new_page
+        asyncio.run(self.computer.reset("https://idle.example"))
+
+        self.assertEqual(self.pages, [self.computer._page])
+        self.assertIsNot(self.computer._page, self.main)
+        self.computer._page.goto.assert_awaited_once_with("https://idle.example")
+        self.computer._context.remove_listener.assert_called_once()
+
+
+class TestRequestRouter(unittest.TestCase):
+    def route(self, router, url, resource_type="script", page_url="https://news.example/", navigation=False):
+        frame = MagicMock(parent_frame=None)
+        frame.page.url = page_url
+        request = MagicMock(url=url, resource_type=resource_type, frame=frame)
+        request.is_navigation_request.return_value = navigation
+        route = MagicMock(request=request, fallback=AsyncMock(), abort=AsyncMock())
+        asyncio.run(router._route(route))
+        return route.abort.await_count == 1
+
+    def test_blocks_trackers_and_media(self):
+        router = RequestRouter(RoutingConfig(blocked_resource_types=["media"]))
+        self.assertTrue(self.route(router, "https://www.google-analytics.com/analytics.js"))
+        self.assertTrue(self.route(router, "https://securepubads.g.doubleclick.net/tag.js"))
+        self.assertTrue(self.route(router, "https://cdn.news.example/clip.mp4", resource_type="media"))
+        self.assertFalse(self.route(router, "https://cdn.news.example/app.js"))
+        self.assertFalse(self.route(router, "https://notdoubleclick.net/app.js"))
+        # Following a link to a blocked host still works.
+        self.assertFalse(self.route(router, "https://doubleclick.net/", resource_type="document", navigation=True))
+
+        stats = router.stats
+        self.assertEqual((stats.requests, stats.blocked), (6, 3))
+        self.assertEqual(stats.blocked_by_reason, {"domain": 2, "resource_type": 1})
+        self.assertGreater(stats.estimated_bytes_saved, 0)
+
+        router.reset()
+        self.assertEqual(router.stats.requests, 0)
+
+    def test_routes_only_blocked_domains_without_resource_types(self):
+        context = MagicMock(route=AsyncMock())
+        asyncio.run(RequestRouter(RoutingConfig()).attach(context))
+        pattern = context.route.await_args.args[0]
+
+        self.assertTrue(pattern.match("https://securepubads.g.doubleclick.net/tag.js"))
+        self.assertTrue(pattern.match("http://doubleclick.net:8080"))
+        self.assertFalse(pattern.match("https://notdoubleclick.net/app.js"))
+        self.assertFalse(pattern.match("https://news.example/?ref=doubleclick.net"))
+
+        asyncio.run(RequestRouter(RoutingConfig(blocked_resource_types=["media"])).attach(context))
+        self.assertEqual(context.route.await_args.args[0], "**/*")
+
+    def test_allowlisted_sites_load_everything(self):
+        router = RequestRouter(RoutingConfig(
+            blocked_resource_types=["media", "font"], allowed_domains=["shop.example"]
+        ))
+        self.assertFalse(self.route(router, "https://www.googletagmanager.com/gtm.js", page_url="https://www.shop.example/cart"))
+        self.assertFalse(self.route(router, "https://fonts.shop.example/a.woff2", resource_type="font"))
+        self.assertTrue(self.route(router, "https://fonts.gstatic.com/a.woff2", resource_type="font"))
+
+
+class TestBrowserbaseStartup(unittest.TestCase):
+    @patch.dict(os.environ, {"BROWSERBASE_API_KEY": "key", "BROWSERBASE_PROJECT_ID": "project"})
+    @patch("computers.browserbase.async_browserbase.browserbase.AsyncBrowserbase")
+    @patch("computers.browserbase.async_browserbase.async_playwright")
+    def test_overlaps_independent_steps(self, async_playwright, async_browserbase):
+        page = MagicMock()
+        page.goto = AsyncMock()
+        driver = MagicMock()
+        driver.chromium.connect_over_cdp = AsyncMock(
+            return_value=MagicMock(contexts=[MagicMock(pages=[page])])
+        )
+        async_playwright.return_value.start = delayed(0.2, driver)
+        client = async_browserbase.return_value
+        client.sessions.create = delayed(0.2, MagicMock(id="session"))
+        client.sessions.debug = delayed(0.5, MagicMock(debugger_fullscreen_url="https://live"))
+
+        async def start():
+            computer = AsyncBrowserbaseComputer(screen_size=(1000, 1000), context_id="context")
+            await computer.__aenter__()
+            live_view_url = computer.live_view_url
+            self.assertEqual(await computer.get_live_view_url(), "https://live")
+            return computer, live_view_url
+
+        computer, live_view_url = asyncio.run(start())
+        # The session was ready before the live view lookup finished.
+        self.assertIsNone(live_view_url)
+        self.assertLess(computer.startup_timings["total"], 0.35)
+        self.assertGreaterEqual(computer.startup_timings["live_view"], 0.5)
+        self.assertEqual(
+            set(computer.startup_timings),
+            {"driver_start", "session_create", "live_view", "connect", "navigate", "total"},
+        )
+
+
+class TestSharedChromium(unittest.TestCase):
+    @patch("computers.playwright.async_playwright.Stealth")
+    @patch("computers.playwright.shared_browser.async_playwright")
+    def test_hosts_a_context_per_computer(self, async_playwright, stealth):
+        stealth.return_value.apply_stealth_async = AsyncMock()
+        driver = MagicMock()
+        async_playwright.return_value.start = AsyncMock(return_value=driver)
+        browser = MagicMock()
+        driver.chromium.launch = AsyncMock(return_value=browser)
+        browser.is_connected.return_value = True
+
+        def new_context(**kwargs):
+            context = MagicMock(pages=[])
+            context.new_page = AsyncMock(return_value=MagicMock(goto=AsyncMock()))
+            context.storage_state = AsyncMock(return_value={"cookies": [{"name": "sid"}]})
+            context.close = AsyncMock()
+            return context
+
+        browser.new_context = AsyncMock(side_effect=new_context)
+        state_path = os.path.join(tempfile.mkdtemp(), "state.json")
+        shared = SharedChromium(state_path)
+
+        async def run():
+            computers = [
+                AsyncPlaywrightComputer(screen_size=(1000, 1000), shared_browser=shared)
+                for _ in range(2)
+            ]
+            for computer in computers:
+                await computer.__aenter__()
+            contexts = [computer._context for computer in computers]
+            for computer in computers:
+                await computer.__aexit__(None, None, None)
+            return contexts
+
+        contexts = asyncio.run(run())
+        driver.chromium.launch.assert_awaited_once()
+        self.assertEqual(browser.new_context.await_count, 2)
+        for context in contexts:
+            context.close.assert_awaited_once()
+        with open(state_path) as f:
+            self.assertEqual(json.load(f), {"cookies": [{"name": "sid"}]})
+        # The shared browser outlives the computers.
+        browser.close.assert_not_called()
+
+
+class TestProfileSnapshots(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.golden = os.path.join(root, "golden")
+        for path, content in (
+            ("Default/Network/Cookies", "sid=1"),
+            ("Default/Preferences", "{}"),
+            ("Default/Cache/data_0", "cached"),
+        ):
+            os.makedirs(os.path.dirname(os.path.join(self.golden, path)), exist_ok=True)
+            with open(os.path.join(self.golden, path), "w") as f:
+                f.write(content)
+        self.clones_dir = os.path.join(root, "clones")
+
+    def read(self, *path):
+        with open(os.path.join(*path)) as f:
+            return f.read()
+
+    def test_clones_without_caches_or_locks(self):
+        os.symlink("host-123", os.path.join(self.golden, "SingletonLock"))
+        snapshots = ProfileSnapshots(ProfileSnapshotConfig(golden_dir=self.golden, clones_dir=self.clones_dir))
+        clones = [snapshots.clone() for _ in range(2)]
+        self.assertNotEqual(clones[0].path, clones[1].path)
+        for clone in clones:
+            self.assertEqual(self.read(clone.path, "Default/Network/Cookies"), "sid=1")
+            self.assertFalse(os.path.exists(os.path.join(clone.path, "Default/Cache")))
+            self.assertFalse(os.path.lexists(os.path.join(clone.path, "SingletonLock")))
+        stats = snapshots.stats
+        self.assertEqual((stats.active, stats.clones), (2, 2))
+        self.assertEqual(stats.bytes_cloned, 2 * len("sid=1{}"))
+
+        for clone in clones:
+            snapshots.release(clone)
+            self.assertFalse(os.path.exists(clone.path))
+        self.assertEqual(snapshots.stats.active, 0)
+        self.assertEqual(self.read(self.golden, "Default/Network/Cookies"), "sid=1")
+
+    def test_merges_cookies_back(self):
+        snapshots = ProfileSnapshots(
+            ProfileSnapshotConfig(golden_dir=self.golden, clones_dir=self.clones_dir, on_release="merge")
+        )
+        clone = snapshots.clone()
+        with open(os.path.join(clone.path, "Default/Network/Cookies"), "w") as f:
+            f.write("sid=2")
+        with open(os.path.join(clone.path, "Default/Preferences"), "w") as f:
+            f.write('{"changed": true}')
+        snapshots.release(clone)
+        self.assertEqual(self.read(self.golden, "Default/Network/Cookies"), "sid=2")
+        # Only the session state is merged.
+        self.assertEqual(self.read(self.golden, "Default/Preferences"), "{}")
+        self.assertEqual(snapshots.stats.merges, 1)
+
+        # Clones of aborted browsers are never merged.
+        clone = snapshots.clone()
+        with open(os.path.join(clone.path, "Default/Network/Cookies"), "w") as f:
+            f.write("sid=3")
+        snapshots.release(clone, merge=False)
+        self.assertEqual(self.read(self.golden, "Default/Network/Cookies"), "sid=2")
+
+
+class TestCancellationToken(unittest.TestCase):
+    def test_deadline_cancels_and_runs_callbacks(self):
+        cancellation = CancellationToken()
+        callback = MagicMock()
+        cancellation.on_cancel(callback)
+        cancellation.cancel_after(0.01)
+
+        with self.assertRaises(TaskCancelled):
+            cancellation.sleep(5)
+        self.assertEqual(cancellation.reason, "deadline exceeded")
+        callback.assert_called_once()
+
+    def test_dispose_stops_the_deadline(self):
+        cancellation = CancellationToken()
+        unregister = cancellation.on_cancel(MagicMock(side_effect=AssertionError))
+        unregister()
+        cancellation.cancel_after(0.01)
+        cancellation.dispose()
+        time.sleep(0.05)
+        self.assertFalse(cancellation.cancelled)
+        cancellation.cancel()
+
+
+class FakeBrowser:
+    """Stands in for a launched AsyncPlaywrightComputer."""
+
+    def __init__(self):
+        self.url = None
+        self.healthy = True
+        self.closed = False
+        self.memory = MemorySample(rss_bytes=100, js_heap_bytes=10)
+        self.resets = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.closed = True
+
+    async def abort(self):
+        self.closed = True
+
+    async def prepare(self, url, highlight_mouse=False):
+        self.url = url
+
+    async def reset(self, url):
+        self.resets += 1
+        self.url = url
+
+    async def is_healthy(self):
+        return self.healthy
+
+    async def memory_usage(self):
+        return self.memory
+
+
+def wait_until(condition, timeout_s: float = 5):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.01)
+
+
+class TestPlaywrightPool(unittest.TestCase):
+    def create_pool(
+        self, health_check_interval_s: float = 0, governor: MemoryGovernor = None, **config
+    ) -> PlaywrightPool:
+        self.browsers = []
+
+        def create_browser(index):
+            self.browsers.append(FakeBrowser())
+            return self.browsers[-1]
+
+        pool = PlaywrightPool(
+            PlaywrightPoolConfig(size=1, health_check_interval_s=health_check_interval_s, **config),
+            create_browser,
+            governor,
+        )
+        pool.start()
+        self.addCleanup(pool.close)
+        wait_until(lambda: pool.stats.launched == 1)
+        return pool
+
+    def test_leases_warm_browsers_and_resets_them(self):
+        pool = self.create_pool(idle_url="https://idle.example")
+        for _ in range(2):
+            with pool.computer("https://start.example") as computer:
+                self.assertTrue(computer.warm)
+                self.assertIs(computer.async_computer, self.browsers[0])
+                self.assertEqual(self.browsers[0].url, "https://start.example")
+            wait_until(lambda: pool.stats.idle == 1)
+            self.assertEqual(self.browsers[0].url, "https://idle.example")
+
+        self.assertEqual(self.browsers[0].resets, 2)
+        self.assertEqual(len(self.browsers), 1)
+        self.assertEqual(pool.stats.warm_leases, 2)
+        self.assertEqual(pool.stats.leased, 0)
+
+    def test_recycles_browsers_of_cancelled_tasks(self):
+        pool = self.create_pool()
+        with self.assertRaises(TaskCancelled):
+            with pool.computer("https://start.example"):
+                raise TaskCancelled("stop")
+
+        wait_until(lambda: len(self.browsers) == 2 and pool.stats.idle == 1)
+        self.assertTrue(self.browsers[0].closed)
+        self.assertEqual(pool.stats.recycled, 1)
+        self.assertEqual(pool.stats.recycled_by_reason, {"cancelled": 1})
+
+    def test_recycles_worn_out_browsers(self):
+        pool = self.create_pool(max_tasks_per_browser=1)
+        with pool.computer("https://start.example"):
+            pass
+        wait_until(lambda: len(self.browsers) == 2 and pool.stats.idle == 1)
+        self.assertTrue(self.browsers[0].closed)
+
+    def test_relaunches_browsers_failing_health_checks(self):
+        pool = self.create_pool(health_check_interval_s=0.01)
+        self.browsers[0].healthy = False
+
+        wait_until(lambda: pool.stats.health_check_failures >= 1 and pool.stats.idle == 1)
+        self.assertTrue(self.browsers[0].closed)
+        self.assertFalse(self.browsers[-1].closed)
+
+    def test_recycles_browsers_grown_too_big(self):
+        governor = MemoryGovernor(MemoryGovernorConfig(max_js_heap_bytes=1000, max_rss_bytes=0))
+        pool = self.create_pool(governor=governor)
+        with pool.computer("https://start.example"):
+            pass
+        wait_until(lambda: pool.stats.idle == 1)
+        self.assertEqual(len(self.browsers), 1)
+
+        self.browsers[0].memory = MemorySample(rss_bytes=10**10, js_heap_bytes=2000)
+        with pool.computer("https://start.example"):
+            pass
+        wait_until(lambda: len(self.browsers) == 2 and pool.stats.idle == 1)
+        self.assertTrue(self.browsers[0].closed)
+        self.assertEqual(pool.stats.recycled_by_reason, {"js_heap": 1})
+        self.assertEqual(governor.stats.rss_high_water_bytes, 10**10)
+        self.assertEqual(governor.stats.js_heap_high_water_bytes, 2000)
+
+    @patch("computers.playwright.memory.host_memory_available", return_value=100 * 2**20)
+    def test_refuses_leases_when_host_memory_is_low(self, host_memory_available):
+        governor = MemoryGovernor(MemoryGovernorConfig(min_host_available_bytes=512 * 2**20))
+        pool = self.create_pool(governor=governor)
+        with self.assertRaises(HostMemoryLow):
+            with pool.computer("https://start.example"):
+                pass
+        self.assertEqual(pool.stats.idle, 1)
+        self.assertEqual(governor.stats.leases_refused, 1)
+
+        host_memory_available.return_value = 1024 * 2**20
+        with pool.computer("https://start.example") as computer:
+            self.assertTrue(computer.warm)
+
+
+class TestMemoryGovernor(unittest.TestCase):
+    def test_recycles_old_browsers(self):
+        governor = MemoryGovernor(MemoryGovernorConfig(max_age_s=60))
+        launched_at = time.monotonic()
+        self.assertIsNone(governor.recycle_reason(launched_at, MemorySample()))
+        with patch("computers.playwright.memory.time.monotonic", return_value=launched_at + 61):
+            self.assertEqual(governor.recycle_reason(launched_at, MemorySample()), "age")
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_measures_the_process_tree_on_a_profile(self):
+        user_data_dir = tempfile.mkdtemp()
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)", f"--user-data-dir={user_data_dir}"]
+        )
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        wait_until(lambda: process_tree_rss(user_data_dir) is not None)
+        self.assertGreater(process_tree_rss(user_data_dir), 0)
+        self.assertIsNone(process_tree_rss(tempfile.mkdtemp()))
+
+
+class TestBrowserbasePool(unittest.TestCase):
+    def create_pool(self, **config) -> BrowserbasePool:
+        self.sessions = []
+
+        def create_session(context_id, use_proxy):
+            session = FakeBrowser()
+            session.key = (context_id, use_proxy)
+            self.sessions.append(session)
+            return session
+
+        pool = BrowserbasePool(
+            BrowserbasePoolConfig(refill_interval_s=0.01, **config), create_session
+        )
+        pool.start()
+        self.addCleanup(pool.close)
+        wait_until(lambda: pool.stats.idle == 1)
+        return pool
+
+    def test_leases_sessions_created_ahead_and_replaces_them(self):
+        pool = self.create_pool()
+        with pool.computer("https://start.example") as computer:
+            self.assertTrue(computer.warm)
+            self.assertIs(computer.async_computer, self.sessions[0])
+            self.assertEqual(self.sessions[0].url, "https://start.example")
+            wait_until(lambda: len(self.sessions) == 2 and pool.stats.idle == 1)
+        # Sessions are used for one task only.
+        self.assertTrue(self.sessions[0].closed)
+        self.assertFalse(self.sessions[1].closed)
+
+    def test_keeps_sessions_ready_for_new_keys(self):
+        pool = self.create_pool()
+        with pool.computer("https://start.example", context_id="ctx", use_proxy=True) as computer:
+            self.assertFalse(computer.warm)
+            self.assertEqual(computer.async_computer.key, ("ctx", True))
+
+        wait_until(lambda: pool.stats.idle == 2)
+        self.assertEqual(pool.stats.keys, 2)
+        with pool.computer("https://start.example", context_id="ctx", use_proxy=True) as computer:
+            self.assertTrue(computer.warm)
+
+    def test_retires_old_idle_sessions(self):
+        pool = self.create_pool(max_idle_s=0.05)
+        wait_until(lambda: pool.stats.recycled >= 1)
+        self.assertTrue(self.sessions[0].closed)
+        self.assertEqual(set(pool.stats.recycled_by_reason), {"age"})
+
+
+class TestPageSettler(unittest.TestCase):
+    def setUp(self):
+        self.page = MagicMock()
+        # Milliseconds since the last DOM mutation.
+        self.page.evaluate = AsyncMock(return_value=1000)
+        self.page.screenshot = AsyncMock()
+
+    def test_settles_on_identical_frames(self):
+        self.page.screenshot.side_effect = [b"loading", b"done", b"done"]
+        settler = PageSettler(SettleConfig(timeout_s=10))
+
+        result = asyncio.run(settler.wait(self.page))
+
+        self.assertTrue(result.settled)
+        self.assertEqual(result.screenshot, b"done")
+        self.assertEqual(self.page.screenshot.call_count, 3)
+
+    def test_waits_for_inflight_requests(self):
+        settler = PageSettler(SettleConfig(timeout_s=0.2, stable_frames=False))
+        settler.attach(self.page)
+        on_request = self.page.on.call_args_list[0].args[1]
+        on_request(MagicMock())
+
+        result = asyncio.run(settler.wait(self.page))
+
+        self.assertFalse(result.settled)
+        self.assertGreaterEqual(result.waited_s, 0.2)
+
+    def test_ignores_long_running_requests(self):
+        settler = PageSettler(SettleConfig(timeout_s=10, stable_frames=False, max_request_age_s=0.1))
+        settler.attach(self.page)
+        on_request = self.page.on.call_args_list[0].args[1]
+        on_request(MagicMock())
+
+        result = asyncio.run(settler.wait(self.page))
+
+        self.assertTrue(result.settled)
+        self.assertGreaterEqual(result.waited_s, 0.1)
+        self.assertLess(result.waited_s, 1)
+
+    def test_attach_stops_tracking_the_previous_page(self):
+        settler = PageSettler()
+        settler.attach(self.page)
+        on_request = self.page.on.call_args_list[0].args[1]
+        on_request(MagicMock())
+        new_page = MagicMock()
+
+        settler.attach(new_page)
+
+        self.assertEqual(
+            [c.args for c in self.page.remove_listener.call_args_list],
+            [c.args for c in self.page.on.call_args_list],
+        )
+        self.assertEqual(settler._pending_requests(), 0)
+        self.assertEqual(new_page.on.call_count, 3)
+
+    def test_waits_for_dom_mutations(self):
+        self.page.evaluate.side_effect = [0, 50, 300]
+        settler = PageSettler(SettleConfig(timeout_s=10, stable_frames=False))
+
+        result = asyncio.run(settler.wait(self.page))
+
+        self.assertTrue(result.settled)
+        self.assertEqual(self.page.evaluate.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
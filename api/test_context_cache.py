@@ -0,0 +1,164 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from google.genai import errors, types
+from context_cache import ContextCache, ContextCacheConfig
+from metrics import AgentMetrics
+
+
+def make_turns(count: int, start: int = 0) -> list[types.Content]:
+    # Each content is about 100 tokens.
+    return [
+        types.Content(role="model" if i % 2 else "user", parts=[types.Part(text=f"{i} " + "x" * 400)])
+        for i in range(start, start + count)
+    ]
+
+
+class TestContextCache(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.caches.create.side_effect = [
+            types.CachedContent(name="cachedContents/1"),
+            types.CachedContent(name="cachedContents/2"),
+        ]
+        self.config = types.GenerateContentConfig(
+            temperature=1,
+            tools=[types.Tool(function_declarations=[types.FunctionDeclaration(name="f")])],
+        )
+        self.metrics = AgentMetrics()
+        self.cache = ContextCache(
+            self.client,
+            "test_model",
+            self.config,
+            ContextCacheConfig(min_prefix_tokens=1000, min_growth_tokens=2000),
+            self.metrics,
+        )
+
+    def test_sends_everything_while_prefix_is_small(self):
+        contents = make_turns(5)
+        config, sent = self.cache.prepare(contents, stable_length=4)
+
+        self.assertIs(config, self.config)
+        self.assertEqual(sent, contents)
+        self.client.caches.create.assert_not_called()
+
+    def test_references_cache_for_stable_prefix(self):
+        contents = make_turns(12)
+        config, sent = self.cache.prepare(contents, stable_length=11)
+
+        create_config = self.client.caches.create.call_args.kwargs["config"]
+        self.assertEqual(create_config.contents, contents[:11])
+        self.assertEqual(create_config.tools, self.config.tools)
+        self.assertEqual(config.cached_content, "cachedContents/1")
+        self.assertIsNone(config.tools)
+        self.assertEqual(config.temperature, 1)
+        self.assertEqual(sent, contents[11:])
+        self.assertEqual(self.metrics.context_caches_created, 1)
+        self.assertEqual(self.metrics.context_cache_hits, 1)
+
+        contents += make_turns(2, start=12)
+        config, sent = self.cache.prepare(contents, stable_length=13)
+
+        self.client.caches.create.assert_called_once()
+        self.assertEqual(sent, contents[11:])
+        self.assertEqual(self.metrics.context_cache_hits, 2)
+
+    def test_recreates_cache_as_prefix_grows(self):
+        contents = make_turns(12)
+        self.cache.prepare(contents, stable_length=11)
+        contents += make_turns(30, start=12)
+        config, sent = self.cache.prepare(contents, stable_length=41)
+
+        self.assertEqual(config.cached_content, "cachedContents/2")
+        self.assertEqual(sent, contents[41:])
+        self.client.caches.delete.assert_called_once_with(name="cachedContents/1")
+
+    def test_invalidates_when_prefix_changes(self):
+        contents = make_turns(12)
+        self.cache.prepare(contents, stable_length=11)
+        compacted = [types.Content(role="user", parts=[types.Part(text="summary")])] + contents[8:]
+        config, sent = self.cache.prepare(compacted, stable_length=4)
+
+        self.assertIs(config, self.config)
+        self.assertEqual(sent, compacted)
+        self.assertEqual(self.metrics.context_cache_invalidations, 1)
+        self.client.caches.delete.assert_called_once_with(name="cachedContents/1")
+
+    def test_invalidates_when_cached_content_changes(self):
+        contents = make_turns(12)
+        self.cache.prepare(contents, stable_length=11)
+        self.cache.content_changed(contents[11])
+        self.assertEqual(self.cache.name, "cachedContents/1")
+
+        self.cache.content_changed(contents[3])
+        config, sent = self.cache.prepare(contents, stable_length=3)
+
+        self.assertIsNone(self.cache.name)
+        self.assertEqual(sent, contents)
+        self.assertEqual(self.metrics.context_cache_invalidations, 1)
+
+    def test_refreshes_before_expiry_and_counts_expirations(self):
+        contents = make_turns(12)
+        with patch("context_cache.time.monotonic", return_value=0):
+            self.cache.prepare(contents, stable_length=11)
+        with patch("context_cache.time.monotonic", return_value=550):
+            self.cache.prepare(contents, stable_length=11)
+        self.client.caches.update.assert_called_once()
+        self.assertEqual(self.metrics.context_cache_refreshes, 1)
+
+        with patch("context_cache.time.monotonic", return_value=5000):
+            self.cache.prepare(contents, stable_length=11)
+        self.assertEqual(self.metrics.context_cache_expirations, 1)
+        self.assertEqual(self.metrics.context_caches_created, 2)
+
+    def test_falls_back_when_unsupported(self):
+        self.client.caches.create.side_effect = errors.ClientError(
+            400, {"error": {"message": "caching not supported"}}
+        )
+        contents = make_turns(12)
+        for _ in range(2):
+            config, sent = self.cache.prepare(contents, stable_length=11)
+            self.assertIs(config, self.config)
+            self.assertEqual(sent, contents)
+        self.client.caches.create.assert_called_once()
+
+    def test_retries_transient_failures_with_backoff(self):
+        self.client.caches.create.side_effect = [
+            errors.ServerError(503, {"error": {"message": "unavailable"}}),
+            errors.ClientError(429, {"error": {"message": "rate limited"}}),
+            types.CachedContent(name="cachedContents/1"),
+        ]
+        contents = make_turns(12)
+        for now, created in ((0, 1), (10, 1), (31, 2), (60, 2), (91, 3)):
+            with patch("context_cache.time.monotonic", return_value=now):
+                config, sent = self.cache.prepare(contents, stable_length=11)
+            self.assertEqual(self.client.caches.create.call_count, created)
+
+        self.assertEqual(config.cached_content, "cachedContents/1")
+        self.assertEqual(sent, contents[11:])
+
+    def test_aprepare_uses_async_client(self):
+        self.client.aio.caches.create = AsyncMock(return_value=types.CachedContent(name="cachedContents/a"))
+        contents = make_turns(12)
+        config, sent = asyncio.run(self.cache.aprepare(contents, stable_length=11))
+
+        self.assertEqual(config.cached_content, "cachedContents/a")
+        self.assertEqual(sent, contents[11:])
+        self.client.caches.create.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import json
+import threading
+import unittest
+from event_stream import EventStream
+
+
+def parse(messages: list[str]) -> list[dict]:
+    return [json.loads(m[len("data: "):]) for m in messages if m.startswith("data: ")]
+
+
+class TestEventStream(unittest.TestCase):
+    def test_delivers_events_published_from_another_thread(self):
+        async def run():
+            stream = EventStream()
+
+            def worker():
+                stream.publish({"type": "log", "message": "started"})
+                stream.publish({"type": "success", "message": "done"})
+                stream.close()
+
+            threading.Thread(target=worker).start()
+            return [m async for m in stream.sse()]
+
+        events = parse(asyncio.run(run()))
+        self.assertEqual([e["type"] for e in events], ["log", "success"])
+
+    def test_sends_heartbeats_while_idle(self):
+        async def run():
+            stream = EventStream(heartbeat_s=0.01)
+            messages = stream.sse()
+            first = await anext(messages)
+            stream.close()
+            return first, [m async for m in messages]
+
+        first, rest = asyncio.run(run())
+        self.assertEqual(first, ": heartbeat\n\n")
+        self.assertEqual(rest, [])
+
+    def test_coalesces_low_priority_events_for_slow_readers(self):
+        coalesced = []
+
+        async def run():
+            stream = EventStream(max_buffered=2, on_coalesce=lambda: coalesced.append(1))
+            stream.publish({"type": "turn", "turn": 1})
+            stream.publish({"type": "log", "message": "a"})
+            stream.publish({"type": "log", "message": "b"})
+            stream.publish({"type": "reasoning_delta", "text": "x"})
+            stream.publish({"type": "success", "message": "done"})
+            stream.close()
+            return [m async for m in stream.sse()], stream.dropped
+
+        messages, dropped = asyncio.run(run())
+        self.assertEqual(
+            parse(messages),
+            [
+                {"type": "turn", "turn": 1},
+                {"type": "log", "message": "a\nb"},
+                {"type": "reasoning_delta", "text": "x"},
+                {"type": "success", "message": "done"},
+            ],
+        )
+        self.assertEqual(dropped, 0)
+        self.assertEqual(len(coalesced), 1)
+
+    def test_never_drops_interleaved_reasoning_deltas(self):
+        async def run():
+            stream = EventStream(max_buffered=1)
+            stream.publish({"type": "reasoning_delta", "text": "a"})
+            stream.publish({"type": "log", "message": "1"})
+            stream.publish({"type": "reasoning_delta", "text": "b"})
+            stream.publish({"type": "reasoning", "text": "ab"})
+            stream.publish({"type": "log", "message": "2"})
+            stream.publish({"type": "reasoning_delta", "text": "c"})
+            stream.publish({"type": "turn", "turn": 2})
+            stream.publish({"type": "reasoning_delta", "text": "d"})
+            stream.publish({"type": "reasoning_delta", "text": "e"})
+            stream.close()
+            return [m async for m in stream.sse()], stream.dropped
+
+        messages, dropped = asyncio.run(run())
+        self.assertEqual(
+            parse(messages),
+            [
+                {"type": "reasoning_delta", "text": "ab"},
+                {"type": "reasoning", "text": "ab"},
+                {"type": "reasoning_delta", "text": "c"},
+                {"type": "turn", "turn": 2},
+                {"type": "reasoning_delta", "text": "de"},
+            ],
+        )
+        # Only the log lines that had nothing to merge into are gone.
+        self.assertEqual(dropped, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
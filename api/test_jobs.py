@@ -0,0 +1,159 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import contextlib
+import json
+import threading
+import unittest
+from computers import TaskCancelled
+from event_stream import EventStream
+from jobs import JobManager, JobResult, JobStore
+
+
+def collect(job, last_event_id: int = 0) -> list[tuple[int, dict]]:
+    async def run():
+        stream = EventStream()
+        job.subscribe(stream, last_event_id)
+        return [m async for m in stream.sse()]
+
+    events = []
+    for message in asyncio.run(run()):
+        lines = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+        events.append((int(lines.get("id", 0)), json.loads(lines["data"])))
+    return events
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.store = JobStore(":memory:")
+        self.addCleanup(self.store.close)
+        self.manager = JobManager(self.store, max_events=3, max_retained=1)
+
+    def finish(self, job, status="succeeded"):
+        self.manager.finish(job, JobResult(job_id=job.id, status=status, message="done", final_reasoning="all good"))
+
+    def test_resumes_after_last_event_id(self):
+        job = self.manager.create("query", "playwright")
+        job.start()
+        for i in range(3):
+            job.publish({"type": "log", "message": str(i)})
+        self.finish(job)
+
+        self.assertEqual(
+            collect(job, last_event_id=1),
+            [(2, {"type": "log", "message": "1"}), (3, {"type": "log", "message": "2"})],
+        )
+
+    def test_reports_events_dropped_from_the_ring_buffer(self):
+        job = self.manager.create("query", "playwright")
+        for i in range(5):
+            job.publish({"type": "log", "message": str(i)})
+        self.finish(job)
+
+        events = collect(job)
+        self.assertEqual(events[0], (0, {"type": "log", "message": "2 earlier events are no longer available"}))
+        self.assertEqual([event_id for event_id, _ in events[1:]], [3, 4, 5])
+
+    def test_finished_jobs_are_persisted(self):
+        first = self.manager.create("first", "playwright")
+        first.start()
+        self.finish(first)
+        second = self.manager.create("second", "browserbase")
+        self.finish(second, status="failed")
+
+        # Only the latest finished job is kept in memory.
+        self.assertIsNone(self.manager.get(first.id))
+        self.assertEqual(self.manager.info(first.id).status, "succeeded")
+        self.assertEqual(self.manager.result(first.id).final_reasoning, "all good")
+        self.assertEqual(self.manager.info(second.id).status, "failed")
+        self.assertIsNone(self.manager.info("unknown"))
+
+    def test_running_job_has_no_result(self):
+        job = self.manager.create("query", "playwright")
+        job.start()
+        self.assertEqual(self.manager.info(job.id).status, "running")
+        self.assertIsNone(self.manager.result(job.id))
+
+
+class TestSafetyConfirmation(unittest.TestCase):
+    def setUp(self):
+        self.store = JobStore(":memory:")
+        self.addCleanup(self.store.close)
+        self.job = JobManager(self.store).create("query", "playwright")
+        self.job.start()
+        self.parked = threading.Event()
+        self.outcome = []
+
+    @contextlib.contextmanager
+    def park(self):
+        self.parked.set()
+        yield
+
+    def request_in_background(self, timeout_s: float = 5) -> threading.Thread:
+        def request():
+            try:
+                self.outcome.append(self.job.request_confirmation({"explanation": "Buy it?"}, timeout_s, self.park))
+            except TaskCancelled as e:
+                self.outcome.append(e)
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        self.assertTrue(self.parked.wait(timeout=5))
+        return thread
+
+    def last_event(self) -> dict:
+        return self.job._events[-1][1]
+
+    def test_waits_for_the_answer(self):
+        thread = self.request_in_background()
+        request = self.last_event()
+        self.assertEqual(request["type"], "safety_confirmation")
+        self.assertEqual(request["explanation"], "Buy it?")
+        self.assertEqual(self.job.info.status, "awaiting_confirmation")
+
+        self.assertFalse(self.job.answer_confirmation("unknown", True))
+        self.assertTrue(self.job.answer_confirmation(request["confirmation_id"], True))
+        thread.join(timeout=5)
+
+        self.assertEqual(self.outcome, ["CONTINUE"])
+        self.assertEqual(self.job.info.status, "running")
+        self.assertEqual(self.last_event()["decision"], "CONTINUE")
+        self.assertFalse(self.job.answer_confirmation(request["confirmation_id"], True))
+
+    def test_only_the_owner_can_answer(self):
+        self.job = JobManager(self.store).create("query", "playwright", owner="alice")
+        self.job.start()
+        thread = self.request_in_background()
+        confirmation_id = self.last_event()["confirmation_id"]
+
+        self.assertFalse(self.job.answer_confirmation(confirmation_id, True))
+        self.assertFalse(self.job.answer_confirmation(confirmation_id, True, owner="mallory"))
+        self.assertTrue(self.job.answer_confirmation(confirmation_id, False, owner="alice"))
+        thread.join(timeout=5)
+        self.assertEqual(self.outcome, ["TERMINATE"])
+
+    def test_denies_without_an_answer(self):
+        self.request_in_background(timeout_s=0.01).join(timeout=5)
+        self.assertEqual(self.outcome, ["TERMINATE"])
+        self.assertTrue(self.last_event()["timed_out"])
+
+    def test_cancellation_stops_the_wait(self):
+        thread = self.request_in_background()
+        self.job.cancellation.cancel("cancelled by client")
+        thread.join(timeout=5)
+        self.assertIsInstance(self.outcome[0], TaskCancelled)
+
+
+if __name__ == "__main__":
+    unittest.main()
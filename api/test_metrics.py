@@ -0,0 +1,53 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from metrics import ActionTiming, Histogram, TurnMetrics, TurnStats
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram([1, 5])
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        buckets, total, count = histogram.snapshot()
+
+        self.assertEqual(buckets, [(1, 2), (5, 3), (float("inf"), 4)])
+        self.assertEqual(total, 14.5)
+        self.assertEqual(count, 4)
+
+
+class TestTurnStats(unittest.TestCase):
+    def test_observes_turns(self):
+        stats = TurnStats()
+        stats.observe(TurnMetrics(
+            turn=1,
+            duration_s=2.0,
+            model_s=1.5,
+            model_retries=1,
+            actions=[ActionTiming(name="click_at", duration_s=0.1), ActionTiming(name="navigate", duration_s=0.3)],
+            prompt_tokens=3000,
+        ))
+        stats.observe(TurnMetrics(turn=2, duration_s=1.0, model_s=0.5))
+
+        self.assertEqual(stats.turn_duration_s.snapshot()[2], 2)
+        self.assertEqual(stats.action_duration_s.snapshot()[2], 2)
+        self.assertEqual(stats.prompt_tokens.snapshot()[2], 1)
+        # Unset timings are not observed.
+        self.assertEqual(stats.screenshot_capture_s.snapshot()[2], 0)
+        self.assertEqual(stats.model_retries, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import io
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+from google.genai import types
+import benchmark_request_encoding
+from agent import BrowserAgent
+from request_encoding import IncrementalRequestEncoder, RequestEncodingError
+
+
+class TestIncrementalRequestEncoder(unittest.TestCase):
+    def setUp(self):
+        os.environ["GEMINI_API_KEY"] = "test_api_key"
+        self.agent = BrowserAgent(
+            browser_computer=MagicMock(), query="test query", model_name="test_model"
+        )
+        self.client = self.agent._client
+        self.config = self.agent._generate_content_config
+        self.contents = [
+            types.Content(role="user", parts=[types.Part(text="test query")]),
+            types.Content(
+                role="model",
+                parts=[types.Part(function_call=types.FunctionCall(name="click_at", args={"x": 1}))],
+            ),
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part(
+                        function_response=types.FunctionResponse(
+                            name="click_at",
+                            response={"url": "https://example.com"},
+                            parts=[
+                                types.FunctionResponsePart(
+                                    inline_data=types.FunctionResponseBlob(
+                                        mime_type="image/png", data=b"\x00\xffpng"
+                                    )
+                                )
+                            ],
+                        )
+                    )
+                ],
+            ),
+        ]
+        self.requests = []
+        response = MagicMock()
+        response.body = json.dumps(
+            {"candidates": [{"content": {"role": "model", "parts": [{"text": "done"}]}}]}
+        )
+        response.headers = {}
+
+        def request(method, path, request_dict, http_options=None):
+            request_dict = {k: v for k, v in request_dict.items() if not k.startswith("_")}
+            self.requests.append((path, json.loads(json.dumps(request_dict))))
+            return response
+
+        def request_streamed(method, path, request_dict, http_options=None):
+            yield request(method, path, request_dict, http_options)
+
+        self.client._api_client.request = request
+        self.client._api_client.request_streamed = request_streamed
+
+    def test_matches_sdk_request(self):
+        sdk_response = self.client.models.generate_content(
+            model="test_model", contents=self.contents, config=self.config
+        )
+        encoder = IncrementalRequestEncoder(self.client, "test_model", self.config)
+        response = encoder.generate_content(self.contents)
+
+        self.assertEqual(self.requests[0], self.requests[1])
+        self.assertEqual(response.text, sdk_response.text)
+
+    def test_matches_sdk_stream_request(self):
+        sdk_responses = list(self.client.models.generate_content_stream(
+            model="test_model", contents=self.contents, config=self.config
+        ))
+        encoder = IncrementalRequestEncoder(self.client, "test_model", self.config)
+        responses = list(encoder.generate_content_stream(self.contents))
+
+        self.assertEqual(self.requests[0], self.requests[1])
+        self.assertIn("streamGenerateContent", self.requests[1][0])
+        self.assertEqual(responses[0].text, sdk_responses[0].text)
+
+    def test_encodes_only_new_or_changed_contents(self):
+        encoder = IncrementalRequestEncoder(self.client, "test_model", self.config)
+        encoder.encode_contents(self.contents)
+        with patch.object(encoder, "_encode", wraps=encoder._encode) as encode:
+            new_content = types.Content(role="model", parts=[types.Part(text="next")])
+            encoder.encode_contents(self.contents + [new_content])
+            self.assertEqual(encode.call_count, 1)
+
+            self.contents[2].parts[0].function_response.parts = None
+            encoder.invalidate(self.contents[2])
+            encoded = encoder.encode_contents(self.contents)
+            self.assertEqual(encode.call_count, 2)
+        self.assertNotIn("parts", encoded[2]["parts"][0]["functionResponse"])
+
+    def test_falls_back_to_sdk_when_encoding_fails(self):
+        self.agent._contents = self.contents
+        encoder = self.agent._get_request_encoder()
+        self.assertIsNotNone(encoder)
+
+        with patch.object(encoder, "_encode", side_effect=KeyError("contents")):
+            with self.assertRaises(RequestEncodingError):
+                encoder.generate_content_stream(self.contents)
+            response = self.agent.get_model_response()
+
+        self.assertEqual(response.text, "done")
+        self.assertIsNone(self.agent._request_encoder)
+        self.assertEqual(len(self.requests), 1)
+        self.assertIsNone(self.agent._get_request_encoder())
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_runs_a_few_turns(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            benchmark_request_encoding.main(["--turns", "3", "--report-every", "1"])
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+from PIL import Image
+from google.genai import types
+from screenshots import (
+    ScreenshotEncoder,
+    ScreenshotEncoding,
+    ScreenshotFingerprint,
+    ScreenshotHistory,
+)
+
+
+def make_png(size=(1920, 1080), color=(255, 255, 255)) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format="PNG")
+    return output.getvalue()
+
+
+class TestScreenshotEncoder(unittest.TestCase):
+    def test_passthrough_by_default(self):
+        png = make_png()
+        encoded = ScreenshotEncoder().submit(png).result()
+        self.assertEqual(encoded.data, png)
+        self.assertEqual(encoded.mime_type, "image/png")
+
+    def test_downscales_and_converts(self):
+        encoder = ScreenshotEncoder(
+            ScreenshotEncoding(format="jpeg", quality=70, max_width=960)
+        )
+        encoded = encoder.submit(make_png()).result()
+
+        self.assertEqual(encoded.mime_type, "image/jpeg")
+        image = Image.open(io.BytesIO(encoded.data))
+        self.assertEqual(image.format, "JPEG")
+        self.assertEqual(image.size, (960, 540))
+
+    def test_from_env(self):
+        with patch.dict(os.environ, {"SCREENSHOT_FORMAT": "webp", "SCREENSHOT_MAX_WIDTH": "800"}):
+            encoding = ScreenshotEncoding.from_env(format="jpeg", quality=50)
+        self.assertEqual(encoding.format, "webp")
+        self.assertEqual(encoding.max_width, 800)
+        self.assertEqual(encoding.quality, 50)
+
+
+class TestScreenshotFingerprint(unittest.TestCase):
+    def test_difference(self):
+        white = ScreenshotFingerprint(make_png())
+        self.assertEqual(white.difference(ScreenshotFingerprint(make_png())), 0.0)
+        self.assertAlmostEqual(
+            white.difference(ScreenshotFingerprint(make_png(color=(0, 0, 0)))), 1.0
+        )
+
+
+class TestScreenshotHistory(unittest.TestCase):
+    def make_response(self) -> types.FunctionResponse:
+        return types.FunctionResponse(
+            name="click_at",
+            response={"url": "https://example.com"},
+            parts=[
+                types.FunctionResponsePart(
+                    inline_data=types.FunctionResponseBlob(
+                        mime_type="image/png", data=make_png()
+                    )
+                )
+            ],
+        )
+
+    def test_degrades_in_tiers(self):
+        on_degrade = MagicMock()
+        history = ScreenshotHistory(full_turns=2, thumbnail_turns=1, on_degrade=on_degrade)
+        responses = [self.make_response() for _ in range(4)]
+        contents = [MagicMock() for _ in responses]
+        for i, (content, response) in enumerate(zip(contents, responses)):
+            history.add(content, [response], i)
+
+        self.assertIsNone(responses[0].parts)
+        thumbnail = responses[1].parts[0].inline_data
+        self.assertEqual(thumbnail.mime_type, "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(thumbnail.data)).width, 320)
+        self.assertEqual(responses[2].parts[0].inline_data.mime_type, "image/png")
+        self.assertEqual(responses[3].parts[0].inline_data.mime_type, "image/png")
+        self.assertEqual(
+            [c.args[0] for c in on_degrade.call_args_list],
+            [contents[0], contents[1], contents[0]],
+        )
+
+    def test_without_thumbnails(self):
+        history = ScreenshotHistory(full_turns=1)
+        responses = [self.make_response() for _ in range(2)]
+        for i, response in enumerate(responses):
+            history.add(MagicMock(), [response], i)
+
+        self.assertIsNone(responses[0].parts)
+        self.assertIsNotNone(responses[1].parts)
+
+    def test_rebase_forgets_folded_turns(self):
+        history = ScreenshotHistory(full_turns=2, thumbnail_turns=1)
+        contents = [MagicMock() for _ in range(3)]
+        for i, content in enumerate(contents):
+            history.add(content, [self.make_response()], i * 2 + 1)
+        self.assertEqual(history.oldest_pending(), (1, contents[0]))
+
+        # Compaction folded the first turn and put a summary in front.
+        history.rebase([MagicMock(), MagicMock(), contents[1], MagicMock(), contents[2]])
+
+        self.assertEqual(history.oldest_pending(), (2, contents[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from computers import MemoryGovernorStats, PlaywrightPoolStats, RoutingStats
+from server_metrics import ServerMetrics
+
+
+class TestServerMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = ServerMetrics()
+
+    def test_tracks_active_tasks_and_outcomes(self):
+        with self.metrics.track_task("playwright"):
+            self.assertEqual(self.metrics.tasks_active.value(env="playwright"), 1)
+        with self.assertRaises(RuntimeError):
+            with self.metrics.track_task("playwright"):
+                raise RuntimeError("browser crashed")
+
+        self.assertEqual(self.metrics.tasks_active.value(env="playwright"), 0)
+        self.assertEqual(self.metrics.tasks_total.value(env="playwright", outcome="success"), 1)
+        self.assertEqual(self.metrics.tasks_total.value(env="playwright", outcome="error"), 1)
+
+    def test_renders_prometheus_text(self):
+        self.metrics.observe_session_setup("browserbase", 3.0, {"connect": 0.4})
+        self.metrics.observe_agent_event({"type": "turn", "turn": 1, "duration_s": 2.0, "model_s": 1.0, "model_retries": 1})
+        self.metrics.observe_agent_event({"type": "model_request", "outcome": "error", "error_type": "ServerError", "code": 503})
+        for _ in range(3):
+            self.metrics.observe_agent_event({"type": "model_request", "outcome": "success"})
+        self.metrics.observe_agent_event({"type": "reasoning", "reasoning": "", "function_calls": []})
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('browser_tasks_active{env="playwright"} 0', lines)
+        self.assertIn('browser_session_setup_seconds_bucket{env="browserbase",le="2.5"} 0', lines)
+        self.assertIn('browser_session_setup_seconds_bucket{env="browserbase",le="5.0"} 1', lines)
+        self.assertIn('browser_session_setup_seconds_count{env="browserbase"} 1', lines)
+        self.assertIn('browser_session_phase_seconds_bucket{env="browserbase",phase="connect",le="0.5"} 1', lines)
+        self.assertIn('model_requests_total{error_type="ServerError",outcome="error"} 1', lines)
+        self.assertIn('model_requests_total{outcome="success"} 3', lines)
+        self.assertIn("model_request_error_ratio 0.25", lines)
+        self.assertIn('model_latency_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn("# TYPE agent_turn_duration_seconds histogram", lines)
+
+    def test_renders_browser_recycling_and_memory(self):
+        self.metrics.observe_browser_pool("playwright", PlaywrightPoolStats(
+            size=2, launched=2, idle=1, leased=1, warm_leases=3, cold_leases=0,
+            recycled=2, recycled_by_reason={"rss": 1, "tasks": 1}, health_check_failures=0,
+        ))
+        self.metrics.observe_memory_governor(MemoryGovernorStats(
+            rss_high_water_bytes=2**30, js_heap_high_water_bytes=2**20,
+            host_available_bytes=None, leases_refused=4,
+        ))
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('browser_pool_recycled_total{env="playwright",reason="rss"} 1', lines)
+        self.assertIn('browser_pool_recycled_total{env="playwright",reason="tasks"} 1', lines)
+        self.assertEqual(sum(line.startswith("browser_pool_recycle") for line in lines), 2)
+        self.assertIn("browser_memory_rss_high_water_bytes 1073741824", lines)
+        self.assertIn("browser_leases_refused_total 4", lines)
+        self.assertNotIn("# TYPE host_memory_available_bytes gauge", lines)
+
+    def test_accumulates_blocked_requests(self):
+        for _ in range(2):
+            self.metrics.observe_routing("browserbase", RoutingStats(
+                requests=10, blocked=3, blocked_by_reason={"domain": 2, "resource_type": 1},
+                estimated_bytes_saved=1000,
+            ))
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('browser_requests_routed_total{env="browserbase"} 20', lines)
+        self.assertIn('browser_requests_blocked_total{env="browserbase",reason="domain"} 4', lines)
+        self.assertIn('browser_request_bytes_saved_total{env="browserbase"} 2000', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+import unittest
+from server_metrics import ServerMetrics
+from task_executor import DEFAULT_TASK_DURATION_S, ExecutorSaturated, TaskExecutor
+
+
+class TestTaskExecutor(unittest.TestCase):
+    def setUp(self):
+        self.metrics = ServerMetrics()
+        self.executor = TaskExecutor(max_workers=1, max_queued=1, metrics=self.metrics)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def blocked_task(self) -> str:
+        self.started.set()
+        self.release.wait(timeout=5)
+        return "done"
+
+    def test_rejects_when_workers_and_queue_are_full(self):
+        running = self.executor.submit(self.blocked_task)
+        self.started.wait(timeout=5)
+        queued = self.executor.submit(self.blocked_task)
+
+        with self.assertRaises(ExecutorSaturated) as cm:
+            self.executor.submit(self.blocked_task)
+        # One task ahead in the queue, each taking the default duration.
+        self.assertEqual(cm.exception.retry_after_s, 2 * DEFAULT_TASK_DURATION_S)
+        self.assertEqual(self.metrics.tasks_rejected.value(), 1)
+
+        self.release.set()
+        self.assertEqual(running.future.result(timeout=5), "done")
+        self.assertEqual(queued.future.result(timeout=5), "done")
+        self.assertEqual(self.executor.queued, 0)
+        self.assertEqual(self.executor.running, 0)
+
+    def test_cancelled_queued_task_frees_its_place(self):
+        running = self.executor.submit(self.blocked_task)
+        self.started.wait(timeout=5)
+        cancelled = self.executor.submit(lambda: "never")
+
+        self.assertTrue(cancelled.future.cancel())
+        self.assertEqual(self.executor.queued, 0)
+        self.assertEqual(self.metrics.tasks_queued.value(), 0)
+        # The cancelled task no longer counts toward saturation.
+        queued = self.executor.submit(lambda: "quick")
+
+        self.release.set()
+        self.assertEqual(queued.future.result(timeout=5), "quick")
+        running.future.result(timeout=5)
+        self.assertIsNone(cancelled.started_at)
+        self.assertEqual(self.executor.running, 0)
+
+    def test_reports_queue_wait_separately_from_execution(self):
+        running = self.executor.submit(self.blocked_task)
+        self.started.wait(timeout=5)
+        queued = self.executor.submit(lambda: "quick")
+        self.assertEqual(self.metrics.tasks_queued.value(), 1)
+        self.assertIsNone(queued.queue_wait_s)
+
+        time.sleep(0.05)
+        self.release.set()
+        queued.future.result(timeout=5)
+        running.future.result(timeout=5)
+
+        self.assertGreaterEqual(queued.queue_wait_s, 0.05)
+        self.assertLess(queued.execution_s, queued.queue_wait_s)
+        self.assertEqual(self.metrics.tasks_queued.value(), 0)
+        self.assertEqual(self.metrics.workers_busy.value(), 0)
+        self.assertEqual(self.metrics.queue_wait_s.labels().snapshot()[2], 2)
+        self.assertEqual(self.metrics.execution_s.labels().snapshot()[2], 2)
+
+    def test_parked_task_gives_its_worker_to_a_queued_one(self):
+        executor = TaskExecutor(max_workers=1, max_queued=1, max_parked=1)
+        self.addCleanup(executor.shutdown)
+
+        def waiting_task() -> str:
+            with executor.park():
+                self.started.set()
+                self.release.wait(timeout=5)
+            return "resumed"
+
+        waiting = executor.submit(waiting_task)
+        self.started.wait(timeout=5)
+        self.assertEqual(executor.parked, 1)
+        self.assertEqual(executor.running, 0)
+        # Runs although the only worker slot was taken by the parked task.
+        self.assertEqual(executor.submit(lambda: "quick").future.result(timeout=5), "quick")
+
+        self.release.set()
+        self.assertEqual(waiting.future.result(timeout=5), "resumed")
+        self.assertEqual(executor.parked, 0)
+
+    def test_propagates_task_errors(self):
+        def failing_task():
+            raise RuntimeError("browser crashed")
+
+        ticket = self.executor.submit(failing_task)
+        with self.assertRaises(RuntimeError):
+            ticket.future.result(timeout=5)
+        self.assertIsNotNone(ticket.execution_s)
+
+
+if __name__ == "__main__":
+    unittest.main()
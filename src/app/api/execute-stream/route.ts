@@ -67,6 +67,8 @@ export async function POST(request: NextRequest) {
         initial_url: 'https://www.google.com',
         highlight_mouse: false,
         model: 'gemini-2.5-computer-use-preview-10-2025',
+        // Only this user may answer the job's safety confirmations
+        user_id: user.id,
       }),
     });
 
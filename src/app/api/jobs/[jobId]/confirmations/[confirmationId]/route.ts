@@ -0,0 +1,74 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { auth } from '@clerk/nextjs/server';
+import { getSupabaseUser } from '@/lib/clerk-supabase';
+
+const PYTHON_API_URL = process.env.PYTHON_API_URL || 'http://localhost:8000';
+
+// Confirms or denies an action a running job is waiting on.
+export async function POST(
+  request: NextRequest,
+  { params }: { params: Promise<{ jobId: string; confirmationId: string }> }
+) {
+  try {
+    const { confirm } = await request.json();
+
+    if (typeof confirm !== 'boolean') {
+      return NextResponse.json(
+        { error: 'confirm must be true or false' },
+        { status: 400 }
+      );
+    }
+
+    // Verify user is authenticated
+    const { userId } = await auth();
+    if (!userId) {
+      return NextResponse.json(
+        { error: 'Unauthorized' },
+        { status: 401 }
+      );
+    }
+
+    const user = await getSupabaseUser();
+    if (!user) {
+      return NextResponse.json(
+        { error: 'User not found' },
+        { status: 404 }
+      );
+    }
+
+    // The Python API checks that the job was started for this user
+    const { jobId, confirmationId } = await params;
+    const pythonApiResponse = await fetch(
+      `${PYTHON_API_URL}/api/jobs/${encodeURIComponent(jobId)}/confirmations/${encodeURIComponent(confirmationId)}`,
+      {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ confirm, user_id: user.id }),
+      }
+    );
+
+    const result = await pythonApiResponse.json().catch(() => ({}));
+    if (!pythonApiResponse.ok) {
+      return NextResponse.json(
+        {
+          error: result.detail || 'Answering the confirmation failed',
+        },
+        { status: pythonApiResponse.status }
+      );
+    }
+
+    return NextResponse.json(result, { status: pythonApiResponse.status });
+
+  } catch (error) {
+    console.error('Error answering confirmation:', error);
+    return NextResponse.json(
+      {
+        error: 'Internal server error',
+        details: error instanceof Error ? error.message : 'Unknown error'
+      },
+      { status: 500 }
+    );
+  }
+}
@@ -43,12 +43,52 @@ type ReasoningEntry = {
   function_calls: string[]
 }
 
+type PendingConfirmation = {
+  confirmation_id: string
+  explanation: string | null
+  timeout_s: number
+}
+
 export function ExecutionPageClient({ video, title }: { video: VideoRow; title: string }) {
   const [executionStatus, setExecutionStatus] = useState<ExecutionStatus>("idle")
   const [executionResult, setExecutionResult] = useState<ExecutionResult | null>(null)
   const [logs, setLogs] = useState<LogEntry[]>([])
   const [reasoningLogs, setReasoningLogs] = useState<ReasoningEntry[]>([])
+  // Reasoning of the current step, streamed before its function calls are known.
+  const [pendingReasoning, setPendingReasoning] = useState("")
   const [isInstructionsExpanded, setIsInstructionsExpanded] = useState(false)
+  const [jobId, setJobId] = useState<string | null>(null)
+  // An action the agent is waiting for the user to confirm or deny.
+  const [pendingConfirmation, setPendingConfirmation] = useState<PendingConfirmation | null>(null)
+  const [isAnswering, setIsAnswering] = useState(false)
+
+  const handleAnswerConfirmation = async (confirm: boolean) => {
+    if (!jobId || !pendingConfirmation) return
+    setIsAnswering(true)
+    try {
+      const response = await fetch(
+        `/api/jobs/${jobId}/confirmations/${pendingConfirmation.confirmation_id}`,
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({ confirm }),
+        }
+      )
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}))
+        throw new Error(data.error || `HTTP ${response.status}: ${response.statusText}`)
+      }
+      // The job reports the decision as a safety_decision event.
+    } catch (error) {
+      console.error("Confirmation error:", error)
+      setLogs(prev => [...prev, { timestamp: new Date(), message: `✗ Answering the confirmation failed: ${error instanceof Error ? error.message : "Unknown error"}` }])
+      setPendingConfirmation(null)
+    } finally {
+      setIsAnswering(false)
+    }
+  }
 
   const handleStartExecution = async () => {
     if (!video.analysis_result) {
@@ -64,7 +104,10 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
     setExecutionStatus("running")
     setLogs([])
     setReasoningLogs([])
+    setPendingReasoning("")
     setExecutionResult(null)
+    setJobId(null)
+    setPendingConfirmation(null)
 
     try {
       // Use streaming endpoint for real-time logs
@@ -100,14 +143,30 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
           if (line.startsWith('data: ')) {
             const data = JSON.parse(line.slice(6))
 
-            if (data.type === 'log') {
+            if (data.type === 'job') {
+              setJobId(data.job_id)
+            } else if (data.type === 'log') {
               setLogs(prev => [...prev, { timestamp: new Date(), message: data.message }])
+            } else if (data.type === 'reasoning_delta') {
+              setPendingReasoning(prev => prev + data.text)
             } else if (data.type === 'reasoning') {
+              setPendingReasoning("")
               setReasoningLogs(prev => [...prev, {
                 timestamp: new Date(),
                 reasoning: data.reasoning,
                 function_calls: data.function_calls
               }])
+            } else if (data.type === 'safety_confirmation') {
+              setPendingConfirmation({
+                confirmation_id: data.confirmation_id,
+                explanation: data.explanation,
+                timeout_s: data.timeout_s,
+              })
+              setLogs(prev => [...prev, { timestamp: new Date(), message: "⚠ Waiting for confirmation: " + (data.explanation || "the next action needs approval") }])
+            } else if (data.type === 'safety_decision') {
+              setPendingConfirmation(null)
+              const outcome = data.decision === 'CONTINUE' ? "confirmed" : data.timed_out ? "denied (no answer in time)" : "denied"
+              setLogs(prev => [...prev, { timestamp: new Date(), message: `Action ${outcome}` }])
             } else if (data.type === 'live_view_url') {
               setExecutionResult(prev => ({
                 ...prev,
@@ -142,6 +201,15 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
               if (data.traceback) {
                 setLogs(prev => [...prev, { timestamp: new Date(), message: data.traceback }])
               }
+            } else if (data.type === 'cancelled') {
+              setPendingConfirmation(null)
+              setExecutionStatus("error")
+              setExecutionResult({
+                status: "cancelled",
+                message: "Execution cancelled",
+                error: data.reason,
+              })
+              setLogs(prev => [...prev, { timestamp: new Date(), message: "✗ Cancelled: " + data.reason }])
             }
           }
         }
@@ -223,6 +291,33 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
               <div className="animate-spin rounded-full h-5 w-5 border-b-2 border-accent"></div>
               <span className="font-mono text-sm">Executing skill...</span>
             </div>
+            {pendingConfirmation && (
+              <div className="p-4 border-2 border-border rounded-md bg-accent-thin space-y-3">
+                <h3 className="text-xs font-bold text-yellow-500">CONFIRMATION REQUIRED</h3>
+                <p className="font-mono text-sm whitespace-pre-wrap">
+                  {pendingConfirmation.explanation || "The next action needs your approval."}
+                </p>
+                <p className="text-xs text-muted-foreground font-mono">
+                  Denied automatically after {Math.round(pendingConfirmation.timeout_s)}s without an answer.
+                </p>
+                <div className="flex items-center gap-3">
+                  <button
+                    onClick={() => handleAnswerConfirmation(true)}
+                    disabled={isAnswering || !jobId}
+                    className="button-inline"
+                  >
+                    Confirm
+                  </button>
+                  <button
+                    onClick={() => handleAnswerConfirmation(false)}
+                    disabled={isAnswering || !jobId}
+                    className="button-inline"
+                  >
+                    Deny
+                  </button>
+                </div>
+              </div>
+            )}
           </div>
         )}
 
@@ -252,7 +347,9 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
               <svg className="w-5 h-5" fill="currentColor" viewBox="0 0 20 20">
                 <path d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 8.586 8.707 7.293z" />
               </svg>
-              <span className="font-mono text-sm font-medium">Execution failed</span>
+              <span className="font-mono text-sm font-medium">
+                {executionResult?.status === "cancelled" ? "Execution cancelled" : "Execution failed"}
+              </span>
             </div>
             <button
               onClick={handleStartExecution}
@@ -282,7 +379,7 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
       )}
 
       {/* Gemini Reasoning Logs */}
-      {reasoningLogs.length > 0 && (
+      {(reasoningLogs.length > 0 || pendingReasoning) && (
         <div className="accent-block">
           <h2 className="font-display text-xl tracking-[0.05em] mb-4">Gemini Reasoning</h2>
           <div className="space-y-3 h-96 overflow-y-auto">
@@ -309,6 +406,12 @@ export function ExecutionPageClient({ video, title }: { video: VideoRow; title:
                 </div>
               </div>
             ))}
+            {pendingReasoning && (
+              <div className="border-2 border-border rounded-md p-4 bg-purple-950/20">
+                <h3 className="text-xs font-bold text-purple-400 mb-2">REASONING</h3>
+                <p className="font-mono text-sm whitespace-pre-wrap">{pendingReasoning}</p>
+              </div>
+            )}
           </div>
         </div>
       )}